@@ -1,11 +1,13 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
 import uuid
 
 from app import database, models
 from app.schemas import project as schemas
+from app.services import diagram_patch, graph_projection, revision_store, tag_index
 
 router = APIRouter(
     tags=["diagrams"]
@@ -37,6 +39,9 @@ async def create_diagram(
         status="draft"
     )
     db.add(diagram)
+    await db.flush()
+    revision_store.add_initial_revision(db, diagram)
+    await graph_projection.rebuild(db, diagram, diagram.canonical_json)
     await db.commit()
     await db.refresh(diagram)
     return diagram
@@ -44,20 +49,22 @@ async def create_diagram(
 @router.get("/projects/{project_id}/diagrams", response_model=List[schemas.Diagram])
 async def read_project_diagrams(
     project_id: str,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     stmt = select(models.Diagram).where(models.Diagram.project_id == project_id)
     result = await db.execute(stmt)
     diagrams = result.scalars().all()
-    return diagrams
+    # 도면마다 load_current를 부르지 않고 revision을 한 번에 읽는다
+    current = await revision_store.load_current_many(db, diagrams)
+    return [await _with_current(db, diagram, current[diagram.id]) for diagram in diagrams]
 
-# --- Top-level Diagram resources ---
+async def _with_current(db: AsyncSession, diagram: models.Diagram, canonical_json=None) -> schemas.Diagram:
+    # Diagram.canonical_json은 최근 snapshot이므로 응답에는 현재 버전 내용을 채운다
+    if canonical_json is None:
+        canonical_json = await revision_store.load_current(db, diagram)
+    return schemas.Diagram.model_validate(diagram).model_copy(update={"canonical_json": canonical_json})
 
-@router.get("/diagrams/{diagram_id}", response_model=schemas.Diagram)
-async def read_diagram(
-    diagram_id: str,
-    db: AsyncSession = Depends(database.get_db)
-):
+async def _get_diagram(db: AsyncSession, diagram_id: str) -> models.Diagram:
     stmt = select(models.Diagram).where(models.Diagram.id == diagram_id)
     result = await db.execute(stmt)
     diagram = result.scalar_one_or_none()
@@ -65,41 +72,207 @@ async def read_diagram(
         raise HTTPException(status_code=404, detail="Diagram not found")
     return diagram
 
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+def _parse_if_match(if_match: Optional[str]) -> int:
+    # If-Match: "3", W/"3", 3 모두 허용
+    if if_match is None:
+        raise HTTPException(status_code=428, detail="If-Match header with the diagram version is required")
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid If-Match version: {if_match}")
+
+# --- Cross-diagram queries (diagram_nodes / diagram_edges) ---
+
+@router.get("/projects/{project_id}/nodes", response_model=List[schemas.DiagramNodeRow])
+async def query_project_nodes(
+    project_id: str,
+    tag: Optional[str] = None,
+    type: Optional[str] = None,
+    subtype: Optional[str] = None,
+    diagram_id: Optional[str] = None,
+    limit: int = 1000,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """프로젝트 전체 도면의 노드 검색 (예: tag=P-101이 들어 있는 모든 도면)"""
+    stmt = select(models.DiagramNode).where(models.DiagramNode.project_id == project_id)
+    if tag is not None:
+        stmt = stmt.where(models.DiagramNode.tag == tag)
+    if type is not None:
+        stmt = stmt.where(models.DiagramNode.type == type)
+    if subtype is not None:
+        stmt = stmt.where(models.DiagramNode.subtype == subtype)
+    if diagram_id is not None:
+        stmt = stmt.where(models.DiagramNode.diagram_id == diagram_id)
+    result = await db.execute(stmt.limit(limit))
+    return result.scalars().all()
+
+@router.get("/projects/{project_id}/edges", response_model=List[schemas.DiagramEdgeRow])
+async def query_project_edges(
+    project_id: str,
+    pipe_class: Optional[str] = None,
+    line_number: Optional[str] = None,
+    node_id: Optional[str] = None,
+    diagram_id: Optional[str] = None,
+    limit: int = 1000,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """프로젝트 전체 도면의 엣지 검색 (예: pipe_class=A1B인 모든 라인). node_id는 양 끝 어느 쪽이든 일치"""
+    stmt = select(models.DiagramEdge).where(models.DiagramEdge.project_id == project_id)
+    if pipe_class is not None:
+        stmt = stmt.where(models.DiagramEdge.pipe_class == pipe_class)
+    if line_number is not None:
+        stmt = stmt.where(models.DiagramEdge.line_number == line_number)
+    if node_id is not None:
+        stmt = stmt.where(or_(models.DiagramEdge.from_node == node_id, models.DiagramEdge.to_node == node_id))
+    if diagram_id is not None:
+        stmt = stmt.where(models.DiagramEdge.diagram_id == diagram_id)
+    result = await db.execute(stmt.limit(limit))
+    return result.scalars().all()
+
+@router.get("/projects/{project_id}/tags/next")
+async def next_project_tag(
+    project_id: str,
+    prefix: str,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """프로젝트 전체에서 겹치지 않는 다음 태그 (예: prefix=P -> P-107)"""
+    return {"tag": await tag_index.next_free_tag(db, project_id, prefix)}
+
+@router.get("/projects/{project_id}/tags/duplicates")
+async def project_duplicate_tags(
+    project_id: str,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """프로젝트 전체 태그 중복 검사. 도면 JSON을 읽지 않고 diagram_nodes 인덱스만 사용한다"""
+    duplicates = await tag_index.duplicate_tags(db, project_id)
+    return {"passed": not duplicates, "duplicate_count": len(duplicates), "duplicates": duplicates}
+
+# --- Top-level Diagram resources ---
+
+@router.get("/diagrams/{diagram_id}", response_model=schemas.Diagram)
+async def read_diagram(
+    diagram_id: str,
+    response: Response,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    diagram = await _get_diagram(db, diagram_id)
+    response.headers["ETag"] = _etag(diagram.version)
+    return await _with_current(db, diagram)
+
 @router.put("/diagrams/{diagram_id}", response_model=schemas.Diagram)
 async def update_diagram(
     diagram_id: str,
     diagram_in: schemas.DiagramUpdate,
+    response: Response,
     db: AsyncSession = Depends(database.get_db)
 ):
-    stmt = select(models.Diagram).where(models.Diagram.id == diagram_id)
-    result = await db.execute(stmt)
-    diagram = result.scalar_one_or_none()
-    if not diagram:
-        raise HTTPException(status_code=404, detail="Diagram not found")
+    diagram = await _get_diagram(db, diagram_id)
+    base_version = diagram.version
 
     # Update fields if provided
     if diagram_in.name:
         diagram.name = diagram_in.name
     
     if diagram_in.canonical_json:
-        diagram.canonical_json = diagram_in.canonical_json
-        # Auto-increment version on full update
-        diagram.version += 1
+        # 새 버전은 직전 버전과의 delta만 저장 (주기적으로 snapshot)
+        stored_delta = await revision_store.save_revision(db, diagram, diagram_in.canonical_json)
+        await graph_projection.sync(db, diagram, diagram_in.canonical_json, stored_delta)
         
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 같은 버전을 동시에 저장한 다른 요청이 먼저 commit함
+        await db.rollback()
+        raise HTTPException(status_code=412, detail=f"Diagram version {base_version} was modified concurrently")
     await db.refresh(diagram)
-    return diagram
+    response.headers["ETag"] = _etag(diagram.version)
+    return await _with_current(db, diagram, diagram_in.canonical_json)
 
-@router.get("/diagrams/{diagram_id}/export")
-async def export_diagram(
+@router.patch("/diagrams/{diagram_id}", response_model=schemas.DiagramPatchResult)
+async def patch_diagram(
     diagram_id: str,
+    patch: schemas.DiagramPatch,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(database.get_db)
 ):
-    stmt = select(models.Diagram).where(models.Diagram.id == diagram_id)
+    """
+    요소 단위 편집. If-Match의 버전이 현재 버전과 같을 때만 적용하며 (아니면 412),
+    새 버전과 바뀐 요소만 돌려준다. 저장도 이 변경분만 delta로 남긴다.
+    """
+    expected_version = _parse_if_match(if_match)
+    diagram = await _get_diagram(db, diagram_id)
+    if diagram.version != expected_version:
+        raise HTTPException(status_code=412, detail=f"Diagram version is {diagram.version}, not {expected_version}")
+
+    current = await revision_store.load_current(db, diagram)
+    try:
+        canonical_json, delta = diagram_patch.apply_ops(current, patch.ops)
+    except diagram_patch.PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    version = diagram.version
+    if delta:
+        stored_delta = await revision_store.save_revision(db, diagram, canonical_json, delta)
+        await graph_projection.sync(db, diagram, canonical_json, stored_delta)
+        version = diagram.version
+        try:
+            await db.commit()
+        except IntegrityError:
+            # 같은 버전을 동시에 저장한 다른 요청이 먼저 commit함
+            await db.rollback()
+            raise HTTPException(status_code=412, detail=f"Diagram version {expected_version} was modified concurrently")
+
+    response.headers["ETag"] = _etag(version)
+    collections = delta.get("collections", {})
+    return schemas.DiagramPatchResult(
+        id=diagram_id,
+        version=version,
+        changed={key: change["upsert"] for key, change in collections.items() if "upsert" in change},
+        removed={key: change["remove"] for key, change in collections.items() if "remove" in change},
+        set=delta.get("set", {}),
+        unset=delta.get("unset", [])
+    )
+
+@router.get("/diagrams/{diagram_id}/revisions", response_model=List[schemas.DiagramRevision])
+async def read_diagram_revisions(
+    diagram_id: str,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    await _get_diagram(db, diagram_id)
+    stmt = (
+        select(models.DiagramRevision)
+        .where(models.DiagramRevision.diagram_id == diagram_id)
+        .order_by(models.DiagramRevision.version)
+    )
     result = await db.execute(stmt)
-    diagram = result.scalar_one_or_none()
-    if not diagram:
-        raise HTTPException(status_code=404, detail="Diagram not found")
+    return result.scalars().all()
+
+@router.get("/diagrams/{diagram_id}/revisions/{version}")
+async def read_diagram_revision(
+    diagram_id: str,
+    version: int,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """과거 버전의 canonical_json (Run.diagram_version 시점의 도면 확인용)"""
+    diagram = await _get_diagram(db, diagram_id)
+    canonical_json = await revision_store.load_revision(db, diagram, version)
+    if canonical_json is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return canonical_json
+
+@router.get("/diagrams/{diagram_id}/export")
+async def export_diagram(
+    diagram_id: str,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    diagram = await _get_diagram(db, diagram_id)
     
     # Return JSON with proper headers for download
-    return diagram.canonical_json
+    return await revision_store.load_current(db, diagram)
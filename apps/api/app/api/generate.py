@@ -1,29 +1,76 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_read_db
 from app.schemas.generator_models import (
     GenerateRequest, GenerateResponse,
     RepairRequest, RepairResponse,
     AiAssistRequest, AiAssistResponse,
     GenerateLayoutRequest, GenerateLayoutResponse
 )
-from app.services import generator, layout
+from app.services import edge_router, generator, layered_layout, layout, tag_index
 
 router = APIRouter(
     prefix="/generate",
     tags=["generation"]
 )
 
+def run_layout(req: GenerateLayoutRequest) -> GenerateLayoutResponse:
+    """POST /generate/layout 본문 (동기, CPU 작업). job 큐에서도 스레드풀로 호출한다"""
+    if req.engine == "layered" and req.mode == "incremental":
+        raise ValueError("incremental layout is only supported by the slot engine")
+    rerouted = []
+    if req.mode == "incremental":
+        updated_diagram, moved = layout.apply_layout_incremental(req.diagram, req.node_ids)
+        if req.route_edges:
+            rerouted = edge_router.route_edges(updated_diagram, moved)
+    else:
+        before = {n.id: n.position for n in req.diagram.nodes}
+        if req.engine == "layered":
+            updated_diagram = layered_layout.apply_layered_layout(req.diagram)
+        else:
+            updated_diagram = layout.apply_layout(req.diagram)
+        moved = [n.id for n in updated_diagram.nodes if before[n.id] != n.position]
+        if req.route_edges:
+            rerouted = edge_router.route_edges(updated_diagram)
+    return GenerateLayoutResponse(diagram=updated_diagram, moved_node_ids=moved, rerouted_edge_ids=rerouted)
+
+def run_repair(req: RepairRequest, rules, tag_floors=None) -> RepairResponse:
+    """
+    POST /generate/repair 본문 (동기, CPU 작업). rules는 active ruleset의 RulePlan (없으면 []),
+    tag_floors는 도면이 속한 프로젝트의 prefix별 최대 태그 번호 (tag_index.project_tag_floors)
+    """
+    ends_before = {e.id: (e.from_node, e.to_node) for e in req.diagram.edges}
+    diagram, repairs, remaining, moved = generator.auto_repair(req.diagram, req.violations, rules, tag_floors)
+    # 움직인 노드에 닿는 엣지와 새로 추가 / 재연결된 엣지만 다시 라우팅
+    rewired = [e.id for e in diagram.edges if ends_before.get(e.id) != (e.from_node, e.to_node)]
+    rerouted = edge_router.route_edges(diagram, moved, rewired)
+    return RepairResponse(
+        diagram=diagram,
+        repairs=repairs,
+        remaining_violations=remaining,
+        moved_node_ids=moved,
+        rerouted_edge_ids=rerouted
+    )
+
 @router.post("/layout", response_model=GenerateLayoutResponse)
 async def generate_layout_endpoint(req: GenerateLayoutRequest):
+    if req.engine == "layered" and req.mode == "incremental":
+        raise HTTPException(status_code=400, detail="incremental layout is only supported by the slot engine")
     try:
-        updated_diagram = layout.apply_layout(req.diagram)
-        return GenerateLayoutResponse(diagram=updated_diagram)
+        return run_layout(req)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/template", response_model=GenerateResponse)
-async def generate_template_endpoint(req: GenerateRequest):
+async def generate_template_endpoint(
+    req: GenerateRequest,
+    db: AsyncSession = Depends(get_read_db)
+):
+    # project_id가 있으면 프로젝트의 다른 도면과 겹치지 않는 태그로 생성
+    tag_floors = await tag_index.project_tag_floors(db, req.project_id)
     try:
-        diagram = generator.generate_template(req.template_type)
+        diagram = generator.generate_template(req.template_type, tag_floors)
+        diagram.project_id = req.project_id
         return GenerateResponse(
             diagram=diagram,
             template_type=req.template_type,
@@ -35,34 +82,18 @@ async def generate_template_endpoint(req: GenerateRequest):
 
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database import get_db
-from app import models
+from app.database import get_read_db
+from app.services import ruleset_cache
 
 @router.post("/repair", response_model=RepairResponse)
 async def auto_repair_endpoint(
     req: RepairRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    stmt = select(models.Ruleset).where(models.Ruleset.status == "active").order_by(models.Ruleset.created_at.desc())
-    result = await db.execute(stmt)
-    ruleset = result.scalars().first()
-    rules = []
-    if ruleset:
-        stmt = select(models.Rule).where(
-            models.Rule.ruleset_id == ruleset.id,
-            models.Rule.kind == "validate",
-            models.Rule.enabled == True
-        )
-        result = await db.execute(stmt)
-        rules = result.scalars().all()
-
-    diagram, repairs, remaining = generator.auto_repair(req.diagram, req.violations, rules)
-    return RepairResponse(
-        diagram=diagram,
-        repairs=repairs,
-        remaining_violations=remaining
-    )
+    ruleset = await ruleset_cache.get_active_ruleset(db)
+    rules = ruleset.plan if ruleset else []
+    tag_floors = await tag_index.project_tag_floors(db, req.diagram.project_id)
+    return run_repair(req, rules, tag_floors)
 
 @router.post("/ai-assist", response_model=AiAssistResponse)
 async def ai_assist_endpoint(req: AiAssistRequest):
@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import APIRouter, Body, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+
+from app import database
+from app.api.generate import run_layout, run_repair
+from app.api.validate import ValidateRequestPayload, _resolve_ruleset, run_validation
+from app.schemas.generator_models import GenerateLayoutRequest, RepairRequest
+from app.services import job_queue, ruleset_cache, tag_index
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+class ValidateJobRequest(ValidateRequestPayload):
+    profile: bool = False
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# kind별 payload 스키마. 제출 시점에 검증해서 잘못된 요청은 큐에 넣지 않는다
+JOB_REQUESTS = {
+    "validate": ValidateJobRequest,
+    "layout": GenerateLayoutRequest,
+    "repair": RepairRequest,
+}
+
+# --- Handlers (워커에서 실행) ---
+
+async def _validate_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    req = ValidateJobRequest.model_validate(payload)
+    async with database.ReadSessionLocal() as db:
+        report = await run_validation(db, req, req.profile)
+    return report.model_dump(mode="json")
+
+async def _layout_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    req = GenerateLayoutRequest.model_validate(payload)
+    try:
+        result = await run_in_threadpool(run_layout, req)
+    except ValueError as e:
+        raise job_queue.JobError(str(e))
+    return result.model_dump(mode="json")
+
+async def _repair_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    req = RepairRequest.model_validate(payload)
+    async with database.ReadSessionLocal() as db:
+        ruleset = await ruleset_cache.get_active_ruleset(db)
+        tag_floors = await tag_index.project_tag_floors(db, req.diagram.project_id)
+    rules = ruleset.plan if ruleset else []
+    result = await run_in_threadpool(run_repair, req, rules, tag_floors)
+    return result.model_dump(mode="json")
+
+job_queue.register_handler("validate", _validate_job)
+job_queue.register_handler("layout", _layout_job)
+job_queue.register_handler("repair", _repair_job)
+
+# --- Endpoints ---
+
+async def _get_job(job_id: str):
+    job = await job_queue.get_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/{kind}", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(kind: str, payload: Dict[str, Any] = Body(...)):
+    """
+    validate / layout / repair 요청을 job으로 제출한다. payload는 각 동기 엔드포인트의 요청 본문과 같다
+    (validate는 profile 필드 추가). job id를 바로 돌려주며 결과는 GET /jobs/{id}/result로 받는다.
+    """
+    request_model = JOB_REQUESTS.get(kind)
+    if request_model is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+    try:
+        req = request_model.model_validate(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    if kind == "validate":
+        # ruleset이 없으면 큐에 넣기 전에 실패시킨다
+        async with database.ReadSessionLocal() as db:
+            await _resolve_ruleset(db, req.ruleset_id)
+    elif kind == "layout" and req.engine == "layered" and req.mode == "incremental":
+        raise HTTPException(status_code=400, detail="incremental layout is only supported by the slot engine")
+
+    return await job_queue.get_queue().submit(kind, req.model_dump(mode="json"))
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    return await _get_job(job_id)
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await _get_job(job_id)
+    if job.status not in job_queue.FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if job.status != job_queue.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=job.error or f"Job {job.status}")
+    return job.result_json
+
+async def _stream_status(job_id: str) -> AsyncIterator[str]:
+    """상태가 바뀔 때마다 JobStatus를 NDJSON 한 줄로 내보내고, 종료 상태에서 끝낸다"""
+    queue = job_queue.get_queue()
+    last = None
+    while True:
+        job = await queue.get(job_id)
+        if job is None:
+            return
+        if job.status != last:
+            last = job.status
+            yield JobStatus.model_validate(job).model_dump_json() + "\n"
+        if job.status in job_queue.FINISHED_STATUSES:
+            return
+        await queue.wait_for_change(job_queue.POLL_INTERVAL)
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    await _get_job(job_id)
+    return StreamingResponse(_stream_status(job_id), media_type="application/x-ndjson")
+
+@router.post("/{job_id}/cancel", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """
+    queued / running job을 취소한다. 이미 끝난 job은 그대로 돌려준다.
+    스레드풀에서 돌고 있는 계산은 중간에 멈출 수 없으므로 끝까지 돌지만 결과는 저장되지 않는다.
+    """
+    await _get_job(job_id)
+    return await job_queue.get_queue().cancel(job_id)
+
+@router.delete("/{job_id}", response_model=JobStatus)
+async def delete_job(job_id: str):
+    return await cancel_job(job_id)
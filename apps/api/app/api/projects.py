@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, select
 import uuid
 
 from app import database, models
@@ -30,7 +30,7 @@ async def create_project(
 async def read_projects(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     stmt = select(models.Project).offset(skip).limit(limit)
     result = await db.execute(stmt)
@@ -40,7 +40,7 @@ async def read_projects(
 @router.get("/{project_id}", response_model=schemas.Project)
 async def read_project(
     project_id: str,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     stmt = select(models.Project).where(models.Project.id == project_id)
     result = await db.execute(stmt)
@@ -83,6 +83,11 @@ async def delete_project(
         raise HTTPException(status_code=404, detail="Project not found")
         
     # Manual CASCADE for diagram relationships since ondelete isn't mapped
+    # (PostgreSQL은 FK를 강제하므로 도면을 참조하는 행을 먼저 지운다)
+    diagram_ids = select(models.Diagram.id).where(models.Diagram.project_id == project_id)
+    for model in (models.DiagramRevision, models.DiagramNode, models.DiagramEdge, models.Run):
+        await db.execute(delete(model).where(model.diagram_id.in_(diagram_ids)))
+
     delete_diagrams_stmt = select(models.Diagram).where(models.Diagram.project_id == project_id)
     diagrams_res = await db.execute(delete_diagrams_stmt)
     diagrams_to_delete = diagrams_res.scalars().all()
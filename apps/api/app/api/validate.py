@@ -1,59 +1,173 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Optional
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 from pydantic import BaseModel
 
 from app import database, models
 from app.schemas.canonical import DiagramCanonical
-from app.schemas.rules import ValidationReport
-from app.services.validator import validate as validator_validate
+from app.schemas.rules import DiagramDelta, ValidationReport
+from app.services.validator import iter_violations
+from app.services import revision_store, ruleset_cache, validation_cache
+from app.services.batch_validator import DiagramPayload, iter_batch_reports
+from app.services.incremental_validator import validate_incremental
+from app.services.parallel_validator import validate_off_loop
+from app.services.validation_cache import content_hash
 
 router = APIRouter(
     prefix="/validate",
     tags=["validation"]
 )
 
+# /projects/{project_id}/validate 용 (prefix 없음)
+projects_router = APIRouter(
+    tags=["validation"]
+)
+
 class ValidateRequestPayload(BaseModel):
     diagram: DiagramCanonical
     ruleset_id: Optional[str] = None
 
+class ValidateStreamRequest(BaseModel):
+    diagram: DiagramCanonical
+    ruleset_id: Optional[str] = None
+    max_violations: Optional[int] = None
+    fail_fast: bool = False     # 첫 error 위반에서 중단
+
+class ValidateIncrementalRequest(BaseModel):
+    diagram: DiagramCanonical
+    previous: ValidationReport
+    delta: DiagramDelta
+    ruleset_id: Optional[str] = None
+
+class ValidateBatchRequest(BaseModel):
+    diagrams: List[DiagramCanonical]
+    ruleset_id: Optional[str] = None
+    workers: int = 0        # 2 이상이면 프로세스 풀 사용
+
+async def _resolve_ruleset(db: AsyncSession, ruleset_id: Optional[str]) -> ruleset_cache.CachedRuleset:
+    # ruleset_id가 없으면 status="active" ruleset 사용 (프로세스 캐시 우선)
+    if ruleset_id:
+        ruleset = await ruleset_cache.get_ruleset(db, ruleset_id)
+        if not ruleset:
+            raise HTTPException(status_code=404, detail="Ruleset not found")
+    else:
+        ruleset = await ruleset_cache.get_active_ruleset(db)
+        if not ruleset:
+            raise HTTPException(status_code=404, detail="No active ruleset found")
+    return ruleset
+
+async def _stream_batch(
+    payloads: List[DiagramPayload],
+    targets: List[Tuple[Optional[str], Optional[int]]],
+    ruleset: ruleset_cache.CachedRuleset,
+    workers: int
+) -> AsyncIterator[str]:
+    """
+    도면별 ValidationReport를 NDJSON 한 줄씩 내보낸다.
+    targets[i] = (diagram_id, DB version). version이 있는 도면만 Run을 남기며,
+    Run 행은 마지막에 단일 트랜잭션으로 저장하고 summary 줄을 덧붙인다.
+    """
+    runs = []
+    passed_count = 0
+    failed_count = 0
+    async for i, report, content, error in iter_batch_reports(payloads, ruleset, workers):
+        diagram_id, diagram_version = targets[i]
+        if error is not None:
+            failed_count += 1
+            yield json.dumps({"index": i, "diagram_id": diagram_id, "error": error}, ensure_ascii=False) + "\n"
+            continue
+
+        if report["passed"]:
+            passed_count += 1
+        yield json.dumps({"index": i, "diagram_id": diagram_id, "report": report}, ensure_ascii=False) + "\n"
+
+        if diagram_version is not None:
+            runs.append(models.Run(
+                diagram_id=diagram_id,
+                diagram_version=diagram_version,
+                ruleset_id=ruleset.id,
+                ruleset_hash=ruleset.hash,
+                content_hash=content,
+                result_json=report,
+                passed=report["passed"],
+                error_count=report["error_count"],
+                warning_count=report["warning_count"]
+            ))
+
+    if runs:
+        async with database.SessionLocal() as db:
+            db.add_all(runs)
+            await db.commit()
+
+    yield json.dumps({"summary": {
+        "count": len(payloads),
+        "passed": passed_count,
+        "invalid": failed_count,
+        "runs_saved": len(runs),
+        "ruleset_id": ruleset.id,
+        "ruleset_hash": ruleset.hash
+    }}) + "\n"
+
+def _stream_violations(
+    req: ValidateStreamRequest,
+    ruleset: ruleset_cache.CachedRuleset
+) -> Iterator[str]:
+    """
+    위반을 찾는 대로 NDJSON 한 줄씩 내보내고 마지막에 summary 줄을 붙인다.
+    동기 제너레이터이므로 StreamingResponse가 스레드풀에서 돌려 이벤트 루프를 막지 않는다.
+    """
+    error_count = 0
+    warning_count = 0
+    count = 0
+    violations = iter_violations(req.diagram, ruleset.plan, max_violations=req.max_violations, fail_fast=req.fail_fast)
+    while True:
+        try:
+            violation = next(violations)
+        except StopIteration as stop:
+            # 상한 / fail_fast로 멈췄고 내보내지 않은 위반이 남아 있었을 때만 True
+            truncated = bool(stop.value)
+            break
+        count += 1
+        if violation.severity == "error":
+            error_count += 1
+        elif violation.severity == "warning":
+            warning_count += 1
+        yield violation.model_dump_json() + "\n"
+
+    yield json.dumps({"summary": {
+        "passed": error_count == 0,
+        "error_count": error_count,
+        "warning_count": warning_count,
+        "violation_count": count,
+        "truncated": truncated,
+        "ruleset_id": ruleset.id,
+        "ruleset_hash": ruleset.hash
+    }}) + "\n"
+
 @router.get("/debug")
-async def debug_validation_rules(db: AsyncSession = Depends(database.get_db)):
-    stmt = select(models.Ruleset).where(models.Ruleset.status == "active").order_by(models.Ruleset.created_at.desc())
-    result = await db.execute(stmt)
-    ruleset = result.scalars().first()
+async def debug_validation_rules(db: AsyncSession = Depends(database.get_read_db)):
+    ruleset = await ruleset_cache.get_active_ruleset(db)
     if not ruleset:
         return {"error": "No active ruleset found"}
-        
-    stmt = select(models.Rule).where(
-        models.Rule.ruleset_id == ruleset.id,
-        models.Rule.kind == "validate",
-        models.Rule.enabled == True
-    )
-    result = await db.execute(stmt)
-    rules = result.scalars().all()
-    
+
     debug_info = []
-    
-    for rule in rules:
-        condition = rule.condition_json
-        if isinstance(condition, str):
-            import json
-            try:
-                condition = json.loads(condition)
-            except:
-                condition = {}
-                
+
+    for rule in ruleset.rules:
+        condition = ruleset.conditions[rule.code]
+
         match_type = condition.get("match", "unknown")
-        
+
         # Determine actual check keys
         checks = list(condition.get("check", {}).keys()) if "check" in condition else []
         if not checks and match_type == "node":
             # Direct check keys from condition (e.g. has_field, has_property)
             for k in ["has_field", "has_property", "tag_matches_pattern", "downstream_node", "upstream_node", "has_at_least_one_edge", "connected_node", "connected_node_with_label", "nozzle_with_label", "has_bypass", "has_utility_connection", "straight_pipe_upstream"]:
                 if k in condition: checks.append(k)
-        
+
         debug_info.append({
             "code": rule.code,
             "name": rule.name_ko,
@@ -61,69 +175,231 @@ async def debug_validation_rules(db: AsyncSession = Depends(database.get_db)):
             "checks": checks,
             "condition": condition
         })
-        
+
     return {
-        "active_rules_count": len(rules),
+        "active_rules_count": len(ruleset.rules),
         "rules": debug_info
     }
 
 
+@router.get("/timings")
+async def get_rule_timings(
+    ruleset_hash: Optional[str] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """
+    profile=1로 저장된 최근 Run들의 rule별 실행 비용 집계.
+    ruleset_hash가 없으면 active ruleset의 hash를 사용한다.
+    """
+    if ruleset_hash is None:
+        ruleset = await _resolve_ruleset(db, None)
+        ruleset_hash = ruleset.hash
+
+    stmt = (
+        select(models.Run.result_json)
+        .where(models.Run.ruleset_hash == ruleset_hash, models.Run.profiled == True)
+        .order_by(models.Run.created_at.desc())
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+
+    runs = 0
+    stats = {}
+    for (result_json,) in result:
+        timings = (result_json or {}).get("timings")
+        if not timings:
+            continue
+        runs += 1
+        for t in timings:
+            s = stats.setdefault(t["rule_code"], {
+                "rule_code": t["rule_code"], "samples": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "nodes_visited": 0, "edges_visited": 0, "violation_count": 0
+            })
+            s["samples"] += 1
+            s["total_ms"] += t["elapsed_ms"]
+            s["max_ms"] = max(s["max_ms"], t["elapsed_ms"])
+            s["nodes_visited"] += t.get("nodes_visited", 0)
+            s["edges_visited"] += t.get("edges_visited", 0)
+            s["violation_count"] += t.get("violation_count", 0)
+
+    rules = sorted(stats.values(), key=lambda s: s["total_ms"], reverse=True)
+    for s in rules:
+        s["avg_ms"] = round(s["total_ms"] / s["samples"], 3)
+        s["total_ms"] = round(s["total_ms"], 3)
+
+    return {"ruleset_hash": ruleset_hash, "runs": runs, "rules": rules}
+
+
 @router.post("", response_model=ValidationReport)
 async def validate_diagram(
     req: ValidateRequestPayload,
-    db: AsyncSession = Depends(database.get_db)
+    profile: bool = False,
+    db: AsyncSession = Depends(database.get_read_db)
 ):
-    # 1. ruleset_id가 없으면 DB에서 status="active" ruleset 조회
-    if req.ruleset_id:
-        stmt = select(models.Ruleset).where(models.Ruleset.id == req.ruleset_id)
-        result = await db.execute(stmt)
-        ruleset = result.scalar_one_or_none()
-        if not ruleset:
-            raise HTTPException(status_code=404, detail="Ruleset not found")
-    else:
-        stmt = select(models.Ruleset).where(models.Ruleset.status == "active").order_by(models.Ruleset.created_at.desc())
-        result = await db.execute(stmt)
-        ruleset = result.scalars().first()
-        if not ruleset:
-            raise HTTPException(status_code=404, detail="No active ruleset found")
+    return await run_validation(db, req, profile)
 
-    # 2. 해당 ruleset의 rules를 DB에서 로드 (kind="validate", enabled=True)
-    stmt = select(models.Rule).where(
-        models.Rule.ruleset_id == ruleset.id,
-        models.Rule.kind == "validate",
-        models.Rule.enabled == True
-    )
-    result = await db.execute(stmt)
-    rules = result.scalars().all()
 
-    # 3. validator.validate(canonical, rules) 호출
-    report = validator_validate(req.diagram, rules)
+async def run_validation(db: AsyncSession, req: ValidateRequestPayload, profile: bool = False) -> ValidationReport:
+    """POST /validate 본문 (db는 조회 세션). job 큐(validate job)에서도 같은 경로로 실행한다"""
+    # 1. ruleset_id가 없으면 status="active" ruleset 사용 (프로세스 캐시 우선)
+    ruleset = await _resolve_ruleset(db, req.ruleset_id)
+
+    # 2. 결과 캐시: 내용(content hash)과 ruleset hash가 같으면 재검증하지 않는다
+    # profile 요청은 timings가 필요하므로 항상 새로 실행
+    diagram_id = req.diagram.id
+    content = await run_in_threadpool(content_hash, req.diagram, ruleset.plan.uses_positions)
+    entry = None if profile else validation_cache.get_cached_report(content, ruleset.hash)
+    # 같은 내용이라도 도면 버전이 다르면 (A → B → A) 그 버전의 Run을 남겨야 하므로 버전까지 확인한다
+    diagram_version = None
+    if diagram_id:
+        stmt = select(models.Diagram.version).where(models.Diagram.id == diagram_id)
+        diagram_version = (await db.execute(stmt)).scalar_one_or_none()
+    if entry is not None and (not diagram_id or (diagram_id, diagram_version) in entry.recorded):
+        return validation_cache.mark_cached(entry.report)
+
+    if entry is None and not profile:
+        # 다른 프로세스가 저장한 같은 내용의 Run이 있으면 그 결과를 사용
+        stmt = (
+            select(models.Run.result_json)
+            .where(models.Run.content_hash == content, models.Run.ruleset_hash == ruleset.hash)
+            .order_by(models.Run.created_at.desc())
+            .limit(1)
+        )
+        result_json = (await db.execute(stmt)).scalar_one_or_none()
+        if result_json is not None:
+            entry = validation_cache.cache_report(content, ruleset.hash, ValidationReport.model_validate(result_json))
+
+    if entry is not None:
+        report = validation_cache.mark_cached(entry.report)
+    else:
+        # 3. 캐시된 RulePlan(kind="validate", enabled=True)으로 검증
+        # profile=1이면 rule별 timings가 report에 포함되어 Run.result_json에도 저장된다
+        # 이벤트 루프 밖에서 실행 (대형 도면은 프로세스 풀로 rule 분할)
+        report = await validate_off_loop(req.diagram, ruleset, profile=profile)
+        entry = validation_cache.cache_report(content, ruleset.hash, report)
 
     # 4. runs 테이블에 결과 저장
     # diagram_id가 없으면 runs 저장 생략 (canonical 쪽에 id 속성이 있으면 그 id를 사용)
-    diagram_id = req.diagram.id
     if diagram_id:
-        # Get diagram version
-        diagram_stmt = select(models.Diagram).where(models.Diagram.id == diagram_id)
-        diagram_result = await db.execute(diagram_stmt)
-        diagram_model = diagram_result.scalar_one_or_none()
-        
-        # diagram_model이 있으면 DB 저장
-        if diagram_model:
-            diagram_version = diagram_model.version
-            
+        save = diagram_version is not None
+
+        # 캐시 결과는 이 도면 버전에 같은 내용의 Run이 아직 없을 때만 저장
+        if save and report.cached:
+            stmt = select(models.Run.id).where(
+                models.Run.diagram_id == diagram_id,
+                models.Run.diagram_version == diagram_version,
+                models.Run.ruleset_hash == ruleset.hash,
+                models.Run.content_hash == content
+            ).limit(1)
+            if (await db.execute(stmt)).scalar_one_or_none() is not None:
+                save = False
+
+        # 도면이 있으면 DB 저장
+        if save:
             run = models.Run(
                 diagram_id=diagram_id,
                 diagram_version=diagram_version,
                 ruleset_id=ruleset.id,
                 ruleset_hash=ruleset.hash,
-                result_json=report.model_dump(),
+                content_hash=content,
+                result_json=report.model_dump(exclude={"cached"}),
+                profiled=report.timings is not None,
                 passed=report.passed,
                 error_count=report.error_count,
                 warning_count=report.warning_count
             )
-            db.add(run)
-            await db.commit()
-    
+            # db는 조회 세션. 쓰기 연결은 검증이 끝난 뒤 insert 동안만 잡는다
+            async with database.SessionLocal() as write_db:
+                write_db.add(run)
+                await write_db.commit()
+        entry.recorded.add((diagram_id, diagram_version))
+
     # 5. ValidationReport 반환
     return report
+
+
+@router.post("/stream")
+async def validate_diagram_stream(
+    req: ValidateStreamRequest,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """
+    대형 도면용. 위반을 발견 즉시 NDJSON으로 스트리밍한다 (Violation 한 줄씩 + summary).
+    결과가 잘릴 수 있으므로 Run은 저장하지 않는다.
+    """
+    ruleset = await _resolve_ruleset(db, req.ruleset_id)
+    return StreamingResponse(
+        _stream_violations(req, ruleset),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/incremental", response_model=ValidationReport)
+async def validate_diagram_incremental(
+    req: ValidateIncrementalRequest,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """
+    편집기용 증분 검증. previous는 같은 ruleset으로 얻은 직전 결과여야 하며,
+    delta에 포함된 요소와 그 이웃만 재평가한다. Run은 저장하지 않는다.
+    """
+    ruleset = await _resolve_ruleset(db, req.ruleset_id)
+    return await run_in_threadpool(validate_incremental, req.diagram, ruleset.plan, req.previous, req.delta)
+
+
+@router.post("/batch")
+async def validate_batch(
+    req: ValidateBatchRequest,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """여러 도면을 한 번에 검증. ruleset은 한 번만 로드하며 결과는 NDJSON으로 스트리밍된다."""
+    ruleset = await _resolve_ruleset(db, req.ruleset_id)
+
+    # DB에 존재하는 도면만 Run 저장 대상 (버전 일괄 조회)
+    ids = [d.id for d in req.diagrams]
+    stmt = select(models.Diagram.id, models.Diagram.version).where(models.Diagram.id.in_(ids))
+    result = await db.execute(stmt)
+    versions = dict(result.all())
+
+    targets = [(d.id, versions.get(d.id)) for d in req.diagrams]
+    return StreamingResponse(
+        _stream_batch(req.diagrams, targets, ruleset, req.workers),
+        media_type="application/x-ndjson"
+    )
+
+
+@projects_router.post("/projects/{project_id}/validate")
+async def validate_project(
+    project_id: str,
+    ruleset_id: Optional[str] = None,
+    workers: int = 0,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """프로젝트의 모든 도면을 검증해 NDJSON으로 스트리밍한다."""
+    stmt = select(models.Project.id).where(models.Project.id == project_id)
+    result = await db.execute(stmt)
+    if not result.scalar_one_or_none():
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    ruleset = await _resolve_ruleset(db, ruleset_id)
+
+    stmt = select(models.Diagram).where(models.Diagram.project_id == project_id)
+    result = await db.execute(stmt)
+
+    diagrams = result.scalars().all()
+    # 현재 버전 내용 (최근 snapshot + delta)을 도면 전체에 대해 한 번에 읽는다
+    current = await revision_store.load_current_many(db, diagrams)
+
+    payloads = []
+    targets = []
+    for diagram in diagrams:
+        canonical_json = current[diagram.id]
+        # canonical_json에 id/name이 없으면 Diagram 행의 값으로 보충 (파싱은 워커에서 수행)
+        payloads.append({"id": diagram.id, "name": diagram.name, **canonical_json})
+        targets.append((diagram.id, diagram.version))
+
+    return StreamingResponse(
+        _stream_batch(payloads, targets, ruleset, workers),
+        media_type="application/x-ndjson"
+    )
@@ -1,16 +1,25 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.database import engine, Base
-from app.api import reference, projects, diagrams, validate, repair, generate
+from app.database import engine, Base, SessionLocal, add_missing_columns, dispose_engines
+from app.api import reference, projects, diagrams, validate, repair, generate, jobs
+from app.services import graph_projection, job_queue, process_pool
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: e.g. DB connection
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+    # 질의용 노드 / 엣지 테이블이 비어 있는 기존 도면 채우기
+    async with SessionLocal() as db:
+        await graph_projection.backfill(db)
+    await job_queue.start_queue()
     yield
     # Shutdown
+    await job_queue.stop_queue()
+    process_pool.shutdown_process_pool()
+    await dispose_engines()
 
 app = FastAPI(
     title="PEI Backend API",
@@ -36,8 +45,10 @@ app.include_router(reference.router)
 app.include_router(projects.router)
 app.include_router(diagrams.router)
 app.include_router(validate.router)
+app.include_router(validate.projects_router)
 app.include_router(repair.router)
 app.include_router(generate.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 async def root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, JSON, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, JSON, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -26,7 +26,7 @@ class Diagram(Base):
     name = Column(String, nullable=False)
     diagram_type = Column(String, nullable=False) # 'PFD', 'PID', etc.
     version = Column(Integer, nullable=False, default=1)
-    canonical_json = Column(JSON, nullable=False)
+    canonical_json = Column(JSON, nullable=False)   # 최근 snapshot 내용. 현재 내용은 revision_store.load_current
     canonical_schema_version = Column(Integer, nullable=False, default=1)
     status = Column(String, default='draft')
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -34,6 +34,60 @@ class Diagram(Base):
 
     project = relationship("Project", back_populates="diagrams")
     runs = relationship("Run", back_populates="diagram")
+    revisions = relationship("DiagramRevision", back_populates="diagram")
+
+class DiagramRevision(Base):
+    __tablename__ = "diagram_revisions"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    diagram_id = Column(String, ForeignKey("diagrams.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False) # 'snapshot' (전체 canonical_json), 'delta' (직전 버전과의 차이)
+    data_json = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint('diagram_id', 'version', name='uq_diagram_revision_version'),)
+
+    diagram = relationship("Diagram", back_populates="revisions")
+
+# canonical_json의 노드 / 엣지를 질의용으로 펼친 테이블 (graph_projection이 저장 시 동기화)
+class DiagramNode(Base):
+    __tablename__ = "diagram_nodes"
+
+    diagram_id = Column(String, ForeignKey("diagrams.id"), primary_key=True)
+    node_id = Column(String, primary_key=True)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
+    type = Column(String, nullable=True)
+    subtype = Column(String, nullable=True)
+    tag = Column(String, nullable=True)
+    tag_prefix = Column(String, nullable=True)  # 'P-101' -> 'P', 101 (allocators.split_tag)
+    tag_seq = Column(Integer, nullable=True)
+    name = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_diagram_nodes_project_tag', 'project_id', 'tag'),
+        Index('ix_diagram_nodes_tag', 'tag'),
+        # prefix별 정렬된 순번: 다음 빈 번호 = max(tag_seq) 한 번의 인덱스 탐색
+        Index('ix_diagram_nodes_project_tag_seq', 'project_id', 'tag_prefix', 'tag_seq'),
+    )
+
+class DiagramEdge(Base):
+    __tablename__ = "diagram_edges"
+
+    diagram_id = Column(String, ForeignKey("diagrams.id"), primary_key=True)
+    edge_id = Column(String, primary_key=True)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
+    type = Column(String, nullable=True)
+    from_node = Column(String, nullable=True)
+    to_node = Column(String, nullable=True)
+    line_number = Column(String, nullable=True)
+    pipe_class = Column(String, nullable=True)
+    pipe_size = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_diagram_edges_project_pipe_class', 'project_id', 'pipe_class'),
+        Index('ix_diagram_edges_project_line_number', 'project_id', 'line_number'),
+    )
 
 class Ruleset(Base):
     __tablename__ = "rulesets"
@@ -83,11 +137,31 @@ class Run(Base):
     diagram_version = Column(Integer, nullable=False)
     ruleset_id = Column(String, ForeignKey("rulesets.id"), nullable=False)
     ruleset_hash = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True, index=True)    # validation_cache.content_hash
     result_json = Column(JSON, nullable=False)
+    profiled = Column(Boolean, nullable=True, default=False)   # result_json에 rule별 timings 포함 (profile=1)
     passed = Column(Boolean, nullable=False)
     error_count = Column(Integer, default=0)
     warning_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # /validate/timings: ruleset hash별 최근 profile Run
+        Index('ix_runs_ruleset_hash_profiled', 'ruleset_hash', 'profiled', 'created_at'),
+    )
+
     diagram = relationship("Diagram", back_populates="runs")
     ruleset = relationship("Ruleset", back_populates="runs")
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    kind = Column(String, nullable=False) # 'validate', 'layout', 'repair'
+    status = Column(String, nullable=False, default='queued', index=True) # queued, running, succeeded, failed, cancelled
+    payload_json = Column(JSON, nullable=False)
+    result_json = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -3,11 +3,12 @@
 
 from __future__ import annotations
 
+from bisect import insort
 from enum import Enum
 from typing import Any
 from uuid import uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 # ---------------------------------------------------------------------------
@@ -84,6 +85,100 @@ class CanonicalEdge(BaseModel):
     properties: EdgeProperties = Field(default_factory=EdgeProperties)
     waypoints: list[Position] = Field(default_factory=list)
 
+
+class _DiagramIndex:
+    """
+    DiagramCanonical 인접 인덱스 (id→node, id→edge, from→edges, to→edges).
+    nodes/edges 리스트 끝에 append된 항목은 증분 반영하고, 삭제·교체가 감지되거나
+    도면의 topology 버전이 빌드 시점과 다르면 전체 재빌드한다.
+    """
+
+    __slots__ = (
+        "nodes_ref", "edges_ref", "node_count", "edge_count",
+        "last_node", "last_edge", "version",
+        "nodes_by_id", "edges_by_id", "out_edges", "in_edges", "edge_positions",
+    )
+
+    def __init__(self, diagram: DiagramCanonical):
+        self.rebuild(diagram)
+
+    def rebuild(self, diagram: DiagramCanonical) -> None:
+        self.nodes_ref = diagram.nodes
+        self.edges_ref = diagram.edges
+        self.nodes_by_id: dict[str, CanonicalNode] = {}
+        self.edges_by_id: dict[str, CanonicalEdge] = {}
+        self.out_edges: dict[str, list[CanonicalEdge]] = {}
+        self.in_edges: dict[str, list[CanonicalEdge]] = {}
+        self.edge_positions: dict[int, int] = {}    # id(edge) -> edges 리스트 위치
+        self.node_count = 0
+        self.edge_count = 0
+        self.last_node = None
+        self.last_edge = None
+        self._absorb(diagram)
+        self.version = diagram._topology_version
+
+    def _absorb(self, diagram: DiagramCanonical) -> None:
+        nodes_by_id = self.nodes_by_id
+        for node in diagram.nodes[self.node_count:]:
+            # 중복 id는 첫 번째 노드 우선 (기존 선형 탐색과 동일)
+            nodes_by_id.setdefault(node.id, node)
+        edges_by_id = self.edges_by_id
+        out_edges = self.out_edges
+        in_edges = self.in_edges
+        edge_positions = self.edge_positions
+        for i, edge in enumerate(diagram.edges[self.edge_count:], start=self.edge_count):
+            edge_positions[id(edge)] = i
+            edges_by_id.setdefault(edge.id, edge)
+            out_edges.setdefault(edge.from_node, []).append(edge)
+            in_edges.setdefault(edge.to_node, []).append(edge)
+        self.node_count = len(diagram.nodes)
+        self.edge_count = len(diagram.edges)
+        self.last_node = diagram.nodes[-1] if diagram.nodes else None
+        self.last_edge = diagram.edges[-1] if diagram.edges else None
+
+    def move_edge(self, edge: CanonicalEdge, old_from: str, old_to: str) -> None:
+        """재연결된 엣지를 인접 리스트 사이에서 옮긴다. 리스트는 재빌드와 같은 도면 순서를 유지한다."""
+        if edge.from_node != old_from:
+            self._detach(self.out_edges, old_from, edge)
+            self._attach(self.out_edges, edge.from_node, edge)
+        if edge.to_node != old_to:
+            self._detach(self.in_edges, old_to, edge)
+            self._attach(self.in_edges, edge.to_node, edge)
+
+    @staticmethod
+    def _detach(adjacency: dict[str, list[CanonicalEdge]], node_id: str, edge: CanonicalEdge) -> None:
+        edges = adjacency.get(node_id, [])
+        for i, candidate in enumerate(edges):
+            if candidate is edge:
+                del edges[i]
+                break
+        # 재빌드 결과와 같도록 빈 리스트는 키째 제거 (has_at_least_one_edge 등은 키 존재로 판단)
+        if not edges:
+            adjacency.pop(node_id, None)
+
+    def _attach(self, adjacency: dict[str, list[CanonicalEdge]], node_id: str, edge: CanonicalEdge) -> None:
+        positions = self.edge_positions
+        insort(adjacency.setdefault(node_id, []), edge, key=lambda e: positions[id(e)])
+
+    @staticmethod
+    def _is_prefix(items: list, count: int, last: Any) -> bool:
+        if len(items) < count:
+            return False
+        return count == 0 or items[count - 1] is last
+
+    def sync(self, diagram: DiagramCanonical) -> None:
+        if (
+            self.version != diagram._topology_version
+            or self.nodes_ref is not diagram.nodes
+            or self.edges_ref is not diagram.edges
+            or not self._is_prefix(diagram.nodes, self.node_count, self.last_node)
+            or not self._is_prefix(diagram.edges, self.edge_count, self.last_edge)
+        ):
+            self.rebuild(diagram)
+        elif self.node_count != len(diagram.nodes) or self.edge_count != len(diagram.edges):
+            self._absorb(diagram)
+
+
 class DiagramCanonical(BaseModel):
     """단일 P&ID 도면의 Canonical 표현. DB 저장 기준."""
     canonical_schema_version: int = 1
@@ -95,21 +190,65 @@ class DiagramCanonical(BaseModel):
     edges: list[CanonicalEdge] = Field(default_factory=list)
     metadata: dict[str, Any] = Field(default_factory=dict)
 
+    _index: _DiagramIndex | None = PrivateAttr(default=None)
+    # 이 도면의 노드 id / 엣지 연결 변경 횟수. 인덱스는 빌드 시점의 값과 비교해 재빌드 여부를 정한다
+    _topology_version: int = PrivateAttr(default=0)
+
+    @property
+    def index(self) -> _DiagramIndex:
+        """지연 빌드되는 인접 인덱스. 조회 시마다 nodes/edges 변경분을 동기화한다."""
+        if self._index is None:
+            self._index = _DiagramIndex(self)
+        else:
+            self._index.sync(self)
+        return self._index
+
+    def invalidate_index(self) -> None:
+        """
+        자동 감지되지 않는 변경 후 호출: 리스트 항목 제자리 교체, 노드 id 변경,
+        rewire_edge를 거치지 않은 엣지 from_node / to_node 직접 대입 (다른 도면과 공유하는 요소 포함)
+        """
+        self._topology_version += 1
+        self._index = None
+
+    def rewire_edge(self, edge: CanonicalEdge, from_node: str | None = None, to_node: str | None = None) -> None:
+        """
+        엣지 양 끝을 바꾸면서 인접 인덱스를 제자리에서 갱신한다.
+        edge.to_node = ... 직접 대입은 인덱스에 반영되지 않으므로 (invalidate_index 필요) 이 메서드를 쓴다.
+        """
+        index = self.index
+        old_from, old_to = edge.from_node, edge.to_node
+        if from_node is not None:
+            edge.from_node = from_node
+        if to_node is not None:
+            edge.to_node = to_node
+        self._topology_version += 1
+        position = index.edge_positions.get(id(edge))
+        if position is not None and position < len(self.edges) and self.edges[position] is edge:
+            index.move_edge(edge, old_from, old_to)
+            # 이 인덱스에는 이미 반영됨. 도면에 없는 엣지였다면 다음 조회 때 재빌드된다
+            index.version = self._topology_version
+
     def node_by_id(self, node_id: str) -> CanonicalNode | None:
-        return next((n for n in self.nodes if n.id == node_id), None)
+        return self.index.nodes_by_id.get(node_id)
+
+    def edge_by_id(self, edge_id: str) -> CanonicalEdge | None:
+        return self.index.edges_by_id.get(edge_id)
 
     def edges_from(self, node_id: str) -> list[CanonicalEdge]:
-        return [e for e in self.edges if e.from_node == node_id]
+        return list(self.index.out_edges.get(node_id, ()))
 
     def edges_to(self, node_id: str) -> list[CanonicalEdge]:
-        return [e for e in self.edges if e.to_node == node_id]
+        return list(self.index.in_edges.get(node_id, ()))
 
     def downstream_nodes(self, node_id: str) -> list[CanonicalNode]:
         """직접 연결된 하류 노드 목록"""
-        return [n for e in self.edges_from(node_id)
-                if (n := self.node_by_id(e.to_node)) is not None]
+        index = self.index
+        return [n for e in index.out_edges.get(node_id, ())
+                if (n := index.nodes_by_id.get(e.to_node)) is not None]
 
     def upstream_nodes(self, node_id: str) -> list[CanonicalNode]:
         """직접 연결된 상류 노드 목록"""
-        return [n for e in self.edges_to(node_id)
-                if (n := self.node_by_id(e.from_node)) is not None]
+        index = self.index
+        return [n for e in index.in_edges.get(node_id, ())
+                if (n := index.nodes_by_id.get(e.from_node)) is not None]
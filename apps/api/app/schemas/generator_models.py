@@ -1,4 +1,4 @@
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Literal
 from pydantic import BaseModel
 
 from app.schemas.canonical import DiagramCanonical
@@ -6,12 +6,19 @@ from app.schemas.rules import Violation
 
 class GenerateLayoutRequest(BaseModel):
     diagram: DiagramCanonical
+    engine: Literal["slot", "layered"] = "slot"    # layered: 순환 / 다중 트레인용 계층 레이아웃
+    mode: Literal["full", "incremental"] = "full"   # incremental은 slot 엔진만 지원
+    node_ids: Optional[List[str]] = None    # incremental: 새로 추가되거나 재연결된 노드
+    route_edges: bool = True                # 레이아웃 후 엣지 waypoints 직교 라우팅 (incremental은 움직인 노드의 엣지만)
 
 class GenerateLayoutResponse(BaseModel):
     diagram: DiagramCanonical
+    moved_node_ids: List[str] = []
+    rerouted_edge_ids: List[str] = []
 
 class GenerateRequest(BaseModel):
     template_type: str
+    project_id: Optional[str] = None    # 있으면 프로젝트 전체에서 겹치지 않는 태그 번호 사용
 
 class GenerateResponse(BaseModel):
     diagram: DiagramCanonical
@@ -27,6 +34,8 @@ class RepairResponse(BaseModel):
     diagram: DiagramCanonical
     repairs: List[Dict[str, Any]]
     remaining_violations: List[Violation]
+    moved_node_ids: List[str] = []
+    rerouted_edge_ids: List[str] = []
 
 class AiAssistRequest(BaseModel):
     diagram: DiagramCanonical
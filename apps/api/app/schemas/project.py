@@ -1,4 +1,4 @@
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Literal
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -58,3 +58,64 @@ class Diagram(DiagramBase):
 
     class Config:
         from_attributes = True
+
+class DiagramRevision(BaseModel):
+    diagram_id: str
+    version: int
+    kind: str  # snapshot, delta
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# Diagram Patch Schemas
+class DiagramPatchOp(BaseModel):
+    """
+    요소 id 기준 편집 연산.
+    upsert: element 추가/교체, update: id 요소에 fields 병합, remove: id 요소 삭제 (collection 필수)
+    set / unset: nodes·edges·signal_lines 외 최상위 키(metadata 등) 변경 (key 필수)
+    """
+    op: Literal["upsert", "update", "remove", "set", "unset"]
+    collection: Optional[Literal["nodes", "edges", "signal_lines"]] = None
+    id: Optional[str] = None
+    element: Optional[Dict[str, Any]] = None
+    fields: Optional[Dict[str, Any]] = None
+    key: Optional[str] = None
+    value: Any = None
+
+class DiagramPatch(BaseModel):
+    ops: List[DiagramPatchOp]
+
+class DiagramPatchResult(BaseModel):
+    id: str
+    version: int
+    # 바뀐 요소만: 컬렉션별 변경 후 요소 / 삭제된 id, 바뀐 최상위 키
+    changed: Dict[str, List[Dict[str, Any]]] = {}
+    removed: Dict[str, List[str]] = {}
+    set: Dict[str, Any] = {}
+    unset: List[str] = []
+
+# Projection (query) Schemas
+class DiagramNodeRow(BaseModel):
+    diagram_id: str
+    node_id: str
+    type: Optional[str] = None
+    subtype: Optional[str] = None
+    tag: Optional[str] = None
+    name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class DiagramEdgeRow(BaseModel):
+    diagram_id: str
+    edge_id: str
+    type: Optional[str] = None
+    from_node: Optional[str] = None
+    to_node: Optional[str] = None
+    line_number: Optional[str] = None
+    pipe_class: Optional[str] = None
+    pipe_size: Optional[str] = None
+
+    class Config:
+        from_attributes = True
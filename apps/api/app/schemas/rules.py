@@ -9,11 +9,29 @@ class Violation(BaseModel):
     node_id: str | None = None
     edge_id: str | None = None
 
+class RuleTiming(BaseModel):
+    """profile 모드에서 rule별로 기록되는 실행 비용"""
+    rule_code: str
+    elapsed_ms: float
+    nodes_visited: int = 0      # node 검사가 실행된 노드 수 (where 필터 통과분)
+    edges_visited: int = 0      # edge 검사가 실행된 엣지 수
+    violation_count: int = 0
+
 class ValidationReport(BaseModel):
     passed: bool
     error_count: int
     warning_count: int
     violations: List[Violation]
+    timings: Optional[List[RuleTiming]] = None     # validate(profile=True)일 때만 채워짐
+    cached: bool = False        # 결과 캐시(메모리 또는 runs 테이블)에서 반환된 경우
+
+class DiagramDelta(BaseModel):
+    """
+    이전 검증 이후 바뀐 요소. 추가·수정·삭제된 노드/엣지 id를 모두 포함한다.
+    삭제되거나 재연결된 엣지의 (이전) 양 끝 노드 id도 node_ids에 포함해야 한다.
+    """
+    node_ids: List[str] = []
+    edge_ids: List[str] = []
 
 class ValidateRequest(BaseModel):
     diagram_id: Optional[str] = None
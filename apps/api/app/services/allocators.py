@@ -0,0 +1,126 @@
+from typing import Any, Dict, Optional, Tuple
+
+# 기존 요소가 없을 때의 기준 번호 (첫 태그 / 라인번호는 101)
+SEQUENCE_BASE = 100
+
+
+def _field(item: Any, name: str) -> Optional[str]:
+    # CanonicalNode/Edge 모델과 dict 기반 도면(schemas.project) 모두 지원
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+
+def split_tag(tag: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """'{prefix}-{n}' 태그를 (prefix, n)으로. 순번 형식이 아니면 (None, None)"""
+    if not tag or "-" not in tag:
+        return None, None
+    prefix, seq = tag.rsplit("-", 1)
+    if not prefix or not seq.isdigit():
+        return None, None
+    return prefix, int(seq)
+
+
+class TagAllocator:
+    """
+    도면 단위 순번 태그 발급기 ("{prefix}-{n}").
+    prefix별 최대 번호는 처음 요청될 때 한 번만 스캔하고, 이후 노드 목록 끝에 추가된 노드만 반영한다.
+    발급한 번호는 예약되므로 노드를 추가하기 전에 연속으로 호출해도 태그가 겹치지 않는다.
+    기존 노드의 태그를 제자리에서 바꾼 경우에는 새로 만들어야 한다.
+    floors(prefix -> 프로젝트의 다른 도면에서 쓰인 최대 번호)를 주면 그보다 큰 번호만 발급한다.
+    """
+
+    def __init__(self, diagram: Any, floors: Optional[Dict[str, int]] = None):
+        self.diagram = diagram
+        self._nodes_ref = diagram.nodes
+        self._count = len(diagram.nodes)
+        self._max: Dict[str, int] = {}
+        self._floors = floors or {}
+
+    @staticmethod
+    def _sequence(tag: Optional[str], prefix: str) -> Optional[int]:
+        head = f"{prefix}-"
+        if not tag or not tag.startswith(head):
+            return None
+        try:
+            return int(tag.replace(head, ""))
+        except ValueError:
+            return None
+
+    def _sync(self) -> None:
+        nodes = self.diagram.nodes
+        if nodes is not self._nodes_ref or len(nodes) < self._count:
+            # 목록이 교체되었으면 prefix별 최대값을 다시 스캔한다 (예약분은 유지)
+            self._nodes_ref = nodes
+            reserved = self._max
+            self._max = {}
+            for prefix in reserved:
+                self._scan(prefix)
+                self._max[prefix] = max(self._max[prefix], reserved[prefix])
+            self._count = len(nodes)
+            return
+        if len(nodes) == self._count or not self._max:
+            self._count = len(nodes)
+            return
+        for node in nodes[self._count:]:
+            tag = _field(node, "tag")
+            for prefix, current in self._max.items():
+                seq = self._sequence(tag, prefix)
+                if seq is not None and seq > current:
+                    self._max[prefix] = seq
+        self._count = len(nodes)
+
+    def _scan(self, prefix: str) -> None:
+        max_num = max(SEQUENCE_BASE, self._floors.get(prefix, SEQUENCE_BASE))
+        for node in self.diagram.nodes:
+            seq = self._sequence(_field(node, "tag"), prefix)
+            if seq is not None:
+                max_num = max(max_num, seq)
+        self._max[prefix] = max_num
+
+    def next(self, prefix: str) -> str:
+        self._sync()
+        if prefix not in self._max:
+            self._scan(prefix)
+        self._max[prefix] += 1
+        return f"{prefix}-{self._max[prefix]}"
+
+
+class LineNumberAllocator:
+    """
+    도면 단위 라인번호 발급기 ('{size}-{fluid}-{seq:03d}-{cls}').
+    순번은 fluid와 무관하게 도면 전체의 최대 순번 다음 값이며 (라인번호가 없으면 101),
+    엣지 목록 끝에 추가된 엣지만 증분 반영한다.
+    """
+
+    def __init__(self, diagram: Any):
+        self.diagram = diagram
+        self._edges_ref = diagram.edges
+        self._count = 0
+        self._max: Optional[int] = None
+        self._sync()
+
+    @staticmethod
+    def _sequence(line_number: Optional[str]) -> Optional[int]:
+        if not line_number:
+            return None
+        parts = line_number.split("-")
+        if len(parts) >= 3 and parts[-2].isdigit():
+            return int(parts[-2])
+        return None
+
+    def _sync(self) -> None:
+        edges = self.diagram.edges
+        if edges is not self._edges_ref or len(edges) < self._count:
+            self._edges_ref = edges
+            self._count = 0
+        for edge in edges[self._count:]:
+            seq = self._sequence(_field(edge, "line_number"))
+            if seq is not None and (self._max is None or seq > self._max):
+                self._max = seq
+        self._count = len(edges)
+
+    def next(self, fluid: str = "P", size: str = '2"', cls: str = "A1B") -> str:
+        self._sync()
+        self._max = (SEQUENCE_BASE if self._max is None else self._max) + 1
+        return f"{size}-{fluid}-{self._max:03d}-{cls}"
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.schemas.canonical import DiagramCanonical
+from app.services.process_pool import MAX_PROCESS_WORKERS, get_process_pool
+from app.services.ruleset_cache import CachedRuleset
+from app.services.validation_cache import content_hash
+from app.services.validator import get_rule_plan, validate
+
+MAX_BATCH_WORKERS = MAX_PROCESS_WORKERS
+
+DiagramPayload = Union[DiagramCanonical, Dict[str, Any]]
+
+
+def validate_payload(
+    payload: DiagramPayload, rules: List[Any], ruleset_hash: Optional[str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    단일 도면 검증 → (report dict, content hash, error message). 프로세스 풀 워커에서도 호출된다.
+    RulePlan은 클로저라 pickle되지 않으므로 rule 목록과 hash를 받아 워커 프로세스에서 컴파일·캐시한다.
+    content hash(Run.content_hash)도 도면을 파싱한 워커에서 계산한다.
+    도면 파싱 실패는 예외 대신 error로 반환해 배치 전체를 중단하지 않는다.
+    """
+    try:
+        canonical = DiagramCanonical.model_validate(payload)
+    except ValidationError as e:
+        return None, None, str(e)
+    plan = get_rule_plan(rules, ruleset_hash)
+    return validate(canonical, plan).model_dump(), content_hash(canonical, plan.uses_positions), None
+
+
+async def iter_batch_reports(
+    payloads: List[DiagramPayload],
+    ruleset: CachedRuleset,
+    workers: int = 0,
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str], Optional[str]]]:
+    """
+    payloads를 순서대로 검증해 (index, report dict, content hash, error message)를 생성한다.
+    workers > 1이면 공유 프로세스 풀에 최대 workers개씩 넘겨 병렬 검증하되 결과는 입력 순서대로 내보낸다.
+    """
+    workers = min(workers, MAX_BATCH_WORKERS, len(payloads))
+    if workers <= 1:
+        for i, payload in enumerate(payloads):
+            report, content, error = await run_in_threadpool(validate_payload, payload, ruleset.plan, ruleset.hash)
+            yield i, report, content, error
+        return
+
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+
+    def submit(payload: DiagramPayload) -> asyncio.Future:
+        return loop.run_in_executor(pool, validate_payload, payload, ruleset.rules, ruleset.hash)
+
+    # 풀을 다른 요청과 나눠 쓰므로 한 번에 workers개까지만 제출한다
+    pending = [submit(payload) for payload in payloads[:workers]]
+    try:
+        for i in range(len(payloads)):
+            report, content, error = await pending[i]
+            if i + workers < len(payloads):
+                pending.append(submit(payloads[i + workers]))
+            yield i, report, content, error
+    finally:
+        # 클라이언트가 스트림을 중단한 경우 아직 시작하지 않은 작업은 취소
+        for future in pending:
+            future.cancel()
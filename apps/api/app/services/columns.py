@@ -0,0 +1,138 @@
+from array import array
+from heapq import merge
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.schemas.canonical import DiagramCanonical
+
+# (node type, subtype) 버킷 키. subtype이 None이면 type 전체
+BucketKey = Tuple[str, Optional[str]]
+
+# 존재 마스크 키: ("field", 속성 이름) / ("property", properties 키) / ("linked",) 엣지가 하나라도 있는 노드
+MaskKey = Tuple[str, ...]
+
+# 노드가 없는 엣지 끝점
+MISSING = -1
+
+
+def _field_mask(items: Sequence[Any], name: str) -> bytearray:
+    # has_field 판정과 같다: 값이 있고 공백뿐인 문자열이 아니면 1
+    return bytearray(1 if (value := getattr(item, name, None)) and str(value).strip() else 0 for item in items)
+
+
+def unset_positions(mask: bytearray, positions: Iterable[int]) -> Iterator[int]:
+    """positions 중 mask가 0인 위치 (오름차순 유지). 전체 범위면 bytearray.find로 1인 구간을 건너뛴다"""
+    if isinstance(positions, range) and positions == range(len(mask)):
+        i = mask.find(0)
+        while i != -1:
+            yield i
+            i = mask.find(0, i + 1)
+        return
+    for i in positions:
+        if not mask[i]:
+            yield i
+
+
+class DiagramColumns:
+    """
+    검증 1회 동안 쓰는 도면의 열(column) 뷰. 요소는 도면 순서의 정수 위치로 가리킨다.
+    - type(·subtype) 코드별 위치 배열: where.type / subtype 조건이 있는 rule은 해당 버킷만 순회
+    - 엣지 from / to 노드 위치 배열 (array('l'), 없는 노드는 MISSING), 처음 요청할 때 생성
+    - 필드 존재 마스크 (bytearray, 키별로 처음 요청할 때 한 번 계산): 존재 검사 rule은 마스크를 훑어
+      통과한 요소의 검사 호출을 건너뛴다
+    위치 배열은 오름차순이므로 결과는 항상 도면 순서를 따른다.
+    요소의 제자리 수정을 감지하지 않으므로 도면이 바뀌면 새로 만들어야 한다.
+    """
+
+    __slots__ = (
+        "nodes", "edges", "node_types", "node_subtypes", "edge_types",
+        "node_positions_by_id", "_edge_ends", "_node_masks", "_edge_masks",
+    )
+
+    def __init__(self, canonical: DiagramCanonical):
+        self.nodes = canonical.nodes
+        self.edges = canonical.edges
+        self.node_types: Dict[str, List[int]] = {}
+        self.node_subtypes: Dict[BucketKey, List[int]] = {}
+        self.edge_types: Dict[str, List[int]] = {}
+        # 같은 id가 여러 번 나오면 첫 번째 노드 (DiagramCanonical.index.nodes_by_id와 같은 규칙)
+        self.node_positions_by_id: Dict[str, int] = {}
+
+        for i, node in enumerate(self.nodes):
+            node_type = node.type.value
+            self.node_types.setdefault(node_type, []).append(i)
+            self.node_subtypes.setdefault((node_type, node.subtype), []).append(i)
+            self.node_positions_by_id.setdefault(node.id, i)
+
+        for i, edge in enumerate(self.edges):
+            self.edge_types.setdefault(edge.type.value, []).append(i)
+
+        self._edge_ends: Optional[Tuple[array, array]] = None
+        self._node_masks: Dict[MaskKey, bytearray] = {}
+        self._edge_masks: Dict[MaskKey, bytearray] = {}
+
+    # --- 위치 배열 ---
+
+    def node_positions(self, buckets: Sequence[BucketKey]) -> List[int]:
+        lists = [
+            self.node_types.get(node_type, ()) if subtype is None else self.node_subtypes.get((node_type, subtype), ())
+            for node_type, subtype in buckets
+        ]
+        if len(lists) == 1:
+            return lists[0]
+        # 버킷이 겹치지 않으므로 병합만으로 도면 순서가 된다
+        return list(merge(*lists))
+
+    def edge_positions(self, edge_type: str) -> List[int]:
+        return self.edge_types.get(edge_type, [])
+
+    @property
+    def edge_ends(self) -> Tuple[array, array]:
+        """엣지 위치별 (from 노드 위치 배열, to 노드 위치 배열)"""
+        if self._edge_ends is None:
+            positions = self.node_positions_by_id
+            self._edge_ends = (
+                array("l", [positions.get(edge.from_node, MISSING) for edge in self.edges]),
+                array("l", [positions.get(edge.to_node, MISSING) for edge in self.edges]),
+            )
+        return self._edge_ends
+
+    # --- 존재 마스크 ---
+
+    # 마스크는 전체 열을 한 번에 계산하므로, 일부 버킷만 순회하는 rule은 build=False로
+    # 이미 만들어진 마스크만 쓰고 없으면 None (검사를 직접 호출)
+
+    def node_mask(self, key: MaskKey, build: bool = True) -> Optional[bytearray]:
+        """노드 위치별 1/0. key는 MaskKey 참고"""
+        mask = self._node_masks.get(key)
+        if mask is None and build:
+            mask = self._node_masks[key] = self._build_node_mask(key)
+        return mask
+
+    def edge_mask(self, key: MaskKey, build: bool = True) -> Optional[bytearray]:
+        """엣지 위치별 1/0. ("field", 속성 이름)만 지원"""
+        mask = self._edge_masks.get(key)
+        if mask is None and build:
+            kind, name = key
+            if kind != "field":
+                raise ValueError(f"Unsupported edge mask: {key}")
+            mask = self._edge_masks[key] = _field_mask(self.edges, name)
+        return mask
+
+    def _build_node_mask(self, key: MaskKey) -> bytearray:
+        kind = key[0]
+        if kind == "field":
+            name = key[1]
+            return _field_mask(self.nodes, name)
+        if kind == "property":
+            name = key[1]
+            return bytearray(n.properties.get(name) is not None for n in self.nodes)
+        if kind == "linked":
+            # from / to 위치 배열로 연결 수를 센 뒤, id가 중복된 노드도 같은 id의 결과를 따르게 한다
+            degree = bytearray(len(self.nodes))
+            for end in self.edge_ends:
+                for i in end:
+                    if i != MISSING:
+                        degree[i] = 1
+            positions = self.node_positions_by_id
+            return bytearray(degree[positions[n.id]] for n in self.nodes)
+        raise ValueError(f"Unsupported node mask: {key}")
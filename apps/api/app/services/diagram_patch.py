@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Tuple
+
+from app.schemas.project import DiagramPatchOp
+from app.services.revision_store import COLLECTIONS, apply_delta, has_unique_ids
+
+
+class PatchError(ValueError):
+    def __init__(self, index: int, message: str):
+        super().__init__(f"ops[{index}]: {message}")
+        self.index = index
+
+
+def apply_ops(doc: Dict[str, Any], ops: List[DiagramPatchOp]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    편집 연산을 canonical_json에 적용해 (새 canonical_json, revision delta)를 반환한다.
+    delta는 revision_store.compute_delta와 같은 형식이라 전체 비교 없이 그대로 저장할 수 있고,
+    건드린 컬렉션만 id 색인을 만든다. 실패하면 PatchError (doc은 수정하지 않는다).
+    """
+    original: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    current: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    upserts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    removes: Dict[str, Dict[str, None]] = {}    # 삭제 순서를 유지하는 set
+    changed: Dict[str, Any] = {}
+    unset: Dict[str, None] = {}
+
+    for i, op in enumerate(ops):
+        if op.op in ("set", "unset"):
+            if not op.key or op.key in COLLECTIONS:
+                raise PatchError(i, "set/unset needs a top-level key other than nodes, edges, signal_lines")
+            if op.op == "set":
+                changed[op.key] = op.value
+                unset.pop(op.key, None)
+            else:
+                changed.pop(op.key, None)
+                if op.key in doc:
+                    unset[op.key] = None
+            continue
+
+        collection = op.collection
+        if collection is None:
+            raise PatchError(i, f"{op.op} needs a collection")
+        if collection not in current:
+            items = doc.get(collection, [])
+            if not has_unique_ids(items):
+                raise PatchError(i, f"{collection} elements do not have unique ids")
+            original[collection] = {item["id"]: item for item in items}
+            current[collection] = dict(original[collection])
+            upserts[collection] = {}
+            removes[collection] = {}
+        by_id = current[collection]
+
+        if op.op == "upsert":
+            element = op.element
+            if not element or not isinstance(element.get("id"), str):
+                raise PatchError(i, "upsert needs an element with a string id")
+            element_id = element["id"]
+        elif op.id not in by_id:
+            raise PatchError(i, f"{collection} element '{op.id}' not found")
+        elif op.op == "update":
+            element_id = op.id
+            element = {**by_id[element_id], **(op.fields or {}), "id": element_id}
+        else:
+            element_id = op.id
+            del by_id[element_id]
+            upserts[collection].pop(element_id, None)
+            if element_id in original[collection]:
+                removes[collection][element_id] = None
+            continue
+
+        by_id[element_id] = element
+        upserts[collection][element_id] = element
+        removes[collection].pop(element_id, None)
+
+    collections = {}
+    for collection in current:
+        change: Dict[str, Any] = {}
+        if upserts[collection]:
+            change["upsert"] = list(upserts[collection].values())
+        if removes[collection]:
+            change["remove"] = list(removes[collection])
+        if change:
+            collections[collection] = change
+
+    delta: Dict[str, Any] = {}
+    if collections:
+        delta["collections"] = collections
+    if changed:
+        delta["set"] = changed
+    if unset:
+        delta["unset"] = list(unset)
+    return apply_delta(doc, delta), delta
@@ -0,0 +1,306 @@
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.schemas.canonical import CanonicalEdge, CanonicalNode, DiagramCanonical, Position
+from app.services.layout import NODE_HEIGHTS, _get_node_row
+
+GRID = 50                   # 라우팅 격자 간격 (px). 슬롯 폭(200)의 1/4
+NODE_HALF_WIDTH = 50        # 장애물로 보는 노드 반폭 (여유 간격 포함)
+NODE_CLEARANCE = 10         # 노드 높이에 더하는 상하 여유
+SEARCH_MARGIN = 6           # A* 탐색 범위: 양 끝 bbox에서 격자 몇 칸까지 돌아갈 수 있는지
+MAX_EXPANSIONS = 5000       # 엣지 하나당 A* 확장 상한. 넘으면 L자 경로로 대체
+BEND_PENALTY = 4            # 꺾임 1회 비용 (격자 한 칸 = 1)
+
+# 노드 하나가 격자 한 행 / 열에서 덮을 수 있는 최대 점 수. 선분 위 장애물 점이 양 끝 노드 몫보다 많으면 바로 막힘
+_NODE_SPAN = max(2 * NODE_HALF_WIDTH, max(NODE_HEIGHTS.values()) + 2 * NODE_CLEARANCE) // GRID + 1
+
+Point = Tuple[int, int]
+_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def _to_grid(position: Position) -> Point:
+    return int(round(position.x / GRID)), int(round(position.y / GRID))
+
+
+class EdgeRouter:
+    """
+    슬롯 격자 위 노드를 장애물로 보는 직교(orthogonal) 엣지 라우터.
+    - 직선 → L자(꺾임 1회) → 채널 경유 Z자(꺾임 2회) 순으로 빈 경로를 찾고,
+      모두 막혀 있으면 꺾임 비용을 둔 격자 A*로 우회한다
+    - 선분 검사는 행 / 열별 장애물 정렬 목록을 이분 탐색하므로 선분 길이와 무관하다
+    - 결과는 양 끝 노드 중심을 제외한 꺾임점 목록이며 CanonicalEdge.waypoints에 그대로 쓴다
+    노드 좌표가 바뀌면 새로 만들어야 한다.
+    """
+
+    def __init__(self, diagram: DiagramCanonical):
+        self.diagram = diagram
+        self.nodes: Dict[str, CanonicalNode] = {}
+        self.blocked: Dict[Point, List[str]] = {}   # 격자점 -> 그 점을 덮는 노드 id
+        self._routes: Dict[Tuple[Point, Point, str, str], List[Point]] = {}
+
+        for node in diagram.nodes:
+            self.nodes.setdefault(node.id, node)
+            self._block(node)
+
+        # 행(y)별 장애물 x, 열(x)별 장애물 y 정렬 목록
+        self._rows: Dict[int, List[int]] = {}
+        self._cols: Dict[int, List[int]] = {}
+        for gx, gy in self.blocked:
+            self._rows.setdefault(gy, []).append(gx)
+            self._cols.setdefault(gx, []).append(gy)
+        for values in self._rows.values():
+            values.sort()
+        for values in self._cols.values():
+            values.sort()
+
+    def _block(self, node: CanonicalNode) -> None:
+        half_h = NODE_HEIGHTS[_get_node_row(node.subtype)] // 2 + NODE_CLEARANCE
+        x, y = node.position.x, node.position.y
+        for gx in range(math.ceil((x - NODE_HALF_WIDTH) / GRID), math.floor((x + NODE_HALF_WIDTH) / GRID) + 1):
+            for gy in range(math.ceil((y - half_h) / GRID), math.floor((y + half_h) / GRID) + 1):
+                self.blocked.setdefault((gx, gy), []).append(node.id)
+
+    def _free(self, point: Point, ends: Tuple[str, str]) -> bool:
+        owners = self.blocked.get(point)
+        return not owners or all(owner in ends for owner in owners)
+
+    def _segment_free(self, a: Point, b: Point, ends: Tuple[str, str]) -> bool:
+        (ax, ay), (bx, by) = a, b
+        vertical = ax == bx
+        line = self._cols.get(ax) if vertical else self._rows.get(ay)
+        if not line:
+            return True
+        lo, hi = (min(ay, by), max(ay, by)) if vertical else (min(ax, bx), max(ax, bx))
+        i, j = bisect_left(line, lo), bisect_right(line, hi)
+        if j - i > 2 * _NODE_SPAN:
+            return False
+        # 선분 위 장애물 점이 모두 양 끝 노드 것이면 통과
+        if vertical:
+            return all(self._free((ax, y), ends) for y in line[i:j])
+        return all(self._free((x, ay), ends) for x in line[i:j])
+
+    def _path_free(self, points: List[Point], ends: Tuple[str, str]) -> bool:
+        return all(self._segment_free(a, b, ends) for a, b in zip(points, points[1:]))
+
+    def route(self, edge: CanonicalEdge) -> Optional[List[Position]]:
+        """엣지의 꺾임점 목록. 양 끝 노드를 찾을 수 없으면 None"""
+        src = self.nodes.get(edge.from_node)
+        tgt = self.nodes.get(edge.to_node)
+        if src is None or tgt is None:
+            return None
+        start, goal = _to_grid(src.position), _to_grid(tgt.position)
+        ends = (src.id, tgt.id)
+
+        key = (start, goal) + ends
+        bends = self._routes.get(key)
+        if bends is None:
+            bends = self._route_points(start, goal, ends)
+            self._routes[key] = bends
+        return [Position(x=float(x * GRID), y=float(y * GRID)) for x, y in bends]
+
+    def _route_points(self, start: Point, goal: Point, ends: Tuple[str, str]) -> List[Point]:
+        if start == goal:
+            return []
+        if start[0] == goal[0] or start[1] == goal[1]:
+            if self._segment_free(start, goal, ends):
+                return []
+        else:
+            # 수평 후 수직, 수직 후 수평 순으로 L자 경로 시도
+            for corner in ((goal[0], start[1]), (start[0], goal[1])):
+                if self._path_free([start, corner, goal], ends):
+                    return [corner]
+
+        bends = self._channel_route(start, goal, ends)
+        if bends is not None:
+            return bends
+
+        path = self._search(start, goal, ends)
+        if path is None:
+            # 경로가 없으면 직선(같은 행·열) 또는 L자로 그린다. 직선에 꺾임점을 두면 한쪽 끝과 겹친다
+            if start[0] == goal[0] or start[1] == goal[1]:
+                return []
+            return [(goal[0], start[1])]
+        return _bends(path)
+
+    def _channel_route(self, start: Point, goal: Point, ends: Tuple[str, str]) -> Optional[List[Point]]:
+        """
+        수평 채널(y) 또는 수직 채널(x) 하나를 경유하는 Z자 경로 중 돌아가는 거리가 가장 짧은 것.
+        양 끝에서 채널까지 가는 선분이 닿을 수 있는 범위(reach)로 후보를 먼저 좁힌 뒤 채널 선분만 검사한다.
+        """
+        (sx, sy), (gx, gy) = start, goal
+        best = None
+        for vertical in (False, True):
+            if vertical:
+                # 수평 → 수직 채널(cx) → 수평
+                s_lo, s_hi = self._reach(start, False, ends)
+                g_lo, g_hi = self._reach(goal, False, ends)
+                a, b, skip = min(sx, gx), max(sx, gx), (sx, gx)
+            else:
+                # 수직 → 수평 채널(cy) → 수직
+                s_lo, s_hi = self._reach(start, True, ends)
+                g_lo, g_hi = self._reach(goal, True, ends)
+                a, b, skip = min(sy, gy), max(sy, gy), (sy, gy)
+            lo = max(s_lo, g_lo, a - SEARCH_MARGIN)
+            hi = min(s_hi, g_hi, b + SEARCH_MARGIN)
+            for c in _by_detour(lo, hi, a, b):
+                if c in skip:
+                    continue
+                bends = [(c, sy), (c, gy)] if vertical else [(sx, c), (gx, c)]
+                if self._segment_free(bends[0], bends[1], ends):
+                    detour = max(a - c, c - b, 0)
+                    if best is None or detour < best[0]:
+                        best = (detour, bends)
+                    break
+        if best is not None:
+            return best[1]
+
+        # 양 끝에서 수평으로 빠져나가 가까운 수직 채널로 옮긴 뒤 수평 채널 하나로 잇는 경로 (꺾임 4회)
+        exits = self._exits(start, ends)
+        entries = self._exits(goal, ends)
+        if not exits or not entries:
+            return None
+        for cy in _by_detour(-math.inf, math.inf, min(sy, gy), max(sy, gy)):
+            for cx1 in exits:
+                if not self._segment_free((cx1, sy), (cx1, cy), ends):
+                    continue
+                for cx2 in entries:
+                    bends = [(cx1, sy), (cx1, cy), (cx2, cy), (cx2, gy)]
+                    if self._path_free(bends, ends):
+                        return bends
+        return None
+
+    def _reach(self, point: Point, vertical: bool, ends: Tuple[str, str]) -> Tuple[float, float]:
+        """point에서 세로(vertical) 또는 가로로 막힘 없이 갈 수 있는 좌표 범위 (양 끝 포함)"""
+        px, py = point
+        line = self._cols.get(px) if vertical else self._rows.get(py)
+        lo, hi = -math.inf, math.inf
+        if not line:
+            return lo, hi
+        p = py if vertical else px
+
+        def free(c: int) -> bool:
+            return self._free((px, c) if vertical else (c, py), ends)
+
+        i = bisect_left(line, p)
+        j = i
+        while j < len(line) and free(line[j]):
+            j += 1
+        if j < len(line):
+            hi = line[j] - 1
+        j = i - 1
+        while j >= 0 and free(line[j]):
+            j -= 1
+        if j >= 0:
+            lo = line[j] + 1
+        return lo, hi
+
+    def _exits(self, point: Point, ends: Tuple[str, str], limit: int = 3) -> List[int]:
+        """point에서 수평으로 막힘 없이 갈 수 있는 가까운 x (좌우 교대로 최대 limit개)"""
+        px, py = point
+        found = []
+        for offset in range(1, SEARCH_MARGIN + 1):
+            for x in (px + offset, px - offset):
+                if self._segment_free(point, (x, py), ends):
+                    found.append(x)
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+    def _search(self, start: Point, goal: Point, ends: Tuple[str, str]) -> Optional[List[Point]]:
+        min_x = min(start[0], goal[0]) - SEARCH_MARGIN
+        max_x = max(start[0], goal[0]) + SEARCH_MARGIN
+        min_y = min(start[1], goal[1]) - SEARCH_MARGIN
+        max_y = max(start[1], goal[1]) + SEARCH_MARGIN
+
+        def h(p: Point) -> int:
+            return abs(p[0] - goal[0]) + abs(p[1] - goal[1])
+
+        # (f, g, 순번, 점, 진입 방향)
+        counter = 0
+        heap = [(h(start), 0, counter, start, -1)]
+        best: Dict[Tuple[Point, int], int] = {(start, -1): 0}
+        parent: Dict[Tuple[Point, int], Tuple[Point, int]] = {}
+        expansions = 0
+
+        while heap:
+            _, g, _, point, direction = heapq.heappop(heap)
+            state = (point, direction)
+            if best.get(state, g) < g:
+                continue
+            if point == goal:
+                path = [point]
+                while state in parent:
+                    state = parent[state]
+                    path.append(state[0])
+                path.reverse()
+                return path
+            expansions += 1
+            if expansions > MAX_EXPANSIONS:
+                return None
+
+            for d, (dx, dy) in enumerate(_DIRECTIONS):
+                nxt = (point[0] + dx, point[1] + dy)
+                if not (min_x <= nxt[0] <= max_x and min_y <= nxt[1] <= max_y):
+                    continue
+                if not self._free(nxt, ends):
+                    continue
+                cost = g + 1 + (BEND_PENALTY if direction not in (-1, d) else 0)
+                next_state = (nxt, d)
+                if cost < best.get(next_state, cost + 1):
+                    best[next_state] = cost
+                    parent[next_state] = state
+                    counter += 1
+                    heapq.heappush(heap, (cost + h(nxt), cost, counter, nxt, d))
+        return None
+
+
+def _by_detour(lo: float, hi: float, a: int, b: int):
+    """
+    [lo, hi] 범위의 채널 좌표를 돌아가는 거리 순으로 생성한다.
+    양 끝 사이(a..b) 채널은 추가 길이가 없고, 바깥으로 한 칸 나갈 때마다 2씩 늘어난다.
+    """
+    lo, hi = int(max(lo, a - SEARCH_MARGIN)), int(min(hi, b + SEARCH_MARGIN))
+    yield from range(max(lo, a), min(hi, b) + 1)
+    for d in range(1, SEARCH_MARGIN + 1):
+        if lo <= a - d <= hi:
+            yield a - d
+        if lo <= b + d <= hi:
+            yield b + d
+
+
+def _bends(path: List[Point]) -> List[Point]:
+    """격자 경로에서 방향이 바뀌는 점만 남긴다 (양 끝 제외)"""
+    bends = []
+    for prev, curr, nxt in zip(path, path[1:], path[2:]):
+        if (curr[0] - prev[0], curr[1] - prev[1]) != (nxt[0] - curr[0], nxt[1] - curr[1]):
+            bends.append(curr)
+    return bends
+
+
+def route_edges(
+    diagram: DiagramCanonical,
+    node_ids: Optional[Iterable[str]] = None,
+    edge_ids: Optional[Iterable[str]] = None
+) -> List[str]:
+    """
+    엣지 waypoints를 직교 경로로 채운다. node_ids / edge_ids가 없으면 모든 엣지를 라우팅하고,
+    있으면 그 노드에 닿는 엣지(레이아웃에서 움직인 노드 등)와 지정된 엣지(새로 추가 / 재연결 등)만
+    다시 라우팅한다. 나머지 엣지는 기존 waypoints를 그대로 둔다.
+    waypoints가 바뀐 엣지 id 목록을 반환한다.
+    """
+    router = EdgeRouter(diagram)
+    incremental = node_ids is not None or edge_ids is not None
+    touched = set(node_ids or ())
+    selected = set(edge_ids or ())
+    changed = []
+    for edge in diagram.edges:
+        if incremental and edge.id not in selected and edge.from_node not in touched and edge.to_node not in touched:
+            continue
+        waypoints = router.route(edge)
+        if waypoints is None or waypoints == edge.waypoints:
+            continue
+        edge.waypoints = waypoints
+        changed.append(edge.id)
+    return changed
@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, exists, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.services import revision_store
+from app.services.allocators import split_tag
+
+# 한 번에 넣는 행 수 (SQLite 변수 개수 제한 회피)
+INSERT_BATCH = 500
+
+
+def _node_row(diagram: models.Diagram, node: Dict[str, Any]) -> Dict[str, Any]:
+    tag = node.get("tag")
+    tag_prefix, tag_seq = split_tag(tag if isinstance(tag, str) else None)
+    return {
+        "diagram_id": diagram.id,
+        "node_id": node["id"],
+        "project_id": diagram.project_id,
+        "type": node.get("type"),
+        "subtype": node.get("subtype"),
+        "tag": tag,
+        "tag_prefix": tag_prefix,
+        "tag_seq": tag_seq,
+        "name": node.get("name"),
+    }
+
+
+def _edge_row(diagram: models.Diagram, edge: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "diagram_id": diagram.id,
+        "edge_id": edge["id"],
+        "project_id": diagram.project_id,
+        "type": edge.get("type"),
+        "from_node": edge.get("from_node"),
+        "to_node": edge.get("to_node"),
+        "line_number": edge.get("line_number"),
+        "pipe_class": edge.get("pipe_class"),
+        "pipe_size": edge.get("pipe_size"),
+    }
+
+
+# collection -> (모델, id 컬럼, 행 변환)
+_TABLES = {
+    "nodes": (models.DiagramNode, models.DiagramNode.node_id, _node_row),
+    "edges": (models.DiagramEdge, models.DiagramEdge.edge_id, _edge_row),
+}
+
+
+def _valid(items: Any) -> List[Dict[str, Any]]:
+    # id 없는 요소는 질의 대상에서 제외 (같은 id가 여러 번 나오면 마지막 요소 기준)
+    if not isinstance(items, list):
+        return []
+    by_id = {}
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get("id"), str):
+            by_id[item["id"]] = item
+    return list(by_id.values())
+
+
+async def _insert(db: AsyncSession, model, rows: List[Dict[str, Any]]) -> None:
+    for start in range(0, len(rows), INSERT_BATCH):
+        await db.execute(insert(model), rows[start:start + INSERT_BATCH])
+
+
+async def _delete_ids(db: AsyncSession, model, id_column, diagram_id: str, ids: List[str]) -> None:
+    for start in range(0, len(ids), INSERT_BATCH):
+        await db.execute(
+            delete(model).where(model.diagram_id == diagram_id, id_column.in_(ids[start:start + INSERT_BATCH]))
+        )
+
+
+async def rebuild(db: AsyncSession, diagram: models.Diagram, canonical_json: Dict[str, Any]) -> None:
+    """도면의 노드 / 엣지 행을 canonical_json 기준으로 다시 만든다"""
+    for collection, (model, _, to_row) in _TABLES.items():
+        await db.execute(delete(model).where(model.diagram_id == diagram.id))
+        rows = [to_row(diagram, item) for item in _valid(canonical_json.get(collection))]
+        await _insert(db, model, rows)
+
+
+async def sync(
+    db: AsyncSession, diagram: models.Diagram, canonical_json: Dict[str, Any], delta: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    저장된 새 버전에 맞춰 질의용 행을 갱신한다 (commit은 호출자).
+    revision delta가 있으면 바뀐 요소 행만 지우고 다시 넣고, 없거나(snapshot 저장)
+    컬렉션이 통째로 바뀌었거나 아직 행이 없는 도면(이전에 만들어진 도면)이면 전체를 다시 만든다.
+    """
+    if delta is None or any(key in _TABLES for key in delta.get("set", {})) \
+            or any(key in _TABLES for key in delta.get("unset", [])) \
+            or not await _has_rows(db, diagram.id):
+        await rebuild(db, diagram, canonical_json)
+        return
+
+    for collection, change in delta.get("collections", {}).items():
+        if collection not in _TABLES:
+            continue
+        model, id_column, to_row = _TABLES[collection]
+        upsert = _valid(change.get("upsert"))
+        ids = change.get("remove", []) + [item["id"] for item in upsert]
+        await _delete_ids(db, model, id_column, diagram.id, ids)
+        await _insert(db, model, [to_row(diagram, item) for item in upsert])
+
+
+async def _has_rows(db: AsyncSession, diagram_id: str) -> bool:
+    stmt = select(or_(
+        exists().where(models.DiagramNode.diagram_id == diagram_id),
+        exists().where(models.DiagramEdge.diagram_id == diagram_id)
+    ))
+    return bool((await db.execute(stmt)).scalar())
+
+
+async def backfill(db: AsyncSession) -> int:
+    """질의용 행이 없는 도면(테이블 추가 이전 도면)을 채운다. 채운 도면 수를 반환"""
+    stmt = select(models.Diagram).where(
+        ~exists().where(models.DiagramNode.diagram_id == models.Diagram.id),
+        ~exists().where(models.DiagramEdge.diagram_id == models.Diagram.id)
+    )
+    diagrams = (await db.execute(stmt)).scalars().all()
+    current = await revision_store.load_current_many(db, diagrams)
+    count = 0
+    for diagram in diagrams:
+        canonical_json = current[diagram.id]
+        if _valid(canonical_json.get("nodes")) or _valid(canonical_json.get("edges")):
+            await rebuild(db, diagram, canonical_json)
+            count += 1
+    await db.commit()
+    return count
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.schemas.canonical import DiagramCanonical
+from app.schemas.rules import DiagramDelta, ValidationReport, Violation
+from app.services.validator import ValidationRun, build_report, get_rule_plan
+
+# edge.id -> (from_node, to_node)
+TopologySnapshot = Tuple[Set[str], Dict[str, Tuple[str, str]]]
+
+
+def snapshot_topology(diagram: DiagramCanonical) -> TopologySnapshot:
+    """노드 id 집합과 엣지 연결만 기록하는 가벼운 스냅샷 (auto_repair 반복 간 delta 계산용)"""
+    return (
+        {n.id for n in diagram.nodes},
+        {e.id: (e.from_node, e.to_node) for e in diagram.edges},
+    )
+
+
+def delta_since(snapshot: TopologySnapshot, diagram: DiagramCanonical) -> DiagramDelta:
+    """
+    스냅샷 이후 추가·삭제된 노드와 추가·삭제·재연결된 엣지를 DiagramDelta로 반환한다.
+    노드 속성의 제자리 수정은 감지하지 않는다 (필요하면 diff_diagrams 사용).
+    """
+    old_node_ids, old_edges = snapshot
+    node_ids = {n.id for n in diagram.nodes} ^ old_node_ids
+    edge_ids = set()
+
+    new_edges = {}
+    for e in diagram.edges:
+        ends = (e.from_node, e.to_node)
+        new_edges[e.id] = ends
+        if old_edges.get(e.id) != ends:
+            edge_ids.add(e.id)
+            node_ids.update(ends)
+            node_ids.update(old_edges.get(e.id, ()))
+    for edge_id, ends in old_edges.items():
+        if edge_id not in new_edges:
+            edge_ids.add(edge_id)
+            node_ids.update(ends)
+
+    return DiagramDelta(node_ids=sorted(node_ids), edge_ids=sorted(edge_ids))
+
+
+def diff_diagrams(old: DiagramCanonical, new: DiagramCanonical) -> DiagramDelta:
+    """두 도면을 요소 단위로 비교해 DiagramDelta를 만든다 (편집기 저장본 비교용)."""
+    old_nodes = {n.id: n for n in old.nodes}
+    new_nodes = {n.id: n for n in new.nodes}
+    node_ids = set(old_nodes.keys() ^ new_nodes.keys())
+    for node_id in old_nodes.keys() & new_nodes.keys():
+        if old_nodes[node_id] != new_nodes[node_id]:
+            node_ids.add(node_id)
+
+    old_edges = {e.id: e for e in old.edges}
+    new_edges = {e.id: e for e in new.edges}
+    edge_ids = set()
+    for edge_id in old_edges.keys() | new_edges.keys():
+        before = old_edges.get(edge_id)
+        after = new_edges.get(edge_id)
+        if before == after:
+            continue
+        edge_ids.add(edge_id)
+        for edge in (before, after):
+            if edge is not None:
+                node_ids.add(edge.from_node)
+                node_ids.add(edge.to_node)
+
+    return DiagramDelta(node_ids=sorted(node_ids), edge_ids=sorted(edge_ids))
+
+
+def _node_distances(canonical: DiagramCanonical, seeds: Set[str], max_radius: int) -> Dict[str, int]:
+    """seeds로부터 무방향 hop 거리 (max_radius 이내)"""
+    index = canonical.index
+    distances = {node_id: 0 for node_id in seeds}
+    frontier = list(seeds)
+    for dist in range(1, max_radius + 1):
+        next_frontier = []
+        for node_id in frontier:
+            for edge in index.out_edges.get(node_id, ()):
+                if edge.to_node not in distances:
+                    distances[edge.to_node] = dist
+                    next_frontier.append(edge.to_node)
+            for edge in index.in_edges.get(node_id, ()):
+                if edge.from_node not in distances:
+                    distances[edge.from_node] = dist
+                    next_frontier.append(edge.from_node)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return distances
+
+
+def validate_incremental(
+    canonical: DiagramCanonical,
+    rules: List[Any],
+    previous: ValidationReport,
+    delta: DiagramDelta,
+    ruleset_hash: Optional[str] = None,
+) -> ValidationReport:
+    """
+    previous(같은 rules로 만든 직전 검증 결과)와 delta를 이용해 바뀐 범위만 재검증한다.
+    - node rule: 바뀐 요소에서 rule의 의존 반경(node_radius) 안에 있는 노드만 재평가
+    - edge rule: 바뀐 엣지만 재평가
+    - diagram rule: 변경이 있으면 전체 재평가
+    결과는 전체 validate()와 같은 순서(rule 순서 → 도면 내 요소 순서)로 정렬된다.
+    """
+    plan = get_rule_plan(rules, ruleset_hash)
+    if not delta.node_ids and not delta.edge_ids:
+        return previous
+
+    previous_by_rule: Dict[str, List[Violation]] = {}
+    for v in previous.violations:
+        previous_by_rule.setdefault(v.rule_code, []).append(v)
+
+    run = ValidationRun(canonical)
+    index = run.index
+    changed_edges = set(delta.edge_ids)
+    seeds = {node_id for node_id in delta.node_ids}
+    max_radius = max((r.node_radius for r in plan.rules if r.node_checks), default=0)
+    distances = _node_distances(canonical, seeds, max_radius)
+
+    node_positions: Optional[Dict[str, int]] = None
+    edge_positions: Optional[Dict[str, int]] = None
+
+    violations: List[Violation] = []
+    for rule in plan.rules:
+        kept = previous_by_rule.get(rule.code, [])
+
+        if rule.diagram_checks:
+            violations.extend(rule.evaluate_diagram(run))
+            continue
+
+        if rule.node_checks:
+            radius = rule.node_radius
+            affected = {node_id for node_id, dist in distances.items() if dist <= radius}
+            if not affected:
+                violations.extend(kept)
+                continue
+            if node_positions is None:
+                node_positions = {}
+                for i, n in enumerate(canonical.nodes):
+                    node_positions.setdefault(n.id, i)
+            nodes = sorted(
+                (index.nodes_by_id[node_id] for node_id in affected if node_id in index.nodes_by_id),
+                key=lambda n: node_positions[n.id]
+            )
+            merged = [v for v in kept if v.node_id not in affected]
+            merged.extend(rule.evaluate_nodes(run, nodes))
+            # 노드별 위반은 한 묶음이므로 안정 정렬로 check 순서가 유지된다
+            merged.sort(key=lambda v: node_positions.get(v.node_id, -1))
+            violations.extend(merged)
+            continue
+
+        if rule.edge_checks:
+            if not changed_edges:
+                violations.extend(kept)
+                continue
+            if edge_positions is None:
+                edge_positions = {}
+                for i, e in enumerate(canonical.edges):
+                    edge_positions.setdefault(e.id, i)
+            edges = sorted(
+                (index.edges_by_id[edge_id] for edge_id in changed_edges if edge_id in index.edges_by_id),
+                key=lambda e: edge_positions[e.id]
+            )
+            merged = [v for v in kept if v.edge_id not in changed_edges]
+            merged.extend(rule.evaluate_edges(run, edges))
+            merged.sort(key=lambda v: edge_positions.get(v.edge_id, -1))
+            violations.extend(merged)
+
+    return build_report(violations)
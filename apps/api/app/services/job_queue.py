@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update
+
+from app import database, models
+
+# 동시에 실행되는 job 수 (워커 코루틴 수). CPU 작업은 각 handler가 스레드풀 / 프로세스풀로 넘긴다
+MAX_JOB_WORKERS = int(os.environ.get("PEI_JOB_WORKERS", "2"))
+# 알림 없이도 queued job을 다시 확인하는 주기 (초). 다른 프로세스가 넣은 job도 이 주기로 가져간다
+POLL_INTERVAL = 2.0
+# 워커 반복 중 예상치 못한 오류(DB 오류 등) 후 다시 시도하기 전 대기 (초)
+ERROR_BACKOFF = 1.0
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = {SUCCEEDED, FAILED, CANCELLED}
+
+# kind -> handler(payload) -> result (JSON 직렬화 가능한 dict)
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+_handlers: Dict[str, JobHandler] = {}
+
+
+class JobError(Exception):
+    """handler가 사용자에게 보여줄 메시지와 함께 job을 실패 처리할 때 사용"""
+
+
+def register_handler(kind: str, handler: JobHandler) -> None:
+    _handlers[kind] = handler
+
+
+def job_kinds() -> List[str]:
+    return sorted(_handlers)
+
+
+class JobQueue:
+    """
+    SQLite jobs 테이블 기반 영속 큐 + 프로세스 내 워커 풀.
+    - submit은 행을 추가하고 워커를 깨운다. 워커는 조건부 UPDATE로 job을 하나씩 선점한다
+    - 기동 시 running으로 남은 job(이전 프로세스 종료)은 queued로 되돌린다
+    - cancel: queued job은 바로 취소, running job은 실행 중인 task를 취소한다
+      (스레드풀에서 이미 돌고 있는 계산은 끝까지 돌지만 결과는 버려진다)
+    """
+
+    def __init__(self, workers: int = MAX_JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._tasks = []
+
+    async def start(self) -> None:
+        async with database.SessionLocal() as db:
+            await db.execute(
+                update(models.Job).where(models.Job.status == RUNNING).values(status=QUEUED, started_at=None)
+            )
+            await db.commit()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._running.values(), return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> models.Job:
+        if kind not in _handlers:
+            raise JobError(f"Unknown job kind: {kind}")
+        async with database.SessionLocal() as db:
+            job = models.Job(kind=kind, status=QUEUED, payload_json=payload)
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[models.Job]:
+        async with database.ReadSessionLocal() as db:
+            return await db.get(models.Job, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[models.Job]:
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status.in_([QUEUED, RUNNING]))
+                .values(status=CANCELLED, finished_at=datetime.utcnow())
+            )
+            await db.commit()
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        if result.rowcount:
+            await self._notify()
+        return await self.get(job_id)
+
+    async def wait_for_change(self, timeout: float) -> None:
+        """job 상태가 바뀌거나 timeout이 지날 때까지 대기 (상태 스트리밍용)"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _claim(self) -> Optional[models.Job]:
+        async with database.SessionLocal() as db:
+            stmt = (
+                select(models.Job.id)
+                .where(models.Job.status == QUEUED)
+                .order_by(models.Job.created_at)
+                .limit(1)
+            )
+            job_id = (await db.execute(stmt)).scalar_one_or_none()
+            if job_id is None:
+                return None
+            # 다른 워커가 먼저 가져갔으면 rowcount가 0
+            result = await db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status == QUEUED)
+                .values(status=RUNNING, started_at=datetime.utcnow())
+            )
+            await db.commit()
+            if not result.rowcount:
+                return None
+            return await db.get(models.Job, job_id)
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        async with database.SessionLocal() as db:
+            # 그 사이 취소된 job은 덮어쓰지 않는다
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status == RUNNING)
+                .values(status=status, result_json=result, error=error, finished_at=datetime.utcnow())
+            )
+            await db.commit()
+        await self._notify()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 한 번의 오류로 워커가 멈추지 않도록 기록만 하고 잠시 뒤 계속한다
+                logger.exception("job worker iteration failed")
+                await asyncio.sleep(ERROR_BACKOFF)
+
+    async def _run(self, job: models.Job) -> None:
+        await self._notify()
+        handler = _handlers.get(job.kind)
+        if handler is None:
+            # 다른 프로세스가 넣었거나 handler가 제거된 kind
+            await self._finish(job.id, FAILED, error=f"Unknown job kind: {job.kind}")
+            return
+
+        task = asyncio.create_task(handler(job.payload_json or {}))
+        self._running[job.id] = task
+        try:
+            # 취소된 task도 예외 없이 기다린다 (워커 자신의 취소만 전파)
+            await asyncio.wait({task})
+        finally:
+            self._running.pop(job.id, None)
+
+        if task.cancelled():
+            await self._finish(job.id, CANCELLED)
+        elif task.exception() is not None:
+            exc = task.exception()
+            # HTTPException(detail)을 그대로 재사용하는 handler도 있으므로 detail을 우선한다
+            error = getattr(exc, "detail", None) or str(exc) or exc.__class__.__name__
+            await self._finish(job.id, FAILED, error=str(error))
+        else:
+            try:
+                await self._finish(job.id, SUCCEEDED, result=task.result())
+            except Exception as exc:
+                # 결과를 저장하지 못하면 (JSON 직렬화 불가 등) running으로 남지 않게 별도 시도로 실패 처리
+                logger.exception("failed to store result of job %s", job.id)
+                # SQLAlchemy 오류는 SQL 문 대신 원인 예외 메시지만 남긴다
+                cause = getattr(exc, "orig", None) or exc
+                await self._finish(job.id, FAILED, error=f"Could not store job result: {cause}")
+
+queue: Optional[JobQueue] = None
+
+
+def get_queue() -> JobQueue:
+    if queue is None:
+        raise RuntimeError("Job queue is not running")
+    return queue
+
+
+async def start_queue(workers: int = MAX_JOB_WORKERS) -> JobQueue:
+    global queue
+    queue = JobQueue(workers)
+    await queue.start()
+    return queue
+
+
+async def stop_queue() -> None:
+    global queue
+    if queue is not None:
+        await queue.stop()
+        queue = None
@@ -0,0 +1,221 @@
+from collections import deque
+from typing import Dict, List, Set, Tuple
+
+from app.schemas.canonical import DiagramCanonical, Position
+from app.services.layout import SLOT_WIDTH, Y_BANDS
+
+LAYER_SPACING = SLOT_WIDTH     # layer(열) 간 x 간격
+ROW_SPACING = 150              # 같은 layer 안의 노드 간 y 간격
+TRAIN_GAP = 250                # 독립된 트레인(연결 요소) 사이의 추가 y 간격
+ORIGIN_X = SLOT_WIDTH // 2     # 슬롯 레이아웃의 col 0과 같은 x
+ORIGIN_Y = Y_BANDS["instrument"]
+
+# 교차 최소화(barycenter) 상하 스윕 횟수. 결과 품질보다 실행 시간 상한을 우선한다
+CROSSING_SWEEPS = 4
+# 긴 엣지를 나누는 dummy 노드 수 상한 (노드 수 배수). 넘는 엣지는 교차 계산에서 빠진다
+MAX_DUMMY_RATIO = 2
+
+
+def apply_layered_layout(diagram: DiagramCanonical) -> DiagramCanonical:
+    """
+    Sugiyama 방식 계층 레이아웃.
+    1. 순환 제거: DFS back edge를 뒤집는다 (recycle / reflux 루프)
+    2. layer 할당: 최장 경로, 들어오는 엣지 없는 노드(계기 등)는 연결된 노드 바로 앞 layer로 당긴다
+    3. 교차 최소화: dummy 노드로 나눈 긴 엣지를 포함해 barycenter 상하 스윕
+    4. 좌표: x = layer, y = layer 내 순서. 연결 요소(독립 트레인)마다 별도 행 묶음을 쓰고,
+       연결 없는 노드는 마지막 한 행에 모은다
+    모든 노드의 position만 바꾸며 도면 구조는 그대로다.
+    """
+    nodes = diagram.nodes
+    n = len(nodes)
+    if not n:
+        return diagram
+
+    index_of: Dict[str, int] = {}
+    for i, node in enumerate(nodes):
+        index_of.setdefault(node.id, i)
+
+    pairs: Set[Tuple[int, int]] = set()
+    succ: List[List[int]] = [[] for _ in range(n)]
+    pred: List[List[int]] = [[] for _ in range(n)]
+    for e in diagram.edges:
+        u = index_of.get(e.from_node)
+        v = index_of.get(e.to_node)
+        if u is None or v is None or u == v or (u, v) in pairs:
+            continue
+        pairs.add((u, v))
+        succ[u].append(v)
+        pred[v].append(u)
+
+    dag_succ = _break_cycles(n, succ, pred)
+    layer = _assign_layers(n, dag_succ)
+
+    top = ORIGIN_Y
+    singles = []
+    for component in _components(n, succ, pred):
+        if len(component) == 1:
+            singles.append(component[0])
+            continue
+        order = _order_layers(component, dag_succ, layer, MAX_DUMMY_RATIO * len(component))
+        for l, ranked in enumerate(order):
+            x = ORIGIN_X + l * LAYER_SPACING
+            for rank, v in enumerate(ranked):
+                if v < n:
+                    nodes[v].position = Position(x=x, y=top + rank * ROW_SPACING)
+        height = max(len(ranked) for ranked in order)
+        top += height * ROW_SPACING + TRAIN_GAP
+
+    for i, v in enumerate(singles):
+        nodes[v].position = Position(x=ORIGIN_X + i * LAYER_SPACING, y=top)
+
+    return diagram
+
+
+def _break_cycles(n: int, succ: List[List[int]], pred: List[List[int]]) -> List[List[int]]:
+    """반복 DFS로 back edge를 찾아 뒤집은 DAG 인접 리스트. 들어오는 엣지 없는 노드부터 도면 순서로 시작한다"""
+    dag_succ: List[List[int]] = [[] for _ in range(n)]
+    state = [0] * n     # 0: 미방문, 1: 탐색 중, 2: 완료
+    starts = [v for v in range(n) if not pred[v]] + [v for v in range(n) if pred[v]]
+
+    for start in starts:
+        if state[start]:
+            continue
+        state[start] = 1
+        stack = [(start, 0)]
+        while stack:
+            v, i = stack[-1]
+            if i == len(succ[v]):
+                state[v] = 2
+                stack.pop()
+                continue
+            stack[-1] = (v, i + 1)
+            w = succ[v][i]
+            if state[w] == 1:
+                dag_succ[w].append(v)   # back edge: 뒤집어서 유지
+                continue
+            dag_succ[v].append(w)
+            if not state[w]:
+                state[w] = 1
+                stack.append((w, 0))
+
+    return dag_succ
+
+
+def _assign_layers(n: int, dag_succ: List[List[int]]) -> List[int]:
+    indegree = [0] * n
+    for v in range(n):
+        for w in dag_succ[v]:
+            indegree[w] += 1
+    sources = [v for v in range(n) if not indegree[v]]
+
+    layer = [0] * n
+    queue = deque(sources)
+    while queue:
+        v = queue.popleft()
+        for w in dag_succ[v]:
+            if layer[v] + 1 > layer[w]:
+                layer[w] = layer[v] + 1
+            indegree[w] -= 1
+            if not indegree[w]:
+                queue.append(w)
+
+    # 소스 노드는 0열에 몰리지 않도록 가장 가까운 후속 노드 바로 앞으로 당긴다
+    for v in sources:
+        if dag_succ[v]:
+            layer[v] = max(layer[v], min(layer[w] for w in dag_succ[v]) - 1)
+    return layer
+
+
+def _components(n: int, succ: List[List[int]], pred: List[List[int]]) -> List[List[int]]:
+    """방향 무시 연결 요소 (도면 순서로 정렬)"""
+    seen = [False] * n
+    components = []
+    for start in range(n):
+        if seen[start]:
+            continue
+        seen[start] = True
+        component = [start]
+        stack = [start]
+        while stack:
+            v = stack.pop()
+            for w in succ[v] + pred[v]:
+                if not seen[w]:
+                    seen[w] = True
+                    component.append(w)
+                    stack.append(w)
+        component.sort()
+        components.append(component)
+    return components
+
+
+def _order_layers(
+    component: List[int], dag_succ: List[List[int]], layer: List[int], max_dummies: int
+) -> List[List[int]]:
+    """
+    연결 요소 하나의 layer별 노드 순서. 2 layer 이상 걸친 엣지는 dummy 노드(id >= n) 체인으로 나눠
+    인접 layer 사이 엣지만 남긴 뒤 barycenter 스윕을 한다.
+    """
+    base = min(layer[v] for v in component)
+    depth = max(layer[v] for v in component) - base + 1
+    n = len(layer)
+
+    layer_of: Dict[int, int] = {}
+    up: Dict[int, List[int]] = {}
+    down: Dict[int, List[int]] = {}
+    initial: Dict[int, float] = {}
+    for v in component:
+        layer_of[v] = layer[v] - base
+        up[v] = []
+        down[v] = []
+        initial[v] = v
+
+    next_dummy = n
+    for v in component:
+        for w in dag_succ[v]:
+            span = layer[w] - layer[v]
+            if span == 1:
+                down[v].append(w)
+                up[w].append(v)
+                continue
+            if next_dummy - n + span - 1 > max_dummies:
+                continue
+            prev = v
+            for l in range(layer[v] + 1, layer[w]):
+                d = next_dummy
+                next_dummy += 1
+                layer_of[d] = l - base
+                up[d] = [prev]
+                down[d] = []
+                initial[d] = v
+                down[prev].append(d)
+                prev = d
+            down[prev].append(w)
+            up[w].append(prev)
+
+    order: List[List[int]] = [[] for _ in range(depth)]
+    for v in sorted(layer_of, key=lambda v: initial[v]):
+        order[layer_of[v]].append(v)
+
+    rank = {}
+    for ranked in order:
+        for r, v in enumerate(ranked):
+            rank[v] = r
+
+    for _ in range(CROSSING_SWEEPS):
+        for l in range(1, depth):
+            _sort_by_barycenter(order[l], up, rank)
+        for l in range(depth - 2, -1, -1):
+            _sort_by_barycenter(order[l], down, rank)
+    return order
+
+
+def _sort_by_barycenter(ranked: List[int], neighbors: Dict[int, List[int]], rank: Dict[int, int]) -> None:
+    def key(v: int) -> float:
+        adjacent = neighbors[v]
+        if not adjacent:
+            return rank[v]
+        return sum(rank[u] for u in adjacent) / len(adjacent)
+
+    ranked.sort(key=key)
+    for r, v in enumerate(ranked):
+        rank[v] = r
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Iterable, List, Optional, Tuple
 from collections import defaultdict, deque
 from app.schemas.canonical import DiagramCanonical, Position
 
@@ -58,23 +58,45 @@ def _get_node_row(subtype: str) -> str:
     else:
         return "instrument"
 
-def _find_free_slot(occupied: set, preferred_col: int, row: str) -> int:
+class _RowSlots:
     """
-    특정 row(y_band)에서 선호하는 column을 중심으로 좌우(col+1, col-1, col+2...)로
-    확장하며 비어있는 슬롯을 반환합니다.
+    한 row(y_band)의 점유 column 집합.
+    점유는 레이아웃 1회 동안 늘어나기만 하므로, 좌 / 우 방향 '다음 빈 column' 포인터를
+    경로 압축으로 유지해 빈 슬롯 탐색이 점유 구간 길이와 무관하게 거의 상수 시간이 된다.
     """
-    if (preferred_col, row) not in occupied:
-        return preferred_col
-
-    offset = 1
-    while True:
-        # Check Right
-        if (preferred_col + offset, row) not in occupied:
-            return preferred_col + offset
-        # Check Left
-        if (preferred_col - offset, row) not in occupied:
-            return preferred_col - offset
-        offset += 1
+
+    __slots__ = ("occupied", "_right", "_left")
+
+    def __init__(self):
+        self.occupied = set()
+        self._right = {}    # 점유 col -> 오른쪽으로 처음 나오는 빈 col 후보
+        self._left = {}     # 점유 col -> 왼쪽으로 처음 나오는 빈 col 후보
+
+    def take(self, col: int) -> None:
+        self.occupied.add(col)
+
+    def _free(self, jumps: dict, col: int, step: int) -> int:
+        path = []
+        occupied = self.occupied
+        while col in occupied:
+            path.append(col)
+            col = jumps.get(col, col + step)
+        for p in path:
+            jumps[p] = col
+        return col
+
+    def find_free(self, preferred_col: int) -> int:
+        """
+        preferred_col을 중심으로 좌우(col+1, col-1, col+2...)로 확장했을 때 처음 만나는 빈 column.
+        같은 거리면 오른쪽이 우선이다.
+        """
+        if preferred_col not in self.occupied:
+            return preferred_col
+        right = self._free(self._right, preferred_col, 1)
+        left = self._free(self._left, preferred_col, -1)
+        if right - preferred_col <= preferred_col - left:
+            return right
+        return left
 
 def _col_to_x(col: int) -> float:
     # 0 -> 80, 1 -> 240, 2 -> 400
@@ -83,6 +105,114 @@ def _col_to_x(col: int) -> float:
 def _row_to_y(row: str) -> float:
     return Y_BANDS[row]
 
+def _slot_col(x: float) -> Optional[int]:
+    """_col_to_x의 역변환. 슬롯 격자 위의 x가 아니면 None"""
+    offset = x - (SLOT_WIDTH // 2)
+    if offset % SLOT_WIDTH:
+        return None
+    return int(offset // SLOT_WIDTH)
+
+def _layout_rows(subtype: str) -> Tuple[str, ...]:
+    """노드가 놓일 수 있는 row 목록 (밸브는 인라인이면 main row). 레이아웃 대상이 아니면 빈 튜플"""
+    if subtype in MAIN_LINE_CLASSES:
+        return ("main",)
+    if subtype in UPPER_LINE_CLASSES:
+        return ("main", "valve")
+    if subtype in INSTRUMENT_CLASSES:
+        return ("instrument",)
+    return ()
+
+
+class _SlotState:
+    """레이아웃 1회 동안의 슬롯 점유 상태 (전체 / 증분 배치 공용)"""
+
+    def __init__(self, diagram: DiagramCanonical):
+        self.diagram = diagram
+        self.nodes = {n.id: n for n in diagram.nodes}
+        self.rows = {row: _RowSlots() for row in Y_BANDS}
+        self.node_to_col = {} # n.id -> col mapping (기준점 추적용)
+        self.current_col = 0 # 다음 메인라인 노드의 선호 column
+
+        # 전체 엣지 인접 리스트 (도면 순서 유지): 밸브 / 계장의 기준 노드 탐색용
+        self.edges_in = defaultdict(list)
+        self.edges_out = defaultdict(list)
+        # 메인라인 엣지: MAIN_LINE_CLASSES 노드 간 process 엣지만 포함
+        self.out_edges = defaultdict(list)
+        self.in_edges = defaultdict(list)
+        for e in diagram.edges:
+            self.edges_in[e.to_node].append(e)
+            self.edges_out[e.from_node].append(e)
+            if e.type == "process":
+                from_node = self.nodes.get(e.from_node)
+                to_node = self.nodes.get(e.to_node)
+                if from_node and from_node.subtype in MAIN_LINE_CLASSES and to_node and to_node.subtype in MAIN_LINE_CLASSES:
+                    self.out_edges[e.from_node].append(e.to_node)
+                    self.in_edges[e.to_node].append(e.from_node)
+
+    def assign(self, node: Any, col: int, row: str) -> None:
+        self.rows[row].take(col)
+        self.node_to_col[node.id] = col
+        node.position = Position(x=_col_to_x(col), y=_row_to_y(row))
+
+    def place_main(self, node: Any, preferred_col: int) -> None:
+        # Check for free slot just in case
+        col = self.rows["main"].find_free(preferred_col)
+        self.assign(node, col, "main")
+        self.current_col = max(self.current_col, col + 2) # Leave 1 slot empty for inline valves
+
+    def place_valve(self, n: Any) -> None:
+        nodes = self.nodes
+        node_to_col = self.node_to_col
+        # 상류로 꽂히는 (나에게 들어오는) edge 중 from_node가 main_line인 첫 엣지
+        up_id = next(
+            (e.from_node for e in self.edges_in.get(n.id, ()) if e.from_node in nodes and nodes[e.from_node].subtype in MAIN_LINE_CLASSES),
+            None
+        )
+        # 하류로 나가는 (나에게서 나가는) edge 중 to_node가 main_line인 첫 엣지
+        down_id = next(
+            (e.to_node for e in self.edges_out.get(n.id, ()) if e.to_node in nodes and nodes[e.to_node].subtype in MAIN_LINE_CLASSES),
+            None
+        )
+
+        is_inline = up_id is not None and down_id is not None
+
+        if is_inline:
+            # 인라인 밸브: MAIN_Y에 투입 및 X = (upstream_col + downstream_col) / 2
+            main_slots = self.rows["main"]
+            if up_id in node_to_col and down_id in node_to_col:
+                avg_col = (node_to_col[up_id] + node_to_col[down_id]) // 2
+                col = avg_col
+
+                # 만약 그 자리를 메인라인 노드(또는 다른 인라인)가 차지하고 있다면 옆으로 밀기
+                col = main_slots.find_free(col)
+            else:
+                col = main_slots.find_free(self.current_col)
+
+            self.assign(n, col, "main")
+        else:
+            # 바이패스 밸브: VALVE_ROW에서 빈 슬롯 탐색
+            # 연결된 메인라인 / 인라인 밸브의 col 파악
+            col = self.rows["valve"].find_free(self._ref_col(n))
+            self.assign(n, col, "valve")
+
+    def place_instrument(self, n: Any) -> None:
+        col = self.rows["instrument"].find_free(self._ref_col(n))
+        self.assign(n, col, "instrument")
+
+    def _ref_col(self, n: Any) -> int:
+        node_to_col = self.node_to_col
+        ref_id = next(
+            (e.from_node for e in self.edges_in.get(n.id, ()) if e.from_node in node_to_col),
+            next(
+                (e.to_node for e in self.edges_out.get(n.id, ()) if e.to_node in node_to_col),
+                None
+            )
+        )
+        if ref_id:
+            return node_to_col[ref_id]
+        return 0
+
+
 def apply_layout(diagram: DiagramCanonical) -> DiagramCanonical:
     """
     슬롯 분할 기반 계층적 레이아웃 적용
@@ -90,21 +220,12 @@ def apply_layout(diagram: DiagramCanonical) -> DiagramCanonical:
     상단 분기(bypass, PSV): y=300
     계장(instrument): y=100
     """
-    nodes = {n.id: n for n in diagram.nodes}
-    occupied_slots = set() # (col, row_type)
-    node_to_col = {} # n.id -> col mapping (기준점 추적용)
-
-    # 1. 메인라인 탐색: MAIN_LINE_CLASSES 노드만 포함
-    out_edges = defaultdict(list)
-    in_edges = defaultdict(list)
-    for e in diagram.edges:
-        if e.type == "process":
-            from_node = nodes.get(e.from_node)
-            to_node = nodes.get(e.to_node)
-            if from_node and from_node.subtype in MAIN_LINE_CLASSES and to_node and to_node.subtype in MAIN_LINE_CLASSES:
-                out_edges[e.from_node].append(e.to_node)
-                in_edges[e.to_node].append(e.from_node)
+    state = _SlotState(diagram)
+    nodes = state.nodes
+    out_edges = state.out_edges
+    in_edges = state.in_edges
 
+    # 1. 메인라인 탐색
     # 루트 노드: incoming process 엣지 없는 MAIN_LINE_CLASSES 노드
     main_nodes = [n for n in diagram.nodes if n.subtype in MAIN_LINE_CLASSES]
     roots = [n.id for n in main_nodes if not in_edges[n.id] and out_edges[n.id]]
@@ -133,90 +254,67 @@ def apply_layout(diagram: DiagramCanonical) -> DiagramCanonical:
             main_line.append(n.id)
 
     # 1. 메인라인 노드 위치 할당 (col = 0, 2, 4...) -> 여유 공간을 위해 한 칸씩 건너뜀 (SLOT_WIDTH 160 이므로)
-    current_col = 0
     for nid in main_line:
         if nid in nodes:
-            # Check for free slot just in case
-            col = _find_free_slot(occupied_slots, current_col, "main")
-            occupied_slots.add((col, "main"))
-            node_to_col[nid] = col
-            val_x = _col_to_x(col)
-            nodes[nid].position = Position(x=val_x, y=_row_to_y("main"))
-            current_col = col + 2 # Leave 1 slot empty for inline valves
+            state.place_main(nodes[nid], state.current_col)
 
     # 2. 밸브류 노드 할당
-    valve_nodes = [n for n in diagram.nodes if n.subtype in UPPER_LINE_CLASSES]
-    for n in valve_nodes:
-        # 상류로 꽂히는 (나에게 들어오는) edge 파악, from_node가 main_line이면 포함
-        upstream_main_edges = [
-            e for e in diagram.edges 
-            if e.to_node == n.id and nodes.get(e.from_node) and nodes.get(e.from_node).subtype in MAIN_LINE_CLASSES
-        ]
-        
-        # 하류로 나가는 (나에게서 나가는) edge 파악, to_node가 main_line이면 포함
-        downstream_main_edges = [
-            e for e in diagram.edges 
-            if e.from_node == n.id and nodes.get(e.to_node) and nodes.get(e.to_node).subtype in MAIN_LINE_CLASSES
-        ]
-        
-        is_inline = bool(upstream_main_edges and downstream_main_edges)
-        
-        if is_inline:
-            # 인라인 밸브: MAIN_Y에 투입 및 X = (upstream_col + downstream_col) / 2
-            up_id = upstream_main_edges[0].from_node
-            down_id = downstream_main_edges[0].to_node
-            if up_id in node_to_col and down_id in node_to_col:
-                avg_col = (node_to_col[up_id] + node_to_col[down_id]) // 2
-                col = avg_col
-                
-                # 만약 그 자리를 메인라인 노드(또는 다른 인라인)가 차지하고 있다면 옆으로 밀기
-                if (col, "main") in occupied_slots:
-                    col = _find_free_slot(occupied_slots, col, "main")
-            else:
-                col = _find_free_slot(occupied_slots, current_col, "main")
-                
-            occupied_slots.add((col, "main"))
-            node_to_col[n.id] = col
-            val_x = _col_to_x(col)
-            n.position = Position(x=val_x, y=_row_to_y("main"))
-        else:
-            # 바이패스 밸브: VALVE_ROW에서 빈 슬롯 탐색
-            # 연결된 메인라인 / 인라인 밸브의 col 파악
-            ref_col = 0
-            ref_id = next(
-                (e.from_node for e in diagram.edges if e.to_node == n.id and e.from_node in node_to_col),
-                next(
-                    (e.to_node for e in diagram.edges if e.from_node == n.id and e.to_node in node_to_col),
-                    None
-                )
-            )
-            if ref_id:
-                ref_col = node_to_col[ref_id]
-                
-            col = _find_free_slot(occupied_slots, ref_col, "valve")
-            occupied_slots.add((col, "valve"))
-            node_to_col[n.id] = col
-            val_x = _col_to_x(col)
-            n.position = Position(x=val_x, y=_row_to_y("valve"))
+    for n in diagram.nodes:
+        if n.subtype in UPPER_LINE_CLASSES:
+            state.place_valve(n)
 
     # 3. 계장 노드 할당
-    inst_nodes = [n for n in diagram.nodes if n.subtype in INSTRUMENT_CLASSES]
-    for n in inst_nodes:
-        ref_col = 0
-        ref_id = next(
-            (e.from_node for e in diagram.edges if e.to_node == n.id and e.from_node in node_to_col),
-            next(
-                (e.to_node for e in diagram.edges if e.from_node == n.id and e.to_node in node_to_col),
-                None
-            )
-        )
-        if ref_id:
-            ref_col = node_to_col[ref_id]
-            
-        col = _find_free_slot(occupied_slots, ref_col, "instrument")
-        occupied_slots.add((col, "instrument"))
-        node_to_col[n.id] = col
-        val_x = _col_to_x(col)
-        n.position = Position(x=val_x, y=_row_to_y("instrument"))
+    for n in diagram.nodes:
+        if n.subtype in INSTRUMENT_CLASSES:
+            state.place_instrument(n)
 
     return diagram
+
+def apply_layout_incremental(
+    diagram: DiagramCanonical,
+    node_ids: Optional[Iterable[str]] = None
+) -> Tuple[DiagramCanonical, List[str]]:
+    """
+    기존 슬롯 배치를 유지하고 필요한 노드만 배치하는 증분 레이아웃.
+    - 현재 좌표가 자기 row의 빈 슬롯 위에 있는 노드는 그 슬롯을 그대로 점유한다 (node_to_col 복원)
+    - 슬롯 위에 있지 않은 노드(새로 추가된 노드 등)와, node_ids에 포함된 밸브 / 계장 노드(재연결 등)는
+      apply_layout과 같은 규칙으로 메인라인 → 밸브 → 계장 순으로 다시 배치한다
+    - node_ids의 메인라인 노드는 슬롯이 유효하면 유지한다 (메인라인 순서는 전체 레이아웃에서만 바뀜)
+    (도면, 좌표가 바뀐 노드 id 목록)을 반환한다.
+    """
+    state = _SlotState(diagram)
+    requested = set(node_ids or ())
+    before = {n.id: (n.position.x, n.position.y) for n in diagram.nodes}
+
+    pending = []
+    for n in diagram.nodes:
+        rows = _layout_rows(n.subtype)
+        if not rows:
+            continue
+        row = next((r for r in rows if n.position.y == _row_to_y(r)), None)
+        col = _slot_col(n.position.x) if row else None
+        if col is None or col in state.rows[row].occupied or (n.id in requested and n.subtype not in MAIN_LINE_CLASSES):
+            pending.append(n)
+            continue
+        state.rows[row].take(col)
+        state.node_to_col[n.id] = col
+        if n.subtype in MAIN_LINE_CLASSES:
+            state.current_col = max(state.current_col, col + 2)
+
+    # 1. 메인라인: 상류 메인라인 노드 다음 칸, 없으면 메인라인 끝
+    for n in pending:
+        if n.subtype in MAIN_LINE_CLASSES:
+            up_id = next((u for u in state.in_edges[n.id] if u in state.node_to_col), None)
+            preferred_col = state.node_to_col[up_id] + 2 if up_id else state.current_col
+            state.place_main(n, preferred_col)
+
+    # 2. 밸브류, 3. 계장
+    for n in pending:
+        if n.subtype in UPPER_LINE_CLASSES:
+            state.place_valve(n)
+    for n in pending:
+        if n.subtype in INSTRUMENT_CLASSES:
+            state.place_instrument(n)
+
+    moved = [n.id for n in diagram.nodes if before[n.id] != (n.position.x, n.position.y)]
+    return diagram, moved
@@ -0,0 +1,87 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from app.schemas.canonical import DiagramCanonical
+from app.schemas.rules import ValidationReport, Violation
+from app.services.process_pool import MAX_PROCESS_WORKERS, get_process_pool
+from app.services.ruleset_cache import CachedRuleset
+from app.services.validator import ValidationRun, build_report, get_rule_plan, validate
+
+# 노드 수가 이 값 이상인 도면만 rule을 프로세스 풀에 나눠 평가한다 (그보다 작으면 프로세스 기동 비용이 더 큼)
+PARALLEL_MIN_NODES = int(os.environ.get("PEI_PARALLEL_MIN_NODES", "20000"))
+# 한 도면의 rule을 나눠 맡는 프로세스 수 (공유 풀 크기를 넘지 않는다)
+MAX_VALIDATE_WORKERS = min(
+    int(os.environ.get("PEI_VALIDATE_WORKERS", "0")) or min(os.cpu_count() or 1, 8),
+    MAX_PROCESS_WORKERS
+)
+
+# 워커 프로세스별 마지막 도면. 같은 요청의 partition이 한 워커에 여러 개 가면 역직렬화를 재사용한다
+_worker_key: Optional[str] = None
+_worker_run: Optional[ValidationRun] = None
+
+
+def _evaluate_partition(
+    key: str, diagram_json: str, rules: List[Any], ruleset_hash: Optional[str], rule_indexes: List[int]
+) -> List[Tuple[int, List[Violation]]]:
+    """plan.rules 중 rule_indexes만 평가해 (rule index, 위반 목록)을 반환한다."""
+    global _worker_key, _worker_run
+    if _worker_key != key:
+        _worker_run = ValidationRun(DiagramCanonical.model_validate_json(diagram_json))
+        _worker_key = key
+    plan = get_rule_plan(rules, ruleset_hash)
+    return [(i, list(plan.rules[i].evaluate(_worker_run))) for i in rule_indexes]
+
+
+def partition_rules(rule_count: int, parts: int) -> List[List[int]]:
+    """rule index를 parts개로 round-robin 분배 (앞쪽 rule이 한 워커에 몰리지 않도록)"""
+    return [list(range(start, rule_count, parts)) for start in range(parts) if start < rule_count]
+
+
+def validate_parallel(
+    canonical: DiagramCanonical,
+    rules: List[Any],
+    ruleset_hash: Optional[str] = None,
+    workers: int = MAX_VALIDATE_WORKERS
+) -> ValidationReport:
+    """
+    rule 집합을 workers개로 나눠 공유 프로세스 풀에서 평가한다.
+    도면은 partition마다 JSON 문자열로 전달되고, 각 워커는 rules / ruleset_hash로 RulePlan을 컴파일·캐시한다.
+    부분 결과는 plan의 rule 순서로 병합되므로 validate()와 결과가 같다.
+    """
+    plan = get_rule_plan(rules, ruleset_hash)
+    partitions = partition_rules(len(plan.rules), workers)
+    if len(partitions) <= 1:
+        return validate(canonical, plan)
+
+    diagram_json = canonical.model_dump_json()
+    key = str(uuid4())
+    pool = get_process_pool()
+    futures = [
+        pool.submit(_evaluate_partition, key, diagram_json, rules, ruleset_hash, partition)
+        for partition in partitions
+    ]
+    by_rule: Dict[int, List[Violation]] = {}
+    for future in futures:
+        by_rule.update(future.result())
+
+    violations: List[Violation] = []
+    for i in range(len(plan.rules)):
+        violations.extend(by_rule.get(i, ()))
+    return build_report(violations)
+
+
+async def validate_off_loop(
+    canonical: DiagramCanonical,
+    ruleset: CachedRuleset,
+    profile: bool = False
+) -> ValidationReport:
+    """
+    요청 핸들러용. 검증을 이벤트 루프 밖에서 실행한다.
+    PARALLEL_MIN_NODES 이상인 도면은 프로세스 풀로, 나머지(또는 profile 모드)는 스레드풀에서 in-process로 평가한다.
+    """
+    if not profile and MAX_VALIDATE_WORKERS > 1 and len(canonical.nodes) >= PARALLEL_MIN_NODES:
+        return await run_in_threadpool(validate_parallel, canonical, ruleset.rules, ruleset.hash)
+    return await run_in_threadpool(validate, canonical, ruleset.plan, None, profile)
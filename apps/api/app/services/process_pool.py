@@ -0,0 +1,28 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# 검증용 공유 프로세스 풀 크기. 요청마다 풀을 만들면 워커 기동 비용을 매번 치르므로 하나를 재사용한다
+MAX_PROCESS_WORKERS = int(os.environ.get("PEI_PROCESS_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """처음 필요할 때 만든다. 스레드풀에서도 호출되므로 생성은 lock으로 보호한다"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_PROCESS_WORKERS)
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    """앱 종료 시 호출. 대기 중인 작업은 취소한다"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -2,6 +2,7 @@ from typing import List, Dict, Any, Optional
 import uuid
 import copy
 from app.schemas.project import DiagramCanonical, CanonicalNode, CanonicalEdge
+from app.services.allocators import TagAllocator
 
 def generate_uuid():
     return str(uuid.uuid4())
@@ -17,6 +18,7 @@ def apply_repairs(
     # Creating lookups
     node_map = {n['id']: n for n in new_canonical.nodes}
     edge_map = {e['id']: e for e in new_canonical.edges}
+    tags = TagAllocator(new_canonical)
     
     for repair in repairs:
         action = repair.get("action")
@@ -50,7 +52,7 @@ def apply_repairs(
                 "id": new_node_id,
                 "type": new_node_type,
                 "subtype": new_node_subtype,
-                "tag": f"{new_node_subtype[:2].upper()}-{str(uuid.uuid4())[:4]}",
+                "tag": tags.next(new_node_subtype[:2].upper()),
                 "position": {"x": mid_x, "y": mid_y}
             }
             
@@ -0,0 +1,434 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.schemas.canonical import (
+    CanonicalEdge, CanonicalNode, DiagramCanonical, EdgeType, NodeType, Position
+)
+from app.schemas.rules import Violation
+from app.services.allocators import LineNumberAllocator, TagAllocator
+from app.services.spatial_index import SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+NODE_Y_OFFSET = {
+    "relief_valve": -200,       # PSV: 연결 장비 위
+    "safety_valve": -200,
+    "control_valve": -200,      # FCV bypass: 메인라인 위
+    "temperature_indicator_controller": -150,
+    "level_indicator_controller": -150,
+    "flow_indicator_controller": -150,
+    "pressure_indicator_controller": -150,
+}
+DEFAULT_Y_OFFSET = 0  # 메인라인 노드는 y 변경 없음
+
+Repair = Dict[str, Any]
+
+
+class RepairContext:
+    """auto_repair 1회 동안 공유되는 도면과 인덱스 (좌표, 태그, 라인번호)"""
+
+    def __init__(self, diagram: DiagramCanonical, tag_floors: Optional[Dict[str, int]] = None):
+        self.diagram = diagram
+        self.spatial = SpatialIndex(diagram)
+        self.tags = TagAllocator(diagram, tag_floors)
+        self.lines = LineNumberAllocator(diagram)
+
+
+class RepairAction:
+    """
+    violation 하나에 대한 수정 계획. 대상 노드 / 엣지는 계획 단계에서 조회해 둔다.
+    kind가 None이면 자동 수정할 수 없는 violation이다.
+    """
+
+    __slots__ = ("kind", "violation", "node", "edge")
+
+    def __init__(
+        self,
+        kind: Optional[str],
+        violation: Violation,
+        node: Optional[CanonicalNode] = None,
+        edge: Optional[CanonicalEdge] = None
+    ):
+        self.kind = kind
+        self.violation = violation
+        self.node = node
+        self.edge = edge
+
+    @property
+    def target_id(self) -> Optional[str]:
+        if self.edge is not None:
+            return self.edge.id
+        return self.node.id if self.node is not None else None
+
+    def log_entry(self) -> Dict[str, Any]:
+        v = self.violation
+        return {"kind": self.kind, "rule_code": v.rule_code, "node_id": v.node_id, "edge_id": v.edge_id}
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+# rule code -> (action kind, 대상). 같은 충돌 그룹의 수정은 대상별로 한 번만 적용한다.
+# (예: VAL-EQP-002는 흡입/토출 check마다 violation이 나오지만 차단밸브 추가는 한 번이면 된다)
+
+_NODE_ACTIONS = {
+    "missing_instrument": "add_instrument",
+    "VAL-EQP-001": "add_check_valve",
+    "VAL-EQP-002": "add_block_valves",
+    "VAL-EQP-003": "add_psv",
+    "VAL-EQP-005": "add_bypass",
+    "VAL-EQP-009": "isolate_node",
+    "isolated_node": "connect_isolated",
+}
+_EDGE_ACTIONS = {
+    "missing_valve": "insert_valve",
+}
+# 대상 노드 주변에 차단밸브를 추가하는 수정은 서로 충돌한다
+_CONFLICT_GROUPS = {
+    "add_block_valves": "block_valves",
+    "isolate_node": "block_valves",
+}
+# 대상을 찾지 못하면 수동 수정 대상으로 남기는 수정 (나머지는 조용히 건너뜀)
+_REPORT_MISSING_TARGET = {"add_instrument", "insert_valve", "connect_isolated"}
+
+
+def plan_repairs(diagram: DiagramCanonical, violations: List[Violation]) -> List[RepairAction]:
+    """
+    violation 목록을 수정 계획으로 바꾼다 (도면은 바꾸지 않는다).
+    결과는 violation 순서를 따르며, 같은 대상에 대한 중복 / 충돌 수정은 첫 번째만 남는다.
+    """
+    actions: List[RepairAction] = []
+    planned = set()
+    dropped = 0
+
+    for v in violations:
+        kind = _EDGE_ACTIONS.get(v.rule_code)
+        if kind is not None:
+            edge = diagram.edge_by_id(v.edge_id) if v.edge_id else None
+            valid = (
+                edge is not None
+                and diagram.node_by_id(edge.from_node) is not None
+                and diagram.node_by_id(edge.to_node) is not None
+            )
+            action = RepairAction(kind, v, edge=edge) if valid else None
+        else:
+            kind = _NODE_ACTIONS.get(v.rule_code)
+            node = diagram.node_by_id(v.node_id) if kind and v.node_id else None
+            action = RepairAction(kind, v, node=node) if node is not None else None
+
+        if action is None:
+            if kind is None or kind in _REPORT_MISSING_TARGET:
+                actions.append(RepairAction(None, v))
+            continue
+
+        key = (_CONFLICT_GROUPS.get(kind, kind), action.target_id)
+        if key in planned:
+            dropped += 1
+            continue
+        planned.add(key)
+        actions.append(action)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # violation마다 기록하지 않고 계획 단위로 한 번만 남긴다
+        logger.debug(
+            "repair plan: %d actions, %d duplicates dropped", len(actions), dropped,
+            extra={"repair_actions": [a.log_entry() for a in actions]}
+        )
+    return actions
+
+
+# ---------------------------------------------------------------------------
+# Actions
+# ---------------------------------------------------------------------------
+
+def _add_instrument(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, node = ctx.diagram, action.node
+    subtype = "indicator_controller"
+    prefix = "IC"
+    if node.subtype in ("pump", "centrifugal_pump"): prefix = "FIC"
+    elif node.subtype in ("vessel", "tank"): prefix = "LIC"
+    elif node.subtype == "heat_exchanger": prefix = "TIC"
+
+    inst_tag = ctx.tags.next(prefix)
+    y_offset = NODE_Y_OFFSET.get(subtype, DEFAULT_Y_OFFSET)
+    free_x, free_y = ctx.spatial.find_free_position(node.position.x, node.position.y + y_offset)
+    inst_node = CanonicalNode(
+        type=NodeType.INSTRUMENT,
+        subtype=subtype,
+        tag=inst_tag,
+        location="field",
+        position=Position(x=free_x, y=free_y)
+    )
+    diagram.nodes.append(inst_node)
+    diagram.edges.append(CanonicalEdge(
+        type=EdgeType.SIGNAL_ELECTRICAL,
+        from_node=inst_node.id,
+        to_node=node.id,
+        line_number=f"S-{inst_tag}"
+    ))
+
+    msg = f"{node.tag}에 {inst_tag} 계기 추가"
+    return {"action": "added_instrument", "node_id": node.id, "new_node_id": inst_node.id, "description": msg}
+
+
+def _insert_valve(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, edge = ctx.diagram, action.edge
+    src_node = diagram.node_by_id(edge.from_node)
+    tgt_node = diagram.node_by_id(edge.to_node)
+    v_tag = ctx.tags.next("XV")
+    vx = src_node.position.x + (tgt_node.position.x - src_node.position.x) / 2
+    vy = src_node.position.y + (tgt_node.position.y - src_node.position.y) / 2
+    free_x, free_y = ctx.spatial.find_free_position(vx, vy)
+    valve_node = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="gate_valve",
+        tag=v_tag,
+        position=Position(x=free_x, y=free_y)
+    )
+    diagram.nodes.append(valve_node)
+
+    edge2 = CanonicalEdge(
+        type=edge.type,
+        from_node=valve_node.id,
+        to_node=edge.to_node,
+        line_number=ctx.lines.next()
+    )
+    diagram.rewire_edge(edge, to_node=valve_node.id)
+    diagram.edges.append(edge2)
+
+    msg = f"{edge.line_number or '라인'}에 {v_tag} 밸브 삽입"
+    return {"action": "added_valve", "edge_id": edge.id, "new_node_id": valve_node.id, "description": msg}
+
+
+def _add_check_valve(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, pump_node = ctx.diagram, action.node
+    # 엣지 유무 무관하게 check_valve 노드 생성
+    new_tag = ctx.tags.next("CV")
+    y_offset = NODE_Y_OFFSET.get("check_valve", DEFAULT_Y_OFFSET)
+    free_x, free_y = ctx.spatial.find_free_position(pump_node.position.x + 250, pump_node.position.y + y_offset)
+    cv_node = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="check_valve",
+        tag=new_tag,
+        description="Check Valve",
+        position=Position(x=free_x, y=free_y)
+    )
+    diagram.nodes.append(cv_node)
+
+    # pump → cv 엣지 생성
+    diagram.edges.append(CanonicalEdge(
+        type=EdgeType.PROCESS,
+        from_node=pump_node.id,
+        to_node=cv_node.id,
+        line_number=ctx.lines.next()
+    ))
+
+    msg = f"{pump_node.tag} 토출측에 {new_tag} 체크밸브 추가"
+    return {"action": "added_valve", "node_id": pump_node.id, "new_node_id": cv_node.id, "description": msg}
+
+
+def _add_block_valves(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, pump_node = ctx.diagram, action.node
+
+    # 흡입측 gate_valve
+    tag_in = ctx.tags.next("XV")
+    y_offset_in = NODE_Y_OFFSET.get("gate_valve", DEFAULT_Y_OFFSET)
+    free_x_in, free_y_in = ctx.spatial.find_free_position(pump_node.position.x - 250, pump_node.position.y + y_offset_in, step=-250)
+    gv_in = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="gate_valve",
+        tag=tag_in,
+        description="Suction Block Valve",
+        position=Position(x=free_x_in, y=free_y_in)
+    )
+    diagram.nodes.append(gv_in)
+    diagram.edges.append(CanonicalEdge(
+        type=EdgeType.PROCESS,
+        from_node=gv_in.id,
+        to_node=pump_node.id,
+        line_number=ctx.lines.next()
+    ))
+
+    # 토출측 gate_valve
+    tag_out = ctx.tags.next("XV")
+    y_offset_out = NODE_Y_OFFSET.get("gate_valve", DEFAULT_Y_OFFSET)
+    free_x_out, free_y_out = ctx.spatial.find_free_position(pump_node.position.x + 500, pump_node.position.y + y_offset_out)
+    gv_out = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="gate_valve",
+        tag=tag_out,
+        description="Discharge Block Valve",
+        position=Position(x=free_x_out, y=free_y_out)
+    )
+    diagram.nodes.append(gv_out)
+    diagram.edges.append(CanonicalEdge(
+        type=EdgeType.PROCESS,
+        from_node=pump_node.id,
+        to_node=gv_out.id,
+        line_number=ctx.lines.next()
+    ))
+
+    msg = f"{pump_node.tag} 흡입측 {tag_in}, 토출측 {tag_out} 차단밸브 추가"
+    return {"action": "added_valve", "node_id": pump_node.id, "new_node_id": gv_in.id, "description": msg}
+
+
+def _add_psv(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, vessel_node = ctx.diagram, action.node
+    tag = ctx.tags.next("PSV")
+    y_offset = NODE_Y_OFFSET.get("safety_valve", DEFAULT_Y_OFFSET)
+    free_x, free_y = ctx.spatial.find_free_position(vessel_node.position.x, vessel_node.position.y + y_offset)
+    psv = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="safety_valve",
+        tag=tag,
+        description="Pressure Safety Valve",
+        position=Position(x=free_x, y=free_y)
+    )
+    diagram.nodes.append(psv)
+    diagram.edges.append(CanonicalEdge(
+        type=EdgeType.PROCESS,
+        from_node=vessel_node.id,
+        to_node=psv.id,
+        line_number=ctx.lines.next()
+    ))
+    msg = f"{vessel_node.tag}에 {tag} PSV 추가"
+    return {"action": "added_psv", "node_id": vessel_node.id, "new_node_id": psv.id, "description": msg}
+
+
+def _add_bypass(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, pump_node = ctx.diagram, action.node
+    # 바이패스: pump 상류 → control_valve → pump 하류 병렬 경로
+    tag_cv = ctx.tags.next("FCV")
+    y_offset = NODE_Y_OFFSET.get("control_valve", DEFAULT_Y_OFFSET)
+    free_x, free_y = ctx.spatial.find_free_position(pump_node.position.x, pump_node.position.y + y_offset)
+    bypass_cv = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="control_valve",
+        tag=tag_cv,
+        description="Bypass Control Valve",
+        position=Position(x=free_x, y=free_y)
+    )
+    diagram.nodes.append(bypass_cv)
+
+    # 상류 노드 (pump incoming 엣지 source), 하류 노드 (pump outgoing 엣지 target)
+    upstream_id = next((e.from_node for e in diagram.edges_to(pump_node.id)), None)
+    downstream_id = next((e.to_node for e in diagram.edges_from(pump_node.id)), None)
+
+    if upstream_id and downstream_id:
+        diagram.edges.append(CanonicalEdge(
+            type=EdgeType.PROCESS,
+            from_node=upstream_id,
+            to_node=bypass_cv.id,
+            line_number=ctx.lines.next()
+        ))
+        diagram.edges.append(CanonicalEdge(
+            type=EdgeType.PROCESS,
+            from_node=bypass_cv.id,
+            to_node=downstream_id,
+            line_number=ctx.lines.next()
+        ))
+    msg = f"{pump_node.tag} 바이패스 라인에 {tag_cv} 추가"
+    return {"action": "added_bypass", "node_id": pump_node.id, "new_node_id": bypass_cv.id, "description": msg}
+
+
+def _isolate_node(ctx: RepairContext, action: RepairAction) -> Repair:
+    diagram, target_node = ctx.diagram, action.node
+
+    # 상류 차단밸브
+    tag_in = ctx.tags.next("XV")
+    free_x_in, _ = ctx.spatial.find_free_position(target_node.position.x - 250, target_node.position.y)
+    xv_in = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="gate_valve",
+        tag=tag_in,
+        description="Gate Valve",
+        location="field",
+        position=Position(x=free_x_in, y=target_node.position.y)
+    )
+
+    # 하류 차단밸브
+    tag_out = ctx.tags.next("XV")
+    free_x_out, _ = ctx.spatial.find_free_position(target_node.position.x + 250, target_node.position.y)
+    xv_out = CanonicalNode(
+        type=NodeType.VALVE,
+        subtype="gate_valve",
+        tag=tag_out,
+        description="Gate Valve",
+        location="field",
+        position=Position(x=free_x_out, y=target_node.position.y)
+    )
+
+    # 기존 incoming/outgoing 엣지 재연결 (인덱스는 제자리 갱신)
+    incoming = diagram.edges_to(target_node.id)
+    outgoing = diagram.edges_from(target_node.id)
+
+    for e in incoming:
+        diagram.rewire_edge(e, to_node=xv_in.id)
+    diagram.edges.append(CanonicalEdge(
+        from_node=xv_in.id,
+        to_node=target_node.id,
+        type=EdgeType.PROCESS,
+        line_number=ctx.lines.next(),
+        insulation="N"
+    ))
+
+    for e in outgoing:
+        diagram.rewire_edge(e, from_node=xv_out.id)
+    diagram.edges.append(CanonicalEdge(
+        from_node=target_node.id,
+        to_node=xv_out.id,
+        type=EdgeType.PROCESS,
+        line_number=ctx.lines.next(),
+        insulation="N"
+    ))
+
+    diagram.nodes.append(xv_in)
+    diagram.nodes.append(xv_out)
+    return {"action": "added_valves", "node_id": target_node.id, "description": f"{target_node.tag} 전후에 {tag_in}, {tag_out} 차단밸브 추가"}
+
+
+def _connect_isolated(ctx: RepairContext, action: RepairAction) -> Optional[Repair]:
+    diagram, node = ctx.diagram, action.node
+    nearest = ctx.spatial.nearest_equipment(node)
+    if not nearest:
+        return None
+
+    diagram.edges.append(CanonicalEdge(
+        type=EdgeType.PROCESS,
+        from_node=node.id,
+        to_node=nearest.id,
+        line_number=ctx.lines.next()
+    ))
+    msg = f"{node.tag} 노드를 {nearest.tag}에 연결"
+    return {"action": "connected_isolated_node", "node_id": node.id, "target_id": nearest.id, "description": msg}
+
+
+ACTION_HANDLERS: Dict[str, Callable[[RepairContext, RepairAction], Optional[Repair]]] = {
+    "add_instrument": _add_instrument,
+    "insert_valve": _insert_valve,
+    "add_check_valve": _add_check_valve,
+    "add_block_valves": _add_block_valves,
+    "add_psv": _add_psv,
+    "add_bypass": _add_bypass,
+    "isolate_node": _isolate_node,
+    "connect_isolated": _connect_isolated,
+}
+
+
+def apply_plan(ctx: RepairContext, actions: List[RepairAction]) -> Tuple[List[Repair], List[Violation]]:
+    """
+    계획을 순서대로 한 번에 적용한다. 재연결은 rewire_edge로 인덱스를 제자리 갱신하므로
+    적용 중 인덱스 재빌드가 일어나지 않는다. (적용된 수정 목록, 수동 수정 필요 violation) 반환.
+    """
+    repairs: List[Repair] = []
+    unfixable: List[Violation] = []
+    for action in actions:
+        handler = ACTION_HANDLERS.get(action.kind) if action.kind else None
+        repair = handler(ctx, action) if handler else None
+        if repair is None:
+            unfixable.append(action.violation)
+            repair = {"action": "unrepairable", "description": f"수동 수정 필요: {action.violation.rule_code}"}
+        repairs.append(repair)
+
+    logger.debug("repair pass applied %d actions, %d unfixable", len(repairs) - len(unfixable), len(unfixable))
+    return repairs, unfixable
@@ -0,0 +1,263 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+
+# 몇 버전마다 전체 snapshot을 남길지. 한 버전을 복원할 때 적용하는 delta 수의 상한이기도 하다
+SNAPSHOT_INTERVAL = int(os.environ.get("PEI_SNAPSHOT_INTERVAL", "20"))
+
+# id 기준으로 요소 단위 diff를 하는 canonical 컬렉션. 나머지 최상위 키는 값 통째로 비교한다
+COLLECTIONS = ("nodes", "edges", "signal_lines")
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+
+# --- Delta ---
+
+def has_unique_ids(items: Any) -> bool:
+    """모든 요소가 고유한 id를 가진 리스트인지 (아니면 컬렉션을 통째로 저장한다)"""
+    if not isinstance(items, list):
+        return False
+    ids = set()
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), str) or item["id"] in ids:
+            return False
+        ids.add(item["id"])
+    return True
+
+
+def _diff_collection(old_items: List[Dict[str, Any]], new_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    old_by_id = {item["id"]: item for item in old_items}
+    new_ids = set()
+    upsert = []
+    for item in new_items:
+        new_ids.add(item["id"])
+        if old_by_id.get(item["id"]) != item:
+            upsert.append(item)
+
+    change: Dict[str, Any] = {}
+    if upsert:
+        change["upsert"] = upsert
+    remove = [i for i in old_by_id if i not in new_ids]
+    if remove:
+        change["remove"] = remove
+
+    # 적용 규칙(기존 순서 유지, 새 요소는 뒤에 추가)으로 순서가 재현되지 않을 때만 전체 id 순서를 남긴다
+    actual = [item["id"] for item in new_items]
+    expected = [i for i in old_by_id if i in new_ids] + [i for i in actual if i not in old_by_id]
+    if expected != actual:
+        change["order"] = actual
+    return change
+
+
+def _apply_collection(items: List[Dict[str, Any]], change: Dict[str, Any]) -> List[Dict[str, Any]]:
+    by_id = {item["id"]: item for item in items}
+    for item_id in change.get("remove", []):
+        by_id.pop(item_id, None)
+    for item in change.get("upsert", []):
+        by_id[item["id"]] = item    # 기존 id는 자리를 유지하고 새 id는 뒤에 붙는다
+    order = change.get("order")
+    if order is not None:
+        return [by_id[i] for i in order]
+    return list(by_id.values())
+
+
+def compute_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    두 canonical_json 사이의 구조적 delta.
+    {"collections": {"nodes": {"upsert": [...], "remove": [...], "order": [...]}, ...},
+     "set": {최상위 키: 값}, "unset": [삭제된 최상위 키]}
+    추가/변경된 요소는 요소 전체를, 삭제된 요소는 id만 담는다.
+    """
+    collections = {}
+    changed = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if key in COLLECTIONS and has_unique_ids(value) and has_unique_ids(before):
+            change = _diff_collection(before, value)
+            if change:
+                collections[key] = change
+        elif key not in old or before != value:
+            changed[key] = value
+
+    delta: Dict[str, Any] = {}
+    if collections:
+        delta["collections"] = collections
+    if changed:
+        delta["set"] = changed
+    unset = [key for key in old if key not in new]
+    if unset:
+        delta["unset"] = unset
+    return delta
+
+
+def apply_delta(doc: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """compute_delta의 역. doc은 수정하지 않고 새 dict를 반환한다 (요소 dict는 공유)"""
+    result = dict(doc)
+    for key in delta.get("unset", []):
+        result.pop(key, None)
+    result.update(delta.get("set", {}))
+    for key, change in delta.get("collections", {}).items():
+        result[key] = _apply_collection(result.get(key, []), change)
+    return result
+
+
+# --- Storage ---
+# 불변식: Diagram.canonical_json은 가장 최근 snapshot 내용이다 (revision이 없는 이전 도면은 현재 내용).
+# 그 이후 버전은 diagram_revisions의 delta로만 저장되므로 현재 내용은 load_current로 읽는다.
+
+async def _latest_snapshot_version(db: AsyncSession, diagram_id: str) -> Optional[int]:
+    stmt = select(func.max(models.DiagramRevision.version)).where(
+        models.DiagramRevision.diagram_id == diagram_id,
+        models.DiagramRevision.kind == SNAPSHOT
+    )
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def _apply_deltas(
+    db: AsyncSession, diagram_id: str, base: Dict[str, Any], base_version: int, version: int
+) -> Optional[Dict[str, Any]]:
+    if version == base_version:
+        return base
+    stmt = (
+        select(models.DiagramRevision.data_json)
+        .where(
+            models.DiagramRevision.diagram_id == diagram_id,
+            models.DiagramRevision.kind == DELTA,
+            models.DiagramRevision.version > base_version,
+            models.DiagramRevision.version <= version
+        )
+        .order_by(models.DiagramRevision.version)
+    )
+    deltas = (await db.execute(stmt)).scalars().all()
+    if len(deltas) != version - base_version:
+        return None     # 중간 revision 누락
+    doc = base
+    for delta in deltas:
+        doc = apply_delta(doc, delta)
+    return doc
+
+
+def add_initial_revision(db: AsyncSession, diagram: models.Diagram) -> None:
+    """새 도면의 첫 버전을 snapshot으로 남긴다 (diagram.id가 정해진 뒤 호출)"""
+    db.add(models.DiagramRevision(
+        diagram_id=diagram.id, version=diagram.version, kind=SNAPSHOT, data_json=diagram.canonical_json
+    ))
+
+
+async def save_revision(
+    db: AsyncSession, diagram: models.Diagram, canonical_json: Dict[str, Any], delta: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    canonical_json을 새 버전으로 저장하고 diagram.version을 올린다 (commit은 호출자).
+    SNAPSHOT_INTERVAL 버전마다 snapshot을 남기고 Diagram.canonical_json을 갱신하며,
+    그 사이 버전은 직전 버전과의 delta 한 행만 추가한다.
+    delta를 이미 알고 있으면(PATCH) 넘겨서 직전 버전 복원과 비교를 생략한다.
+    저장한 delta를 반환한다 (snapshot으로 저장했으면 None).
+    """
+    snapshot_version = await _latest_snapshot_version(db, diagram.id)
+    if snapshot_version is None:
+        # revision 저장 이전에 만들어진 도면: 현재 내용을 기준 snapshot으로 남긴다
+        add_initial_revision(db, diagram)
+        snapshot_version = diagram.version
+
+    version = diagram.version + 1
+    snapshot_due = version - snapshot_version >= SNAPSHOT_INTERVAL
+    if delta is None and not snapshot_due:
+        current = await _apply_deltas(db, diagram.id, diagram.canonical_json, snapshot_version, diagram.version)
+        if current is not None:
+            delta = compute_delta(current, canonical_json)
+
+    diagram.version = version
+    if delta is None or snapshot_due:
+        db.add(models.DiagramRevision(diagram_id=diagram.id, version=version, kind=SNAPSHOT, data_json=canonical_json))
+        diagram.canonical_json = canonical_json
+        return None
+    db.add(models.DiagramRevision(diagram_id=diagram.id, version=version, kind=DELTA, data_json=delta))
+    return delta
+
+
+async def load_current(db: AsyncSession, diagram: models.Diagram) -> Dict[str, Any]:
+    """도면의 현재(diagram.version) canonical_json"""
+    snapshot_version = await _latest_snapshot_version(db, diagram.id)
+    if snapshot_version is None:
+        return diagram.canonical_json
+    current = await _apply_deltas(db, diagram.id, diagram.canonical_json, snapshot_version, diagram.version)
+    if current is None:
+        raise RuntimeError(f"Diagram {diagram.id} revision chain is broken after version {snapshot_version}")
+    return current
+
+
+async def load_current_many(db: AsyncSession, diagrams: Sequence[models.Diagram]) -> Dict[str, Dict[str, Any]]:
+    """
+    여러 도면의 현재 canonical_json (diagram.id -> 내용).
+    도면마다 load_current를 부르는 대신 최근 snapshot 버전 조회와 그 이후 delta 조회 두 번으로 끝낸다.
+    """
+    by_id = {diagram.id: diagram for diagram in diagrams}
+    if not by_id:
+        return {}
+    latest = (
+        select(
+            models.DiagramRevision.diagram_id,
+            func.max(models.DiagramRevision.version).label("version")
+        )
+        .where(models.DiagramRevision.diagram_id.in_(by_id), models.DiagramRevision.kind == SNAPSHOT)
+        .group_by(models.DiagramRevision.diagram_id)
+        .subquery()
+    )
+    snapshot_versions = dict((await db.execute(select(latest.c.diagram_id, latest.c.version))).all())
+
+    deltas: Dict[str, List[Dict[str, Any]]] = {}
+    if snapshot_versions:
+        stmt = (
+            select(models.DiagramRevision.diagram_id, models.DiagramRevision.version, models.DiagramRevision.data_json)
+            .join(latest, latest.c.diagram_id == models.DiagramRevision.diagram_id)
+            .where(models.DiagramRevision.kind == DELTA, models.DiagramRevision.version > latest.c.version)
+            .order_by(models.DiagramRevision.diagram_id, models.DiagramRevision.version)
+        )
+        for diagram_id, version, data in (await db.execute(stmt)).all():
+            if version <= by_id[diagram_id].version:
+                deltas.setdefault(diagram_id, []).append(data)
+
+    result = {}
+    for diagram_id, diagram in by_id.items():
+        snapshot_version = snapshot_versions.get(diagram_id)
+        if snapshot_version is None:
+            result[diagram_id] = diagram.canonical_json
+            continue
+        chain = deltas.get(diagram_id, [])
+        if len(chain) != diagram.version - snapshot_version:
+            raise RuntimeError(f"Diagram {diagram_id} revision chain is broken after version {snapshot_version}")
+        doc = diagram.canonical_json
+        for delta in chain:
+            doc = apply_delta(doc, delta)
+        result[diagram_id] = doc
+    return result
+
+
+async def load_revision(db: AsyncSession, diagram: models.Diagram, version: int) -> Optional[Dict[str, Any]]:
+    """과거 버전의 canonical_json. 복원할 수 없는 버전이면 None"""
+    if version < 1 or version > diagram.version:
+        return None
+    stmt = (
+        select(models.DiagramRevision.version, models.DiagramRevision.data_json)
+        .where(
+            models.DiagramRevision.diagram_id == diagram.id,
+            models.DiagramRevision.kind == SNAPSHOT,
+            models.DiagramRevision.version <= version
+        )
+        .order_by(models.DiagramRevision.version.desc())
+        .limit(1)
+    )
+    snapshot = (await db.execute(stmt)).first()
+    if snapshot is None:
+        # revision 이전 도면은 저장된 현재 버전만 복원 가능
+        if version == diagram.version and await _latest_snapshot_version(db, diagram.id) is None:
+            return diagram.canonical_json
+        return None
+    snapshot_version, data = snapshot
+    return await _apply_deltas(db, diagram.id, data, snapshot_version, version)
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.schemas.base import Rule as RuleSchema
+from app.services.validation_cache import clear_report_cache
+from app.services.validator import RulePlan, clear_rule_plan_cache, get_rule_plan, load_condition
+
+
+class CachedRuleset:
+    """
+    DB 세션과 분리된 Ruleset 스냅샷.
+    validate rule 목록, 디코딩된 condition, 컴파일된 RulePlan을 함께 보관한다.
+    """
+
+    def __init__(self, ruleset: models.Ruleset, rules: List[models.Rule]):
+        self.id: str = ruleset.id
+        self.name: str = ruleset.name
+        self.version: int = ruleset.version
+        self.hash: str = ruleset.hash
+        self.status: str = ruleset.status
+        self.rules: List[RuleSchema] = [RuleSchema.model_validate(r) for r in rules]
+        self.conditions: Dict[str, Dict[str, Any]] = {
+            r.code: load_condition(r.condition_json) or {} for r in self.rules
+        }
+        self.plan: RulePlan = get_rule_plan(self.rules, self.hash)
+
+
+# ruleset.id -> CachedRuleset
+# 캐시 항목은 반환 전에 Ruleset.hash 한 컬럼 조회로 확인하므로, 다른 프로세스가 바꾼 ruleset도 반영된다.
+# hash 갱신 없는 rule 변경은 이 프로세스의 commit 훅으로 무효화한다.
+_rulesets: Dict[str, CachedRuleset] = {}
+
+
+def invalidate_ruleset_cache(ruleset_id: Optional[str] = None) -> None:
+    """ruleset_id가 없으면 전체 무효화. seed 적재나 ruleset 상태 변경 후 호출된다."""
+    # rule 내용이 hash 갱신 없이 바뀌었을 수 있으므로 컴파일된 RulePlan과 검증 결과 캐시도 비운다
+    clear_rule_plan_cache()
+    clear_report_cache()
+    if ruleset_id is None:
+        _rulesets.clear()
+        return
+    _rulesets.pop(ruleset_id, None)
+
+
+async def _load_ruleset(db: AsyncSession, ruleset_id: str) -> Optional[CachedRuleset]:
+    ruleset = await db.get(models.Ruleset, ruleset_id)
+    if not ruleset:
+        _rulesets.pop(ruleset_id, None)
+        return None
+    stmt = select(models.Rule).where(
+        models.Rule.ruleset_id == ruleset.id,
+        models.Rule.kind == "validate",
+        models.Rule.enabled == True
+    )
+    result = await db.execute(stmt)
+    cached = CachedRuleset(ruleset, result.scalars().all())
+    _rulesets[cached.id] = cached
+    return cached
+
+
+async def _get_fresh(db: AsyncSession, ruleset_id: str, current_hash: str) -> Optional[CachedRuleset]:
+    # 캐시 hash가 DB와 같을 때만 재사용하고, 아니면 rule까지 다시 읽는다
+    cached = _rulesets.get(ruleset_id)
+    if cached is not None and cached.hash == current_hash:
+        return cached
+    return await _load_ruleset(db, ruleset_id)
+
+
+async def get_ruleset(db: AsyncSession, ruleset_id: str) -> Optional[CachedRuleset]:
+    stmt = select(models.Ruleset.hash).where(models.Ruleset.id == ruleset_id)
+    current_hash = (await db.execute(stmt)).scalar_one_or_none()
+    if current_hash is None:
+        _rulesets.pop(ruleset_id, None)
+        return None
+    return await _get_fresh(db, ruleset_id, current_hash)
+
+
+async def get_active_ruleset(db: AsyncSession) -> Optional[CachedRuleset]:
+    """가장 최근 status="active" ruleset. 캐시가 따뜻하면 (id, hash) 한 행만 조회한다."""
+    stmt = (
+        select(models.Ruleset.id, models.Ruleset.hash)
+        .where(models.Ruleset.status == "active")
+        .order_by(models.Ruleset.created_at.desc())
+        .limit(1)
+    )
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        return None
+    return await _get_fresh(db, row.id, row.hash)
+
+
+_CHANGED_KEY = "ruleset_cache_changed"
+
+
+@event.listens_for(Session, "after_flush")
+def _track_rule_changes(session: Session, flush_context: Any) -> None:
+    # Ruleset / Rule 행이 추가·수정·삭제되면 (status 변경 포함) commit 시점에 캐시를 비우도록 표시한다
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (models.Ruleset, models.Rule)):
+            session.info[_CHANGED_KEY] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    # flush 직후에 비우면 commit 전에 다른 요청이 이전 내용을 다시 캐시할 수 있다
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate_ruleset_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
@@ -4,6 +4,7 @@ import os
 from sqlalchemy import select
 from app.database import SessionLocal, engine, Base
 from app.models import Ruleset, Rule
+from app.services.ruleset_cache import invalidate_ruleset_cache
 from datetime import datetime
 import hashlib
 
@@ -95,6 +96,7 @@ async def load_seeds():
             db.add(rule)
         
         await db.commit()
+        invalidate_ruleset_cache()
         print("Seed data loaded successfully.")
 
 if __name__ == "__main__":
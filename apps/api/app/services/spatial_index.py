@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.schemas.canonical import CanonicalNode, DiagramCanonical, NodeType
+
+# 장비 최근접 탐색용 격자 셀 크기 (px). 템플릿 노드 간격(250px)의 두 배
+EQUIPMENT_CELL_SIZE = 500
+
+Cell = Tuple[int, int]
+
+
+class SpatialIndex:
+    """
+    auto_repair 1회 동안 유지되는 노드 좌표 인덱스.
+    - 점유 좌표: y별 x 집합과 (y, step)별 '다음 빈 x' 포인터(경로 압축)로 빈 위치를 찾는다
+    - 장비 노드: 균일 격자 버킷으로 최근접 장비를 찾는다
+    노드는 append만 되고 기존 노드 좌표는 바뀌지 않는다고 가정하며, 조회 시 새로 추가된 노드를 흡수한다.
+    노드 목록이 교체되거나 줄어들면 다시 만든다.
+    """
+
+    def __init__(self, diagram: DiagramCanonical, cell_size: int = EQUIPMENT_CELL_SIZE):
+        self.diagram = diagram
+        self.cell_size = cell_size
+        self._reset()
+
+    def _reset(self) -> None:
+        self._nodes_ref = self.diagram.nodes
+        self._count = 0
+        self._occupied: Dict[float, Set[float]] = {}
+        self._next_free: Dict[Tuple[float, float], Dict[float, float]] = {}
+        self._cells: Dict[Cell, List[Tuple[int, CanonicalNode]]] = {}
+        self._bounds: Optional[List[int]] = None    # [min cx, max cx, min cy, max cy]
+
+    def sync(self) -> None:
+        nodes = self.diagram.nodes
+        if nodes is not self._nodes_ref or len(nodes) < self._count:
+            self._reset()
+        for i in range(self._count, len(nodes)):
+            self._add(i, nodes[i])
+        self._count = len(nodes)
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def _add(self, order: int, node: CanonicalNode) -> None:
+        x, y = node.position.x, node.position.y
+        self._occupied.setdefault(y, set()).add(x)
+        if node.type != NodeType.EQUIPMENT:
+            return
+        cell = self._cell(x, y)
+        self._cells.setdefault(cell, []).append((order, node))
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            b = self._bounds
+            b[0] = min(b[0], cell[0])
+            b[1] = max(b[1], cell[0])
+            b[2] = min(b[2], cell[1])
+            b[3] = max(b[3], cell[1])
+
+    def find_free_position(self, base_x: float, base_y: float, step: float = 250) -> Tuple[float, float]:
+        """(base_x, base_y)에서 x를 step씩 옮기며 처음 비어 있는 좌표 (정확히 같은 좌표만 점유로 본다)"""
+        self.sync()
+        row = self._occupied.get(base_y)
+        if not row or base_x not in row:
+            return base_x, base_y
+
+        # 점유는 늘어나기만 하므로 한 번 건너뛴 구간은 다음 탐색에서도 건너뛸 수 있다
+        jumps = self._next_free.setdefault((base_y, step), {})
+        path = []
+        x = base_x
+        while x in row:
+            path.append(x)
+            x = jumps.get(x, x + step)
+        for p in path:
+            jumps[p] = x
+        return x, base_y
+
+    def nearest_equipment(self, node: CanonicalNode) -> Optional[CanonicalNode]:
+        """
+        node와 유클리드 거리가 가장 가까운 장비 노드 (node 자신 제외).
+        거리가 같으면 도면에서 앞선 노드를 고른다.
+        """
+        self.sync()
+        if self._bounds is None:
+            return None
+
+        nx, ny = node.position.x, node.position.y
+        cx, cy = self._cell(nx, ny)
+        min_cx, max_cx, min_cy, max_cy = self._bounds
+        max_ring = max(abs(cx - min_cx), abs(cx - max_cx), abs(cy - min_cy), abs(cy - max_cy))
+
+        best: Optional[CanonicalNode] = None
+        best_key = (float("inf"), 0)
+        for ring in range(max_ring + 1):
+            # ring 이상 떨어진 셀의 노드는 최소 (ring - 1) * cell_size 만큼 떨어져 있다
+            if best is not None and best_key[0] < (ring - 1) * self.cell_size:
+                break
+            if 8 * ring > len(self._cells):
+                # 남은 링이 채워진 셀보다 많으면 남은 셀을 직접 훑는다
+                cells = [c for c in self._cells if max(abs(c[0] - cx), abs(c[1] - cy)) >= ring]
+                best, best_key = self._scan(node, cells, best, best_key)
+                break
+            best, best_key = self._scan(node, self._ring_cells(cx, cy, ring), best, best_key)
+        return best
+
+    def _scan(self, node: CanonicalNode, cells, best: Optional[CanonicalNode], best_key: Tuple[float, int]):
+        nx, ny = node.position.x, node.position.y
+        for cell in cells:
+            for order, other in self._cells.get(cell, ()):
+                if other.id == node.id:
+                    continue
+                dist = ((other.position.x - nx)**2 + (other.position.y - ny)**2)**0.5
+                key = (dist, order)
+                if key < best_key:
+                    best_key = key
+                    best = other
+        return best, best_key
+
+    @staticmethod
+    def _ring_cells(cx: int, cy: int, ring: int):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
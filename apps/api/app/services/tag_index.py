@@ -0,0 +1,57 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.services.allocators import SEQUENCE_BASE
+
+# 프로젝트 단위 태그 색인. diagram_nodes(tag, tag_prefix, tag_seq)만 읽으며 도면 JSON은 열지 않는다.
+# (project_id, tag_prefix, tag_seq) 인덱스가 prefix별 정렬된 순번 목록, (project_id, tag) 인덱스가 태그 -> 도면/노드 역할을 한다.
+
+
+async def next_free_tag(db: AsyncSession, project_id: str, prefix: str) -> str:
+    """프로젝트 전체에서 prefix의 최대 번호 다음 태그 (인덱스 탐색 한 번)"""
+    stmt = select(func.max(models.DiagramNode.tag_seq)).where(
+        models.DiagramNode.project_id == project_id,
+        models.DiagramNode.tag_prefix == prefix
+    )
+    max_seq = (await db.execute(stmt)).scalar_one_or_none()
+    return f"{prefix}-{max(SEQUENCE_BASE, max_seq or 0) + 1}"
+
+
+async def project_tag_floors(db: AsyncSession, project_id: Optional[str]) -> Dict[str, int]:
+    """
+    prefix -> 프로젝트에서 쓰인 최대 번호. generator / repair의 TagAllocator floors로 넘겨
+    다른 도면과 겹치지 않는 태그를 발급한다. prefix 수만큼의 행만 돌려준다.
+    """
+    if not project_id:
+        return {}
+    stmt = (
+        select(models.DiagramNode.tag_prefix, func.max(models.DiagramNode.tag_seq))
+        .where(models.DiagramNode.project_id == project_id, models.DiagramNode.tag_prefix.is_not(None))
+        .group_by(models.DiagramNode.tag_prefix)
+    )
+    return dict((await db.execute(stmt)).all())
+
+
+async def duplicate_tags(db: AsyncSession, project_id: str) -> List[Dict[str, Any]]:
+    """프로젝트 안에서 두 노드 이상이 쓰는 태그와 그 노드들 (도면이 달라도, 같아도)"""
+    duplicated = (
+        select(models.DiagramNode.tag)
+        .where(models.DiagramNode.project_id == project_id, models.DiagramNode.tag.is_not(None))
+        .group_by(models.DiagramNode.tag)
+        .having(func.count() > 1)
+    )
+    stmt = (
+        select(models.DiagramNode.tag, models.DiagramNode.diagram_id, models.DiagramNode.node_id)
+        .where(models.DiagramNode.project_id == project_id, models.DiagramNode.tag.in_(duplicated))
+        .order_by(models.DiagramNode.tag, models.DiagramNode.diagram_id, models.DiagramNode.node_id)
+    )
+    groups: Dict[str, Dict[str, Any]] = {}
+    for tag, diagram_id, node_id in (await db.execute(stmt)).all():
+        group = groups.setdefault(tag, {"tag": tag, "nodes": []})
+        group["nodes"].append({"diagram_id": diagram_id, "node_id": node_id})
+    for group in groups.values():
+        group["diagram_count"] = len({n["diagram_id"] for n in group["nodes"]})
+    return list(groups.values())
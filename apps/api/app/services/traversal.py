@@ -0,0 +1,103 @@
+from collections import deque
+from typing import Dict, FrozenSet, Tuple
+
+from app.schemas.canonical import CanonicalNode, DiagramCanonical, _DiagramIndex
+
+# 탐색 결과 memo 키: (node_id, downstream 여부, max_distance)
+ReachKey = Tuple[str, bool, int]
+
+
+def bfs_nodes(
+    canonical: DiagramCanonical, node_id: str, max_distance: int, downstream: bool = True
+) -> Tuple[CanonicalNode, ...]:
+    """
+    node_id에서 엣지 방향(downstream) 또는 역방향으로 max_distance hop 이내의 노드를 BFS 순서로 반환한다.
+    시작 노드는 순환으로 되돌아온 경우에만 포함된다.
+    """
+    return _bfs(canonical.index, node_id, max_distance, downstream)
+
+
+def _bfs(index: _DiagramIndex, node_id: str, max_distance: int, downstream: bool) -> Tuple[CanonicalNode, ...]:
+    adjacency = index.out_edges if downstream else index.in_edges
+    nodes_by_id = index.nodes_by_id
+    visited = set()
+    found = []
+    queue = deque([(node_id, 0)])
+
+    while queue:
+        curr, dist = queue.popleft()
+        if dist >= max_distance:
+            continue
+
+        for edge in adjacency.get(curr, ()):
+            next_id = edge.to_node if downstream else edge.from_node
+            if next_id in visited:
+                continue
+            next_node = nodes_by_id.get(next_id)
+            if next_node is not None:
+                visited.add(next_id)
+                found.append(next_node)
+                queue.append((next_id, dist + 1))
+
+    return tuple(found)
+
+
+class Traversal:
+    """
+    한 번의 검증 실행 동안 유지되는 탐색 memo.
+    같은 (node, 방향, 거리) 탐색을 여러 rule / 여러 노드가 공유하므로
+    downstream_node / upstream_node / has_bypass 검사가 도면 크기에 선형으로 동작한다.
+    도면이 바뀌면 새 Traversal을 만들어야 한다.
+    인덱스는 생성 시 한 번만 가져온다 (canonical.index는 조회마다 변경분 동기화 비용이 있음).
+    """
+
+    def __init__(self, canonical: DiagramCanonical):
+        self.canonical = canonical
+        self.index = canonical.index
+        self._nodes: Dict[ReachKey, Tuple[CanonicalNode, ...]] = {}
+        self._ids: Dict[ReachKey, FrozenSet[str]] = {}
+        self._bypass_ids: Dict[str, FrozenSet[str]] = {}
+
+    def reachable(self, node_id: str, max_distance: int, downstream: bool = True) -> Tuple[CanonicalNode, ...]:
+        key = (node_id, downstream, max_distance)
+        found = self._nodes.get(key)
+        if found is None:
+            found = _bfs(self.index, node_id, max_distance, downstream)
+            self._nodes[key] = found
+        return found
+
+    def reachable_ids(self, node_id: str, max_distance: int, downstream: bool = True) -> FrozenSet[str]:
+        key = (node_id, downstream, max_distance)
+        ids = self._ids.get(key)
+        if ids is None:
+            ids = frozenset(n.id for n in self.reachable(node_id, max_distance, downstream))
+            self._ids[key] = ids
+        return ids
+
+    def _branch_reach(self, upstream_id: str, skip_id: str) -> FrozenSet[str]:
+        """upstream_id에서 skip_id를 거치지 않고 갈라지는 분기의 3 hop 이내 하류 노드 집합"""
+        key = upstream_id + "\0" + skip_id
+        ids = self._bypass_ids.get(key)
+        if ids is not None:
+            return ids
+
+        index = self.index
+        reach = set()
+        for edge in index.out_edges.get(upstream_id, ()):
+            if edge.to_node != skip_id:
+                reach.update(self.reachable_ids(edge.to_node, 3))
+                if edge.to_node in index.nodes_by_id:
+                    reach.add(edge.to_node)
+        ids = frozenset(reach)
+        self._bypass_ids[key] = ids
+        return ids
+
+    def has_bypass(self, node_id: str) -> bool:
+        """상류 노드에서 이 노드를 우회해 직접 하류 노드로 가는 경로가 있는지"""
+        downstream = self.reachable_ids(node_id, 1)
+        if not downstream:
+            return False
+        for u_id in self.reachable_ids(node_id, 1, downstream=False):
+            if not downstream.isdisjoint(self._branch_reach(u_id, node_id)):
+                return True
+        return False
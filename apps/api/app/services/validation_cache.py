@@ -0,0 +1,65 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Optional, Set, Tuple
+
+from app.schemas.canonical import DiagramCanonical
+from app.schemas.rules import ValidationReport
+
+# 검증 결과에 영향을 주지 않는 좌표 필드 (rule이 참조하지 않는 한 해시에서 제외)
+_GEOMETRY_EXCLUDE = {
+    "nodes": {"__all__": {"position"}},
+    "edges": {"__all__": {"waypoints"}},
+}
+
+
+def content_hash(canonical: DiagramCanonical, include_positions: bool = False) -> str:
+    """
+    rule이 볼 수 있는 내용(diagram_type, nodes, edges)만의 sha256.
+    키 순서와 무관하며, include_positions=False이면 노드 좌표 / 엣지 waypoint를 무시한다.
+    도면 id / 이름 / metadata는 결과에 영향을 주지 않으므로 포함하지 않는다.
+    """
+    data = canonical.model_dump(
+        mode="json",
+        include={"diagram_type", "nodes", "edges"},
+        exclude=None if include_positions else _GEOMETRY_EXCLUDE
+    )
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class _CachedReport:
+    __slots__ = ("report", "recorded")
+
+    def __init__(self, report: ValidationReport):
+        self.report = report
+        # Run 기록 여부를 이미 처리한 (diagram id, 도면 버전). 같은 버전이면 Run 조회 없이 바로 반환한다
+        self.recorded: Set[Tuple[str, Optional[int]]] = set()
+
+
+MAX_CACHED_REPORTS = 256
+_reports: "OrderedDict[Tuple[str, str], _CachedReport]" = OrderedDict()
+
+
+def get_cached_report(content: str, ruleset_hash: str) -> Optional[_CachedReport]:
+    entry = _reports.get((content, ruleset_hash))
+    if entry is not None:
+        _reports.move_to_end((content, ruleset_hash))
+    return entry
+
+
+def cache_report(content: str, ruleset_hash: str, report: ValidationReport) -> _CachedReport:
+    """report는 cached=False 상태로 보관된다. 반환 시에는 mark_cached()로 표시한 사본을 쓴다."""
+    entry = _CachedReport(report.model_copy(update={"cached": False, "timings": None}))
+    _reports[(content, ruleset_hash)] = entry
+    if len(_reports) > MAX_CACHED_REPORTS:
+        _reports.popitem(last=False)
+    return entry
+
+
+def mark_cached(report: ValidationReport) -> ValidationReport:
+    return report.model_copy(update={"cached": True})
+
+
+def clear_report_cache() -> None:
+    _reports.clear()
@@ -1,436 +1,812 @@
 import json
 import re
-from typing import Any, List
-
-from app.schemas.canonical import DiagramCanonical, CanonicalNode, CanonicalEdge
-from app.schemas.rules import ValidationReport, Violation
-
-def _get_downstream_nodes(canonical: DiagramCanonical, node_id: str, max_distance: int) -> List[CanonicalNode]:
-    visited = set()
-    queue = [(node_id, 0)]
-    found = []
-    
-    while queue:
-        curr, dist = queue.pop(0)
-        if dist >= max_distance:
-            continue
-            
-        for edge in canonical.edges_from(curr):
-            to_node = canonical.node_by_id(edge.to_node)
-            if to_node and to_node.id not in visited:
-                visited.add(to_node.id)
-                found.append(to_node)
-                queue.append((to_node.id, dist + 1))
-                
-    return found
-
-def _get_upstream_nodes(canonical: DiagramCanonical, node_id: str, max_distance: int = 1) -> List[CanonicalNode]:
-    visited = set()
-    queue = [(node_id, 0)]
-    found = []
-    
-    while queue:
-        curr, dist = queue.pop(0)
-        if dist >= max_distance:
-            continue
-            
-        for edge in canonical.edges_to(curr):
-            from_node = canonical.node_by_id(edge.from_node)
-            if from_node and from_node.id not in visited:
-                visited.add(from_node.id)
-                found.append(from_node)
-                queue.append((from_node.id, dist + 1))
-                
-    return found
-
-
-def validate(canonical: DiagramCanonical, rules: List[Any]) -> ValidationReport:
-    violations: List[Violation] = []
-    
-    for rule in rules:
-        condition_json = rule.condition_json
-        if isinstance(condition_json, str):
-            try:
-                condition = json.loads(condition_json)
-            except json.JSONDecodeError:
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain, repeat
+from typing import Any, Callable, Generator, Iterable, Iterator, List, Optional, Tuple
+
+from app.schemas.canonical import DiagramCanonical, CanonicalNode, CanonicalEdge, NodeType, EdgeType
+from app.schemas.rules import RuleTiming, ValidationReport, Violation
+from app.services.columns import BucketKey, DiagramColumns, MaskKey, unset_positions
+from app.services.traversal import Traversal
+
+class ValidationRun:
+    """
+    검증 1회 실행 컨텍스트. 검사 클로저는 도면 대신 이 객체를 받아
+    인접 인덱스와 실행 단위 탐색 memo(Traversal), type별 열 뷰(DiagramColumns)를 공유한다.
+    """
+
+    __slots__ = ("canonical", "index", "traversal", "_columns")
+
+    def __init__(self, canonical: DiagramCanonical):
+        self.canonical = canonical
+        self.index = canonical.index
+        self.traversal = Traversal(canonical)
+        self._columns: Optional[DiagramColumns] = None
+
+    @property
+    def columns(self) -> DiagramColumns:
+        if self._columns is None:
+            self._columns = DiagramColumns(self.canonical)
+        return self._columns
+
+
+# ---------------------------------------------------------------------------
+# Rule compilation
+# ---------------------------------------------------------------------------
+# 각 rule의 condition_json을 한 번만 해석해 실행 계획(RulePlan)으로 만든다.
+# where 필터 / check는 클로저로, 정규식은 미리 컴파일된다.
+# 체크 클로저는 위반 시 메시지(str)를, 통과 시 None을 반환한다.
+
+NodeCheck = Callable[[ValidationRun, CanonicalNode], Optional[str]]
+EdgeCheck = Callable[[ValidationRun, CanonicalEdge], Optional[str]]
+# 다이어그램 체크는 (message, node_id, edge_id) 튜플을 생성한다.
+DiagramCheck = Callable[[ValidationRun], Iterator[Tuple[str, Optional[str], Optional[str]]]]
+# 검사와 같은 판정의 DiagramColumns 존재 마스크 키. 마스크가 1인 요소는 검사를 호출하지 않는다
+NodeCheckSpec = Tuple[NodeCheck, Optional[MaskKey]]
+EdgeCheckSpec = Tuple[EdgeCheck, Optional[MaskKey]]
+
+SIGNAL_EDGE_TYPES = (EdgeType.SIGNAL_ELECTRICAL, EdgeType.SIGNAL_PNEUMATIC)
+
+
+def load_condition(condition_json: Any) -> Optional[dict]:
+    if isinstance(condition_json, str):
+        try:
+            return json.loads(condition_json)
+        except json.JSONDecodeError:
+            return None
+    if isinstance(condition_json, dict):
+        return condition_json
+    return None
+
+
+def _compile_regex_match(pattern: str) -> Callable[[str], Any]:
+    try:
+        return re.compile(pattern).match
+    except re.error:
+        # 잘못된 패턴은 기존과 동일하게 실제 매칭 시점에 오류를 낸다
+        return lambda value: re.match(pattern, value)
+
+
+def _property_name(spec: Any) -> str:
+    return list(spec.keys())[0] if isinstance(spec, dict) else spec
+
+
+def _value_matches(value: str, expected: Any) -> bool:
+    """where / 요구 노드 조건의 type·subtype 비교 (list는 포함, str은 일치)"""
+    if isinstance(expected, list):
+        return value in expected
+    if isinstance(expected, str):
+        return value == expected
+    return True
+
+
+def _edge_message(template: str, edge: CanonicalEdge) -> str:
+    return template.replace("{edge_id}", edge.id).replace("{line_number}", str(edge.line_number or "Unknown"))
+
+
+def _bucket_values(expected: Any) -> Optional[List[Any]]:
+    """where의 type / subtype 값을 버킷 키 목록으로 (str 또는 str list만 지원)"""
+    if isinstance(expected, str):
+        return [expected]
+    if isinstance(expected, list) and all(isinstance(v, str) for v in expected):
+        return list(dict.fromkeys(expected))
+    return None
+
+
+def _compile_node_buckets(where: dict) -> Optional[List[BucketKey]]:
+    """
+    where.type / subtype을 DiagramColumns 버킷 키로 변환한다.
+    버킷만으로 표현되지 않는 조건이면 None (전체 노드를 필터로 순회).
+    """
+    node_type = where.get("type")
+    node_subtype = where.get("subtype")
+    if not node_type:
+        return None
+    types = _bucket_values(node_type)
+    if types is None:
+        return None
+    if not node_subtype:
+        return [(t, None) for t in types]
+    subtypes = _bucket_values(node_subtype)
+    if subtypes is None:
+        return None
+    return [(t, st) for t in types for st in subtypes]
+
+
+def _compile_node_filter(where: dict, props_only: bool = False) -> Optional[Callable[[CanonicalNode], bool]]:
+    """props_only=True이면 type / subtype 조건은 버킷에서 이미 걸러졌다고 보고 properties만 검사한다."""
+    node_type = where.get("type")
+    node_subtype = where.get("subtype")
+    where_props = where.get("properties")
+
+    filters = []
+    if node_type and not props_only:
+        filters.append(lambda node: _value_matches(node.type.value, node_type))
+    if node_subtype and not props_only:
+        filters.append(lambda node: _value_matches(node.subtype, node_subtype))
+    if where_props:
+        not_null_keys = []
+        equals = []
+        for pk, pv in where_props.items():
+            if isinstance(pv, dict) and pv.get("not_null"):
+                not_null_keys.append(pk)
+            else:
+                equals.append((pk, pv))
+
+        def props_filter(node: CanonicalNode) -> bool:
+            props = node.properties
+            for pk in not_null_keys:
+                if props.get(pk) is None:
+                    return False
+            for pk, pv in equals:
+                if props.get(pk) != pv:
+                    return False
+            return True
+
+        filters.append(props_filter)
+
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return lambda node: all(f(node) for f in filters)
+
+
+def _compile_required_node(spec: dict) -> Callable[[CanonicalNode], bool]:
+    req_type = spec.get("type")
+    req_subtype = spec.get("subtype")
+
+    def matches(candidate: CanonicalNode) -> bool:
+        if req_type and candidate.type.value != req_type:
+            return False
+        if req_subtype and not _value_matches(candidate.subtype, req_subtype):
+            return False
+        return True
+
+    return matches
+
+
+def _compile_node_checks(check: dict, template: str) -> List[NodeCheckSpec]:
+    checks: List[NodeCheckSpec] = []
+
+    def tag_message(node: CanonicalNode) -> str:
+        return template.replace("{tag}", node.tag or "Unknown")
+
+    # 1. has_field
+    if "has_field" in check:
+        field_name = check["has_field"]
+        field_template = template.replace("{field}", field_name)
+
+        def has_field(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            val = getattr(node, field_name, None)
+            if not val or str(val).strip() == "":
+                return field_template.replace("{tag}", node.tag or "Unknown")
+            return None
+
+        checks.append((has_field, ("field", field_name)))
+
+    # 2. has_property
+    if "has_property" in check:
+        prop_name = _property_name(check["has_property"])
+        prop_template = template.replace("{property}", prop_name)
+
+        def has_property(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            if node.properties.get(prop_name) is None:
+                return prop_template.replace("{tag}", node.tag or "Unknown")
+            return None
+
+        checks.append((has_property, ("property", prop_name)))
+
+    # 3. tag_matches_pattern
+    if "tag_matches_pattern" in check:
+        tag_match = _compile_regex_match(check["tag_matches_pattern"])
+
+        def tag_matches_pattern(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            if node.tag and not tag_match(node.tag):
+                return tag_message(node)
+            return None
+
+        checks.append((tag_matches_pattern, None))
+
+    # 4. downstream_node
+    if "downstream_node" in check:
+        down_spec = check["downstream_node"]
+        down_matches = _compile_required_node(down_spec)
+        down_dist = down_spec.get("max_distance", 1)
+
+        def downstream_node(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            if any(down_matches(d) for d in run.traversal.reachable(node.id, down_dist)):
+                return None
+            return tag_message(node)
+
+        checks.append((downstream_node, None))
+
+    # 5. upstream_node
+    if "upstream_node" in check:
+        up_spec = check["upstream_node"]
+        up_matches = _compile_required_node(up_spec)
+        up_dist = up_spec.get("max_distance", 1)
+
+        def upstream_node(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            if any(up_matches(u) for u in run.traversal.reachable(node.id, up_dist, downstream=False)):
+                return None
+            return tag_message(node)
+
+        checks.append((upstream_node, None))
+
+    # 6. has_at_least_one_edge
+    if check.get("has_at_least_one_edge"):
+        def has_at_least_one_edge(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            index = run.index
+            if node.id in index.out_edges or node.id in index.in_edges:
+                return None
+            return tag_message(node)
+
+        checks.append((has_at_least_one_edge, ("linked",)))
+
+    # 7. has_bypass
+    if check.get("has_bypass"):
+        def has_bypass(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            # Check if there is a path from upstream to downstream bypassing this node
+            if run.traversal.has_bypass(node.id):
+                return None
+            return tag_message(node)
+
+        checks.append((has_bypass, None))
+
+    # 8. connected_instrument
+    if check.get("connected_instrument"):
+        def connected_instrument(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            index = run.index
+            for edge in chain(index.out_edges.get(node.id, ()), index.in_edges.get(node.id, ())):
+                if edge.type in SIGNAL_EDGE_TYPES:
+                    target_id = edge.to_node if edge.from_node == node.id else edge.from_node
+                    target_node = index.nodes_by_id.get(target_id)
+                    if target_node and target_node.type == NodeType.INSTRUMENT:
+                        return None
+            return tag_message(node)
+
+        checks.append((connected_instrument, None))
+
+    # 9. connected_node (for VAL-EQP-003)
+    if check.get("connected_node"):
+        conn_spec = check["connected_node"]
+        conn_type = conn_spec.get("type")
+        conn_subtype = conn_spec.get("subtype")
+
+        def connected_node(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+            index = run.index
+            for edge in chain(index.out_edges.get(node.id, ()), index.in_edges.get(node.id, ())):
+                target_id = edge.to_node if edge.from_node == node.id else edge.from_node
+                target_node = index.nodes_by_id.get(target_id)
+                if target_node:
+                    if conn_type and target_node.type.value != conn_type: continue
+                    if conn_subtype and target_node.subtype != conn_subtype: continue
+                    return None
+            return tag_message(node)
+
+        checks.append((connected_node, None))
+
+    return checks
+
+
+def _compile_edge_checks(check: dict, template: str) -> List[EdgeCheckSpec]:
+    checks: List[EdgeCheckSpec] = []
+
+    # 7. has_field
+    if "has_field" in check:
+        field_name = check["has_field"]
+        field_template = template.replace("{field}", str(field_name))
+
+        def has_field(run: ValidationRun, edge: CanonicalEdge) -> Optional[str]:
+            val = getattr(edge, field_name, None)
+            if not val or str(val).strip() == "":
+                return _edge_message(field_template, edge)
+            return None
+
+        checks.append((has_field, ("field", field_name)))
+
+    # 8. has_property
+    if "has_property" in check:
+        prop_name = _property_name(check["has_property"])
+        prop_template = template.replace("{property}", str(prop_name))
+
+        def has_property(run: ValidationRun, edge: CanonicalEdge) -> Optional[str]:
+            val = getattr(edge.properties, prop_name, None)
+
+            # Fallback to parse from line_number if missing
+            if (val is None or val == "") and edge.line_number:
+                parts = str(edge.line_number).split("-")
+                if len(parts) >= 3:
+                    if prop_name == "size":
+                        val = parts[0]
+                    elif prop_name == "spec":
+                        val = parts[-1]
+
+            if val in (None, "", " "):
+                return _edge_message(prop_template, edge)
+            return None
+
+        checks.append((has_property, None))
+
+    # 9. line_number_matches_pattern
+    if "line_number_matches_pattern" in check:
+        line_match = _compile_regex_match(check["line_number_matches_pattern"])
+
+        def line_number_matches_pattern(run: ValidationRun, edge: CanonicalEdge) -> Optional[str]:
+            if edge.line_number and not line_match(edge.line_number):
+                return _edge_message(template, edge)
+            return None
+
+        checks.append((line_number_matches_pattern, None))
+
+    return checks
+
+
+def _compile_diagram_checks(check: dict, template: str) -> List[DiagramCheck]:
+    checks: List[DiagramCheck] = []
+
+    # 10. equipment_tags_unique
+    if check.get("equipment_tags_unique"):
+        def equipment_tags_unique(run: ValidationRun):
+            tags = set()
+            for node in run.canonical.nodes:
+                if node.type.value == "equipment" and node.tag:
+                    if node.tag in tags:
+                        yield template.replace("{tag}", node.tag), node.id, None
+                    tags.add(node.tag)
+
+        checks.append(equipment_tags_unique)
+
+    # 11. line_numbers_unique
+    if check.get("line_numbers_unique"):
+        def line_numbers_unique(run: ValidationRun):
+            line_nums = set()
+            for edge in run.canonical.edges:
+                if edge.line_number:
+                    if edge.line_number in line_nums:
+                        yield template.replace("{line_number}", edge.line_number), None, edge.id
+                    line_nums.add(edge.line_number)
+
+        checks.append(line_numbers_unique)
+
+    # TEST RULE: node_count_min
+    if "node_count_min" in check:
+        min_count = check["node_count_min"]
+
+        def node_count_min(run: ValidationRun):
+            if len(run.canonical.nodes) < min_count:
+                yield template, None, None
+
+        checks.append(node_count_min)
+
+    return checks
+
+
+# 코드별 전용 검사 (condition_json 대신 하드코딩된 로직 사용)
+
+def _equipment_description_override(compiled: "CompiledRule", template: str) -> None:
+    # VAL-CMP-002
+    def has_description(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+        if not node.description or node.description.strip() == "":
+            return template.replace("{tag}", node.tag or "Unknown")
+        return None
+
+    compiled.node_filter = lambda node: node.type.value == "equipment"
+    compiled.node_buckets = [("equipment", None)]
+    compiled.node_checks = [has_description]
+    compiled.node_masks = [("field", "description")]
+
+
+def _edge_insulation_override(compiled: "CompiledRule", template: str) -> None:
+    # VAL-PIP-007
+    def has_insulation(run: ValidationRun, edge: CanonicalEdge) -> Optional[str]:
+        if not edge.insulation or edge.insulation.strip() == "":
+            return _edge_message(template, edge)
+        return None
+
+    compiled.edge_checks = [has_insulation]
+    compiled.edge_masks = [("field", "insulation")]
+
+
+def _instrument_location_override(compiled: "CompiledRule", template: str) -> None:
+    # VAL-INS-007
+    def has_location(run: ValidationRun, node: CanonicalNode) -> Optional[str]:
+        if getattr(node, "location", None) is None or str(node.location).strip() == "":
+            return template.replace("{tag}", node.tag or "Unknown")
+        return None
+
+    compiled.node_filter = lambda node: node.type.value == "instrument"
+    compiled.node_buckets = [("instrument", None)]
+    compiled.node_checks = [has_location]
+    compiled.node_masks = [("field", "location")]
+
+
+RULE_CODE_OVERRIDES = {
+    "VAL-CMP-002": _equipment_description_override,
+    "VAL-PIP-007": _edge_insulation_override,
+    "VAL-INS-007": _instrument_location_override,
+}
+
+# 좌표 필드. 이를 참조하는 rule이 없으면 결과 캐시 키에서 좌표를 무시한다
+GEOMETRY_FIELDS = ("position", "waypoints")
+
+# has_bypass: 상류(1) → 우회 분기(2) → 하류 탐색(3) 까지의 이웃에 의존
+BYPASS_SCOPE_RADIUS = 5
+
+
+def _node_scope_radius(check: dict) -> int:
+    """node rule 결과가 의존하는 이웃 범위 (무방향 hop 수). 0이면 노드 자신만."""
+    radius = 0
+    for key in ("downstream_node", "upstream_node"):
+        if key in check:
+            radius = max(radius, check[key].get("max_distance", 1))
+    if check.get("has_at_least_one_edge") or check.get("connected_instrument") or check.get("connected_node"):
+        radius = max(radius, 1)
+    if check.get("has_bypass"):
+        radius = max(radius, BYPASS_SCOPE_RADIUS)
+    return radius
+
+
+class CompiledRule:
+    """
+    condition_json이 해석된 단일 rule. evaluate()는 위반을 순서대로 생성한다.
+    node_radius는 node 검사가 의존하는 이웃 범위로, 증분 검증에서 재평가 대상을 정할 때 쓰인다.
+    node_buckets가 있으면 evaluate()는 DiagramColumns의 해당 버킷만 순회하고 node_props_filter만 적용한다.
+    node_masks / edge_masks는 검사별 존재 마스크 키(없으면 None)로, evaluate()는 마스크가 1인 요소의 검사를 건너뛴다.
+    """
+
+    __slots__ = (
+        "code", "severity", "message_template", "match",
+        "node_filter", "node_buckets", "node_props_filter", "node_checks", "node_masks", "node_radius",
+        "edge_type", "edge_checks", "edge_masks", "diagram_checks", "diagram_type_not", "uses_positions",
+    )
+
+    def __init__(self, code: str, severity: str, message_template: str, match: str):
+        self.code = code
+        self.severity = severity
+        self.message_template = message_template
+        self.match = match
+        self.node_filter: Optional[Callable[[CanonicalNode], bool]] = None
+        self.node_buckets: Optional[List[BucketKey]] = None
+        self.node_props_filter: Optional[Callable[[CanonicalNode], bool]] = None
+        self.node_checks: List[NodeCheck] = []
+        self.node_masks: List[Optional[MaskKey]] = []
+        self.node_radius = 0
+        self.edge_type: Any = None
+        self.edge_checks: List[EdgeCheck] = []
+        self.edge_masks: List[Optional[MaskKey]] = []
+        self.diagram_checks: List[DiagramCheck] = []
+        self.diagram_type_not: Optional[str] = None
+        self.uses_positions = False
+
+    def _violation(self, message: str, node_id: Optional[str], edge_id: Optional[str]) -> Violation:
+        return Violation(
+            rule_code=self.code,
+            severity=self.severity,
+            message=message,
+            node_id=node_id,
+            edge_id=edge_id
+        )
+
+    def _skips_diagram(self, canonical: DiagramCanonical) -> bool:
+        # 12. diagram_type_not (Apply to diagram scope before nodes)
+        return bool(self.diagram_type_not) and canonical.diagram_type == self.diagram_type_not
+
+    def evaluate_nodes(self, run: ValidationRun, nodes: Iterable[CanonicalNode]) -> Iterator[Violation]:
+        if not self.node_checks or self._skips_diagram(run.canonical):
+            return
+        yield from self._check_nodes(run, nodes, self.node_filter)
+
+    def _check_nodes(
+        self, run: ValidationRun, nodes: Iterable[CanonicalNode], node_filter: Optional[Callable[[CanonicalNode], bool]]
+    ) -> Iterator[Violation]:
+        checks = self.node_checks
+        for node in nodes:
+            if node_filter is not None and not node_filter(node):
                 continue
-        elif isinstance(condition_json, dict):
-            condition = condition_json
-        else:
-            continue
-            
-        match = condition.get("match")
-        if not match:
-            continue
-            
-        severity = getattr(rule, "severity", "error") or "error"
-        message_template = getattr(rule, "message_template", f"Rule {rule.code} failed") or f"Rule {rule.code} failed"
-        
-        if rule.code == "VAL-CMP-002":
-            for node in canonical.nodes:
-                if node.type.value == "equipment":
-                    if not node.description or node.description.strip() == "":
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-            continue
-            
-        if rule.code == "VAL-PIP-007":
-            for edge in canonical.edges:
-                if not edge.insulation or edge.insulation.strip() == "":
-                    msg = message_template.replace("{edge_id}", edge.id).replace("{line_number}", str(edge.line_number or "Unknown"))
-                    violations.append(Violation(
-                        rule_code=rule.code,
-                        severity=severity,
-                        message=msg,
-                        node_id=None,
-                        edge_id=edge.id
-                    ))
-            continue
-            
-        if rule.code == "VAL-INS-007":
-            for node in canonical.nodes:
-                if node.type.value == "instrument":
-                    if getattr(node, "location", None) is None or str(node.location).strip() == "":
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-            continue
-        
-        where_dict = condition.get("where", {})
-        check_dict = condition.get("check", {})
-        
-        if match == "node":
-            # 12. diagram_type_not (Apply to diagram scope before nodes)
-            diagram_type_not = check_dict.get("diagram_type_not")
-            if diagram_type_not and canonical.diagram_type == diagram_type_not:
+            for check in checks:
+                message = check(run, node)
+                if message is not None:
+                    yield self._violation(message, node.id, None)
+
+    def evaluate_edges(self, run: ValidationRun, edges: Iterable[CanonicalEdge]) -> Iterator[Violation]:
+        if not self.edge_checks:
+            return
+        edge_type = self.edge_type
+        checks = self.edge_checks
+        for edge in edges:
+            if edge_type and edge.type.value != edge_type:
+                continue
+            for check in checks:
+                message = check(run, edge)
+                if message is not None:
+                    yield self._violation(message, None, edge.id)
+
+    def evaluate_diagram(self, run: ValidationRun) -> Iterator[Violation]:
+        for check in self.diagram_checks:
+            for message, node_id, edge_id in check(run):
+                yield self._violation(message, node_id, edge_id)
+
+    @staticmethod
+    def _masked_checks(
+        checks: List[Any], keys: List[Optional[MaskKey]], mask_of: Callable[..., Optional[bytearray]],
+        positions: Iterable[int], build: bool
+    ) -> Tuple[Iterable[int], List[Tuple[Any, Optional[bytearray]]]]:
+        """
+        검사별 존재 마스크를 붙인다 (마스크가 1인 요소는 검사를 호출하지 않는다).
+        검사가 존재 검사 하나뿐이면 방문할 위치 자체를 마스크가 0인 위치로 줄인다.
+        """
+        masked = [
+            (check, None if key is None else mask_of(key, build))
+            for check, key in zip(checks, keys or repeat(None))
+        ]
+        if len(masked) == 1 and masked[0][1] is not None:
+            check, mask = masked[0]
+            return unset_positions(mask, positions), [(check, None)]
+        return positions, masked
+
+    def _check_node_positions(
+        self, run: ValidationRun, positions: Iterable[int], node_filter: Optional[Callable[[CanonicalNode], bool]],
+        build_masks: bool
+    ) -> Iterator[Violation]:
+        columns = run.columns
+        nodes = columns.nodes
+        positions, checks = self._masked_checks(
+            self.node_checks, self.node_masks, columns.node_mask, positions, build_masks
+        )
+        for i in positions:
+            node = nodes[i]
+            if node_filter is not None and not node_filter(node):
                 continue
+            for check, mask in checks:
+                if mask is not None and mask[i]:
+                    continue
+                message = check(run, node)
+                if message is not None:
+                    yield self._violation(message, node.id, None)
 
-            for node in canonical.nodes:
-                # Type / Subtype filters
-                node_type = where_dict.get("type")
-                if node_type:
-                    if isinstance(node_type, list) and node.type.value not in node_type:
-                        continue
-                    elif isinstance(node_type, str) and node.type.value != node_type:
-                        continue
-                        
-                node_subtype = where_dict.get("subtype")
-                if node_subtype:
-                    if isinstance(node_subtype, list) and node.subtype not in node_subtype:
-                        continue
-                    elif isinstance(node_subtype, str) and node.subtype != node_subtype:
-                        continue
-                
-                # property filters
-                where_props = where_dict.get("properties")
-                if where_props:
-                    skip = False
-                    for pk, pv in where_props.items():
-                        if isinstance(pv, dict) and pv.get("not_null"):
-                            if pk not in node.properties or node.properties[pk] is None:
-                                skip = True
-                                break
-                        elif node.properties.get(pk) != pv:
-                            skip = True
-                            break
-                    if skip:
-                        continue
-                        
-                # 1. has_field
-                if "has_field" in check_dict:
-                    field_name = check_dict["has_field"]
-                    val = getattr(node, field_name, None)
-                    if not val or str(val).strip() == "":
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{field}", field_name).replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-                
-                # 2. has_property
-                if "has_property" in check_dict:
-                    prop_name = list(check_dict["has_property"].keys())[0] if isinstance(check_dict["has_property"], dict) else check_dict["has_property"]
-                    if prop_name not in node.properties or node.properties[prop_name] is None:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{property}", prop_name).replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-
-                # 3. tag_matches_pattern
-                if "tag_matches_pattern" in check_dict:
-                    pattern = check_dict["tag_matches_pattern"]
-                    if node.tag and not re.match(pattern, node.tag):
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-
-                # 4. downstream_node
-                if "downstream_node" in check_dict:
-                    req_type = check_dict["downstream_node"].get("type")
-                    req_subtype = check_dict["downstream_node"].get("subtype")
-                    max_dist = check_dict["downstream_node"].get("max_distance", 1)
-                    
-                    found = False
-                    for d_node in _get_downstream_nodes(canonical, node.id, max_dist):
-                        match_type = True
-                        if req_type and d_node.type.value != req_type:
-                            match_type = False
-                        if req_subtype:
-                            if isinstance(req_subtype, list) and d_node.subtype not in req_subtype:
-                                match_type = False
-                            elif isinstance(req_subtype, str) and d_node.subtype != req_subtype:
-                                match_type = False
-                                
-                        if match_type:
-                            found = True
-                            break
-                            
-                    if not found:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-
-                # 5. upstream_node
-                if "upstream_node" in check_dict:
-                    req_type = check_dict["upstream_node"].get("type")
-                    req_subtype = check_dict["upstream_node"].get("subtype")
-                    max_dist = check_dict["upstream_node"].get("max_distance", 1)
-                    
-                    found = False
-                    for u_node in _get_upstream_nodes(canonical, node.id, max_dist):
-                        match_type = True
-                        if req_type and u_node.type.value != req_type:
-                            match_type = False
-                        if req_subtype:
-                            if isinstance(req_subtype, list) and u_node.subtype not in req_subtype:
-                                match_type = False
-                            elif isinstance(req_subtype, str) and u_node.subtype != req_subtype:
-                                match_type = False
-                                
-                        if match_type:
-                            found = True
-                            break
-                            
-                    if not found:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-
-                # 6. has_at_least_one_edge
-                if check_dict.get("has_at_least_one_edge"):
-                    edges_count = len(canonical.edges_from(node.id)) + len(canonical.edges_to(node.id))
-                    if edges_count == 0:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-                
-                # 7. has_bypass
-                if check_dict.get("has_bypass"):
-                    # Check if there is a path from upstream to downstream bypassing this node
-                    upstream = _get_upstream_nodes(canonical, node.id, 1)
-                    downstream = _get_downstream_nodes(canonical, node.id, 1)
-                    bypass_found = False
-                    for u in upstream:
-                        # Find downstream nodes of u ignoring this node
-                        u_downstreams = []
-                        for edge in canonical.edges_from(u.id):
-                            if edge.to_node != node.id:
-                                u_downstreams.extend(_get_downstream_nodes(canonical, edge.to_node, 3))
-                                u_downstreams.append(canonical.node_by_id(edge.to_node))
-                        u_down_ids = {n.id for n in u_downstreams if n}
-                        if any(d.id in u_down_ids for d in downstream):
-                            bypass_found = True
-                            break
-                    
-                    if not bypass_found:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-                
-                # 8. connected_instrument
-                if check_dict.get("connected_instrument"):
-                    instrument_found = False
-                    for edge in canonical.edges_from(node.id) + canonical.edges_to(node.id):
-                        if edge.type in [EdgeType.SIGNAL_ELECTRICAL, EdgeType.SIGNAL_PNEUMATIC]:
-                            target_id = edge.to_node if edge.from_node == node.id else edge.from_node
-                            target_node = canonical.node_by_id(target_id)
-                            if target_node and target_node.type == NodeType.INSTRUMENT:
-                                instrument_found = True
-                                break
-                    
-                    if not instrument_found:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-                        
-                # 9. connected_node (for VAL-EQP-003)
-                if check_dict.get("connected_node"):
-                    req_type = check_dict["connected_node"].get("type")
-                    req_subtype = check_dict["connected_node"].get("subtype")
-                    found = False
-                    for edge in canonical.edges_from(node.id) + canonical.edges_to(node.id):
-                        target_id = edge.to_node if edge.from_node == node.id else edge.from_node
-                        target_node = canonical.node_by_id(target_id)
-                        if target_node:
-                            if req_type and target_node.type.value != req_type: continue
-                            if req_subtype and target_node.subtype != req_subtype: continue
-                            found = True
-                            break
-                    if not found:
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=message_template.replace("{tag}", node.tag or "Unknown"),
-                            node_id=node.id,
-                            edge_id=None
-                        ))
-
-        elif match == "edge":
-            for edge in canonical.edges:
-                edge_type = where_dict.get("type")
-                if edge_type and edge.type.value != edge_type:
+    def _check_edge_positions(self, run: ValidationRun, positions: Iterable[int], build_masks: bool) -> Iterator[Violation]:
+        columns = run.columns
+        edges = columns.edges
+        edge_type = self.edge_type
+        positions, checks = self._masked_checks(
+            self.edge_checks, self.edge_masks, columns.edge_mask, positions, build_masks
+        )
+        for i in positions:
+            edge = edges[i]
+            if edge_type and edge.type.value != edge_type:
+                continue
+            for check, mask in checks:
+                if mask is not None and mask[i]:
                     continue
-                
-                # 7. has_field
-                if "has_field" in check_dict:
-                    field_name = check_dict["has_field"]
-                    val = getattr(edge, field_name, None)
-                    if not val or str(val).strip() == "":
-                        msg = message_template.replace("{field}", str(field_name)).replace("{edge_id}", edge.id).replace("{line_number}", str(edge.line_number or "Unknown"))
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=msg,
-                            node_id=None,
-                            edge_id=edge.id
-                        ))
-
-                # 8. has_property
-                if "has_property" in check_dict:
-                    prop_name = list(check_dict["has_property"].keys())[0] if isinstance(check_dict["has_property"], dict) else check_dict["has_property"]
-                    val = getattr(edge.properties, prop_name, None)
-                    
-                    # Fallback to parse from line_number if missing
-                    if (val is None or val == "") and edge.line_number:
-                        parts = str(edge.line_number).split("-")
-                        if len(parts) >= 3:
-                            if prop_name == "size":
-                                val = parts[0]
-                            elif prop_name == "spec":
-                                val = parts[-1]
-                    
-                    if val in (None, "", " "):
-                        msg = message_template.replace("{property}", str(prop_name)).replace("{edge_id}", edge.id).replace("{line_number}", str(edge.line_number or "Unknown"))
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=msg,
-                            node_id=None,
-                            edge_id=edge.id
-                        ))
-
-                # 9. line_number_matches_pattern
-                if "line_number_matches_pattern" in check_dict:
-                    pattern = check_dict["line_number_matches_pattern"]
-                    print(f"[{rule.code}] pattern={pattern}, line_number={edge.line_number}")
-                    if edge.line_number and not re.match(pattern, edge.line_number):
-                        msg = message_template.replace("{edge_id}", edge.id).replace("{line_number}", str(edge.line_number or "Unknown"))
-                        violations.append(Violation(
-                            rule_code=rule.code,
-                            severity=severity,
-                            message=msg,
-                            node_id=None,
-                            edge_id=edge.id
-                        ))
-
-        elif match == "diagram":
-            # 10. equipment_tags_unique
-            if check_dict.get("equipment_tags_unique"):
-                tags = set()
-                for node in canonical.nodes:
-                    if node.type.value == "equipment" and node.tag:
-                        if node.tag in tags:
-                            violations.append(Violation(
-                                rule_code=rule.code,
-                                severity=severity,
-                                message=message_template.replace("{tag}", node.tag),
-                                node_id=node.id,
-                                edge_id=None
-                            ))
-                        tags.add(node.tag)
-
-            # 11. line_numbers_unique
-            if check_dict.get("line_numbers_unique"):
-                line_nums = set()
-                for edge in canonical.edges:
-                    if edge.line_number:
-                        if edge.line_number in line_nums:
-                            violations.append(Violation(
-                                rule_code=rule.code,
-                                severity=severity,
-                                message=message_template.replace("{line_number}", edge.line_number),
-                                node_id=None,
-                                edge_id=edge.id
-                            ))
-                        line_nums.add(edge.line_number)
-
-            # TEST RULE: node_count_min
-            if "node_count_min" in check_dict:
-                min_count = check_dict["node_count_min"]
-                if len(canonical.nodes) < min_count:
-                    violations.append(Violation(
-                        rule_code=rule.code,
-                        severity=severity,
-                        message=message_template,
-                        node_id=None,
-                        edge_id=None
-                    ))
+                message = check(run, edge)
+                if message is not None:
+                    yield self._violation(message, None, edge.id)
+
+    def evaluate(self, run: ValidationRun) -> Iterator[Violation]:
+        if self.node_checks and not self._skips_diagram(run.canonical):
+            columns = run.columns
+            # 전체를 순회할 때만 마스크를 새로 만든다 (버킷 순회는 이미 있는 마스크만 사용)
+            if self.node_buckets is None:
+                yield from self._check_node_positions(run, range(len(columns.nodes)), self.node_filter, True)
+            else:
+                yield from self._check_node_positions(
+                    run, columns.node_positions(self.node_buckets), self.node_props_filter, False
+                )
+        if self.edge_checks:
+            columns = run.columns
+            if isinstance(self.edge_type, str) and self.edge_type:
+                yield from self._check_edge_positions(run, columns.edge_positions(self.edge_type), False)
+            else:
+                yield from self._check_edge_positions(run, range(len(columns.edges)), True)
+        yield from self.evaluate_diagram(run)
+
+    def count_targets(self, canonical: DiagramCanonical) -> Tuple[int, int]:
+        """evaluate()에서 node / edge 검사가 실행되는 요소 수 (diagram 검사는 제외)"""
+        nodes = 0
+        if self.node_checks and not self._skips_diagram(canonical):
+            node_filter = self.node_filter
+            nodes = sum(1 for n in canonical.nodes if node_filter is None or node_filter(n))
+        edges = 0
+        if self.edge_checks:
+            edge_type = self.edge_type
+            edges = sum(1 for e in canonical.edges if not edge_type or e.type.value == edge_type)
+        return nodes, edges
+
+
+def compile_rule(rule: Any) -> Optional[CompiledRule]:
+    """Rule(ORM 또는 동일 속성 객체)을 CompiledRule로 변환. 실행할 검사가 없으면 None."""
+    condition = load_condition(rule.condition_json)
+    if condition is None:
+        return None
+
+    match = condition.get("match")
+    if not match:
+        return None
+
+    severity = getattr(rule, "severity", "error") or "error"
+    message_template = getattr(rule, "message_template", f"Rule {rule.code} failed") or f"Rule {rule.code} failed"
+    compiled = CompiledRule(rule.code, severity, message_template, match)
+
+    override = RULE_CODE_OVERRIDES.get(rule.code)
+    if override is not None:
+        override(compiled, message_template)
+        return compiled
+
+    where_dict = condition.get("where", {})
+    check_dict = condition.get("check", {})
+    compiled.uses_positions = check_dict.get("has_field") in GEOMETRY_FIELDS
+
+    if match == "node":
+        compiled.diagram_type_not = check_dict.get("diagram_type_not")
+        compiled.node_filter = _compile_node_filter(where_dict)
+        compiled.node_buckets = _compile_node_buckets(where_dict)
+        if compiled.node_buckets is not None:
+            compiled.node_props_filter = _compile_node_filter(where_dict, props_only=True)
+        node_checks = _compile_node_checks(check_dict, message_template)
+        compiled.node_checks = [check for check, _ in node_checks]
+        compiled.node_masks = [mask for _, mask in node_checks]
+        compiled.node_radius = _node_scope_radius(check_dict)
+    elif match == "edge":
+        compiled.edge_type = where_dict.get("type")
+        edge_checks = _compile_edge_checks(check_dict, message_template)
+        compiled.edge_checks = [check for check, _ in edge_checks]
+        compiled.edge_masks = [mask for _, mask in edge_checks]
+    elif match == "diagram":
+        compiled.diagram_checks = _compile_diagram_checks(check_dict, message_template)
+
+    if not (compiled.node_checks or compiled.edge_checks or compiled.diagram_checks):
+        return None
+    return compiled
+
+
+class RulePlan:
+    """Ruleset 단위로 컴파일된 실행 계획. 요청 간 재사용된다."""
+
+    def __init__(self, rules: List[CompiledRule], ruleset_hash: Optional[str] = None):
+        self.rules = rules
+        self.ruleset_hash = ruleset_hash
+        self.uses_positions = any(rule.uses_positions for rule in rules)
+
+    def iter_violations(self, canonical: DiagramCanonical) -> Iterator[Violation]:
+        run = ValidationRun(canonical)
+        for rule in self.rules:
+            yield from rule.evaluate(run)
+
+    def profile(self, canonical: DiagramCanonical) -> Tuple[List[Violation], List[RuleTiming]]:
+        """
+        iter_violations와 같은 결과를 rule별 실행 시간과 함께 반환한다.
+        시간에는 인덱스 생성이 포함되지 않으며, 실행 단위 탐색 memo를 먼저 채운 rule이 그 비용을 부담한다.
+        """
+        run = ValidationRun(canonical)
+        violations: List[Violation] = []
+        timings: List[RuleTiming] = []
+        for rule in self.rules:
+            started = time.perf_counter()
+            found = list(rule.evaluate(run))
+            elapsed = time.perf_counter() - started
+
+            nodes_visited, edges_visited = rule.count_targets(canonical)
+            violations.extend(found)
+            timings.append(RuleTiming(
+                rule_code=rule.code,
+                elapsed_ms=round(elapsed * 1000, 3),
+                nodes_visited=nodes_visited,
+                edges_visited=edges_visited,
+                violation_count=len(found)
+            ))
+        return violations, timings
 
+
+def compile_rules(rules: List[Any], ruleset_hash: Optional[str] = None) -> RulePlan:
+    compiled = [c for rule in rules if (c := compile_rule(rule)) is not None]
+    return RulePlan(compiled, ruleset_hash)
+
+
+MAX_CACHED_PLANS = 32
+_plan_cache: "OrderedDict[Tuple[str, Tuple[Tuple[Any, ...], ...]], RulePlan]" = OrderedDict()
+# validate_parallel / batch 검증이 스레드풀에서도 호출하므로 조회·삽입·제거를 lock으로 보호한다
+_plan_lock = threading.Lock()
+
+
+def _rule_content_key(rule: Any) -> Tuple[Any, ...]:
+    condition = rule.condition_json
+    if not isinstance(condition, str):
+        condition = json.dumps(condition, sort_keys=True, default=str)
+    return (
+        rule.code, getattr(rule, "severity", None), getattr(rule, "message_template", None), condition
+    )
+
+
+def get_rule_plan(rules: List[Any], ruleset_hash: Optional[str] = None) -> RulePlan:
+    """
+    Ruleset.hash 기준으로 캐시된 RulePlan을 반환한다.
+    같은 hash라도 enabled 토글이나 severity / condition 수정으로 rule 내용이 달라질 수 있어
+    rule별 (code, severity, message_template, condition_json)도 키에 포함한다.
+    hash가 없으면 캐시하지 않는다.
+    """
+    if isinstance(rules, RulePlan):
+        return rules
+    if ruleset_hash is None:
+        return compile_rules(rules)
+
+    key = (ruleset_hash, tuple(_rule_content_key(rule) for rule in rules))
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+
+    # 컴파일은 lock 밖에서 한다. 동시에 같은 키를 컴파일하면 나중 것이 남을 뿐 결과는 같다
+    plan = compile_rules(rules, ruleset_hash)
+    with _plan_lock:
+        _plan_cache[key] = plan
+        _plan_cache.move_to_end(key)
+        if len(_plan_cache) > MAX_CACHED_PLANS:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def clear_rule_plan_cache() -> None:
+    with _plan_lock:
+        _plan_cache.clear()
+
+
+def build_report(violations: List[Violation], timings: Optional[List[RuleTiming]] = None) -> ValidationReport:
     error_count = sum(1 for v in violations if v.severity == "error")
     warning_count = sum(1 for v in violations if v.severity == "warning")
     passed = error_count == 0
-    
+
     return ValidationReport(
         passed=passed,
         error_count=error_count,
         warning_count=warning_count,
-        violations=violations
+        violations=violations,
+        timings=timings
     )
+
+
+def iter_violations(
+    canonical: DiagramCanonical,
+    rules: List[Any],
+    ruleset_hash: Optional[str] = None,
+    max_violations: Optional[int] = None,
+    fail_fast: bool = False
+) -> Generator[Violation, None, bool]:
+    """
+    위반을 찾는 즉시 하나씩 생성한다 (validate()와 같은 순서).
+    max_violations개를 내보냈거나, fail_fast이고 error 위반이 나오면 나머지 rule은 평가하지 않는다.
+    제너레이터 반환값(StopIteration.value)은 그렇게 멈춘 시점에 내보내지 않은 위반이 남아 있었는지 여부다
+    (다음 위반 하나까지만 더 평가해 확인한다).
+    """
+    plan = get_rule_plan(rules, ruleset_hash)
+    violations = plan.iter_violations(canonical)
+    if max_violations is not None and max_violations <= 0:
+        return next(violations, None) is not None
+    count = 0
+    for violation in violations:
+        yield violation
+        count += 1
+        if (max_violations is not None and count >= max_violations) or (fail_fast and violation.severity == "error"):
+            return next(violations, None) is not None
+    return False
+
+
+def validate(
+    canonical: DiagramCanonical,
+    rules: List[Any],
+    ruleset_hash: Optional[str] = None,
+    profile: bool = False
+) -> ValidationReport:
+    """
+    canonical을 rules로 검증한다.
+    rules는 Rule 목록 또는 미리 컴파일된 RulePlan. ruleset_hash를 주면 컴파일 결과를 재사용한다.
+    profile=True이면 rule별 실행 시간 / 검사 대상 수 / 위반 수를 report.timings에 기록한다.
+    """
+    plan = get_rule_plan(rules, ruleset_hash)
+    if profile:
+        return build_report(*plan.profile(canonical))
+    return build_report(list(plan.iter_violations(canonical)))
@@ -0,0 +1,88 @@
+# Synthetic plant-scale diagrams for benchmarks
+# generator.generate_template 결과를 타일처럼 이어 붙여 원하는 크기의 DiagramCanonical을 만든다.
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any, List
+
+from app.schemas.base import RuleCreate
+from app.schemas.canonical import CanonicalEdge, DiagramCanonical, EdgeType, Position
+from app.services.generator import generate_template
+
+TEMPLATES = ["simple_pump_loop", "heat_exchange_unit", "reactor_system", "distillation_basic"]
+
+# apps/api/benchmarks -> repo root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+VALIDATION_RULES_PATH = os.path.join(REPO_ROOT, "db", "seeds", "validation_rules.json")
+
+TILE_WIDTH = 2000   # 타일 간 x 간격 (px)
+TILE_HEIGHT = 800   # 타일 행 간 y 간격 (px)
+TILES_PER_ROW = 20
+
+_TAG_RE = re.compile(r"^([A-Z]+)-\d+$")
+_LINE_RE = re.compile(r"^(.*)-(\d+)-([^-]+)$")
+
+
+def load_validation_rules(path: str = VALIDATION_RULES_PATH) -> List[RuleCreate]:
+    """seed의 validate rule들을 RuleCreate로 로드 (DB 없이 validator에 바로 전달 가능)"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        RuleCreate.model_validate(r) for r in data
+        if r.get("kind") == "validate" and r.get("enabled", True)
+    ]
+
+
+def build_diagram(target_nodes: int, templates: List[str] = TEMPLATES) -> DiagramCanonical:
+    """
+    템플릿을 순환하며 target_nodes 이상이 될 때까지 이어 붙인다.
+    - 태그 / 라인번호는 도면 전체에서 prefix별로 다시 매겨 중복이 없도록 한다
+    - 각 타일의 첫 노드를 직전 타일의 마지막 노드에 process 엣지로 연결해 하나의 플랜트로 만든다
+    """
+    diagram = DiagramCanonical(name=f"Synthetic {target_nodes}")
+    tag_seq: dict[str, int] = {}
+    line_seq = 100
+    prev_tail: str | None = None
+    tile = 0
+
+    while len(diagram.nodes) < target_nodes:
+        part = generate_template(templates[tile % len(templates)])
+        dx = (tile % TILES_PER_ROW) * TILE_WIDTH
+        dy = (tile // TILES_PER_ROW) * TILE_HEIGHT
+
+        for node in part.nodes:
+            node.position = Position(x=node.position.x + dx, y=node.position.y + dy)
+            m = _TAG_RE.match(node.tag or "")
+            if m:
+                prefix = m.group(1)
+                tag_seq[prefix] = tag_seq.get(prefix, 100) + 1
+                node.tag = f"{prefix}-{tag_seq[prefix]}"
+            diagram.nodes.append(node)
+
+        for edge in part.edges:
+            m = _LINE_RE.match(edge.line_number or "")
+            if m:
+                line_seq += 1
+                edge.line_number = f"{m.group(1)}-{line_seq:03d}-{m.group(3)}"
+            diagram.edges.append(edge)
+
+        if prev_tail is not None and part.nodes:
+            line_seq += 1
+            diagram.edges.append(CanonicalEdge(
+                type=EdgeType.PROCESS,
+                from_node=prev_tail,
+                to_node=part.nodes[0].id,
+                line_number=f'2"-P-{line_seq:03d}-A1B'
+            ))
+        if part.nodes:
+            prev_tail = part.nodes[-1].id
+        tile += 1
+
+    return diagram
+
+
+def describe(diagram: DiagramCanonical) -> dict[str, Any]:
+    return {"nodes": len(diagram.nodes), "edges": len(diagram.edges)}
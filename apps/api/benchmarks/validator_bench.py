@@ -0,0 +1,184 @@
+# Validator / layout / auto_repair benchmark
+#
+#   cd apps/api
+#   python -m benchmarks.validator_bench --sizes 10,100,1000,10000 --output bench.json
+#   python -m benchmarks.validator_bench --compare bench.json      # 회귀 비교
+#
+# 결과는 커밋 간 diff 가능한 JSON (case별 ops/s, p50/p99 ms, 1회 실행의 최대 메모리 할당량).
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from app.schemas.canonical import DiagramCanonical
+from app.services.generator import auto_repair
+from app.services.layout import apply_layout
+from app.services.validator import get_rule_plan, validate
+
+from benchmarks.synthetic import build_diagram, describe, load_validation_rules
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+CASES = ["validate", "layout", "auto_repair"]
+REGRESSION_THRESHOLD = 0.10     # p50 기준 10% 이상 느려지면 회귀로 표시
+
+
+def _peak_alloc_kb(setup: Callable[[], Any], fn: Callable[[Any], Any]) -> int:
+    """
+    fn 1회 실행 동안 늘어난 Python 메모리 할당량의 최댓값 (KB).
+    프로세스 전체 최대 RSS와 달리 case별로 시작 시점 기준이며 setup()은 제외된다.
+    tracemalloc은 실행을 느리게 하므로 시간 측정과 별도로 한 번 더 실행한다.
+    """
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - baseline) // 1024
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _measure(
+    setup: Callable[[], Any], fn: Callable[[Any], Any], repeat: int, max_seconds: float
+) -> Dict[str, Any]:
+    """setup()은 측정에서 제외. 최소 1회, repeat회 또는 max_seconds 도달까지 반복."""
+    samples: List[float] = []
+    started = time.perf_counter()
+    while len(samples) < repeat:
+        arg = setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t0)
+        if time.perf_counter() - started > max_seconds:
+            break
+
+    total = sum(samples)
+    return {
+        "runs": len(samples),
+        "ops_per_sec": round(len(samples) / total, 3) if total else None,
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+        "peak_alloc_kb": _peak_alloc_kb(setup, fn),
+    }
+
+
+def run_benchmarks(
+    sizes: List[int], cases: List[str], repeat: int, max_seconds: float
+) -> Dict[str, Any]:
+    rules = load_validation_rules()
+    plan = get_rule_plan(rules)
+    results: List[Dict[str, Any]] = []
+
+    for size in sizes:
+        base = build_diagram(size)
+        shape = describe(base)
+        report = validate(base, plan)
+
+        def copy() -> DiagramCanonical:
+            return base.model_copy(deep=True)
+
+        for case in cases:
+            if case == "validate":
+                stats = _measure(lambda: base, lambda d: validate(d, plan), repeat, max_seconds)
+            elif case == "layout":
+                stats = _measure(copy, apply_layout, repeat, max_seconds)
+            elif case == "auto_repair":
+                stats = _measure(copy, lambda d: auto_repair(d, report.violations, plan), repeat, max_seconds)
+            else:
+                raise ValueError(f"Unknown case: {case}")
+
+            results.append({"case": case, "size": size, **shape, "violations": len(report.violations), **stats})
+            print(f"{case:>12} n={shape['nodes']:<6} p50={stats['p50_ms']:>10.3f}ms "
+                  f"p99={stats['p99_ms']:>10.3f}ms runs={stats['runs']}", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "rules": len(plan.rules),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """(case, size)별 p50 비교. threshold 이상 느려진 항목 목록을 반환."""
+    base = {(r["case"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["case"], r["size"]))
+        if not b or not b["p50_ms"]:
+            continue
+        ratio = r["p50_ms"] / b["p50_ms"]
+        line = f"{r['case']:>12} size={r['size']:<6} {b['p50_ms']:.3f}ms -> {r['p50_ms']:.3f}ms ({ratio:.2f}x)"
+        print(line, file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="PEI validator benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated target node counts (e.g. 10,1000,50000)")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"subset of {CASES}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="time budget per case")
+    parser.add_argument("--output", help="write JSON report to this path (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    cases = [c for c in args.cases.split(",") if c]
+    report = run_benchmarks(sizes, cases, args.repeat, args.max_seconds)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+import asyncio
+import copy
+import random
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.database import Base
+from app.schemas.project import DiagramPatchOp
+from app.services import revision_store
+from app.services.diagram_patch import apply_ops
+from app.services.revision_store import apply_delta, compute_delta
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _session_factory():
+    # 테스트마다 독립된 메모리 DB
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+def _node(i: int, rng: random.Random) -> Dict[str, Any]:
+    return {"id": f"n{i}", "type": "equipment", "tag": f"P-{100 + i}", "position": {"x": rng.randint(0, 500), "y": 0}}
+
+
+def _initial_doc(rng: random.Random) -> Dict[str, Any]:
+    nodes = [_node(i, rng) for i in range(5)]
+    edges = [{"id": f"e{i}", "from_node": f"n{i}", "to_node": f"n{i + 1}"} for i in range(4)]
+    return {"name": "d", "diagram_type": "pid", "nodes": nodes, "edges": edges, "metadata": {}}
+
+
+def _random_edit(doc: Dict[str, Any], rng: random.Random, counter: List[int]) -> Dict[str, Any]:
+    """요소 추가 / 삭제 / 수정 / 순서 변경과 최상위 키 set / unset 중 1~3개를 적용한 새 문서"""
+    doc = copy.deepcopy(doc)
+    for _ in range(rng.randint(1, 3)):
+        op = rng.choice(["add", "remove", "modify", "reorder", "set", "unset"])
+        nodes = doc["nodes"]
+        if op == "add":
+            counter[0] += 1
+            nodes.insert(rng.randint(0, len(nodes)), _node(counter[0], rng))
+        elif op == "remove" and nodes:
+            nodes.pop(rng.randrange(len(nodes)))
+        elif op == "modify" and nodes:
+            rng.choice(nodes)["tag"] = f"V-{rng.randint(1, 999)}"
+        elif op == "reorder":
+            rng.shuffle(nodes)
+        elif op == "set":
+            doc[rng.choice(["metadata", "extra"])] = {"rev": rng.randint(0, 9)}
+        elif op == "unset":
+            doc.pop("extra", None)
+    return doc
+
+
+# --- Delta ---
+
+@pytest.mark.parametrize("seed", range(50))
+def test_delta_round_trip(seed):
+    rng = random.Random(seed)
+    counter = [100]
+    doc = _initial_doc(rng)
+    for _ in range(10):
+        new = _random_edit(doc, rng, counter)
+        assert apply_delta(doc, compute_delta(doc, new)) == new
+        doc = new
+
+
+def test_delta_of_identical_docs_is_empty():
+    doc = _initial_doc(random.Random(0))
+    assert compute_delta(doc, copy.deepcopy(doc)) == {}
+
+
+def test_order_reconstruction():
+    doc = _initial_doc(random.Random(0))
+    new = copy.deepcopy(doc)
+    new["nodes"].reverse()
+    delta = compute_delta(doc, new)
+    # 내용은 같고 순서만 바뀌었으므로 order만 남는다
+    assert delta == {"collections": {"nodes": {"order": [n["id"] for n in new["nodes"]]}}}
+    assert apply_delta(doc, delta) == new
+
+
+def test_appended_elements_need_no_order():
+    rng = random.Random(0)
+    doc = _initial_doc(rng)
+    new = copy.deepcopy(doc)
+    new["nodes"].append(_node(99, rng))
+    delta = compute_delta(doc, new)
+    assert "order" not in delta["collections"]["nodes"]
+    assert apply_delta(doc, delta) == new
+
+
+def test_collection_without_unique_ids_is_stored_whole():
+    doc = {"name": "d", "nodes": [{"id": "a"}, {"id": "a"}]}
+    new = {"name": "d", "nodes": [{"id": "a"}]}
+    delta = compute_delta(doc, new)
+    assert delta == {"set": {"nodes": [{"id": "a"}]}}
+    assert apply_delta(doc, delta) == new
+
+
+def test_apply_delta_does_not_modify_input():
+    rng = random.Random(1)
+    doc = _initial_doc(rng)
+    before = copy.deepcopy(doc)
+    apply_delta(doc, compute_delta(doc, _random_edit(doc, rng, [100])))
+    assert doc == before
+
+
+# --- Patch ops ---
+
+def test_apply_ops_remove_then_upsert_same_id():
+    doc = _initial_doc(random.Random(0))
+    replacement = {"id": "n2", "type": "valve", "tag": "XV-1"}
+    ops = [
+        DiagramPatchOp(op="remove", collection="nodes", id="n2"),
+        DiagramPatchOp(op="upsert", collection="nodes", element=replacement),
+    ]
+    new, delta = apply_ops(doc, ops)
+
+    # 원래 있던 id를 지웠다가 다시 넣으면 삭제 없이 같은 자리에서 교체된다
+    assert delta == {"collections": {"nodes": {"upsert": [replacement]}}}
+    assert [n["id"] for n in new["nodes"]] == [n["id"] for n in doc["nodes"]]
+    assert new["nodes"][2] == replacement
+    assert apply_delta(doc, delta) == new
+    assert compute_delta(doc, new) == delta
+
+
+def test_apply_ops_upsert_then_remove_new_id_is_noop():
+    doc = _initial_doc(random.Random(0))
+    ops = [
+        DiagramPatchOp(op="upsert", collection="nodes", element={"id": "tmp"}),
+        DiagramPatchOp(op="remove", collection="nodes", id="tmp"),
+    ]
+    new, delta = apply_ops(doc, ops)
+    assert new == doc
+    assert delta == {}
+
+
+# --- Storage ---
+
+async def _create_diagram(Session, doc: Dict[str, Any], version: int = 1, with_revision: bool = True) -> str:
+    async with Session() as db:
+        diagram = models.Diagram(name="d", diagram_type="PID", version=version, canonical_json=doc)
+        db.add(diagram)
+        await db.flush()
+        if with_revision:
+            revision_store.add_initial_revision(db, diagram)
+        await db.commit()
+        return diagram.id
+
+
+async def _save(Session, diagram_id: str, doc: Dict[str, Any], delta: Dict[str, Any] = None) -> None:
+    async with Session() as db:
+        diagram = await db.get(models.Diagram, diagram_id)
+        await revision_store.save_revision(db, diagram, doc, delta)
+        await db.commit()
+
+
+async def _load_all(Session, diagram_id: str):
+    async with Session() as db:
+        diagram = await db.get(models.Diagram, diagram_id)
+        versions = {v: await revision_store.load_revision(db, diagram, v) for v in range(0, diagram.version + 2)}
+        current = await revision_store.load_current(db, diagram)
+        kinds = dict((await db.execute(
+            select(models.DiagramRevision.version, models.DiagramRevision.kind)
+            .where(models.DiagramRevision.diagram_id == diagram_id)
+        )).all())
+        return diagram, versions, current, kinds
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_load_revision_every_version(seed, monkeypatch):
+    monkeypatch.setattr(revision_store, "SNAPSHOT_INTERVAL", 4)
+
+    async def scenario():
+        engine, Session = await _session_factory()
+        rng = random.Random(seed)
+        counter = [100]
+        history = [_initial_doc(rng)]
+        diagram_id = await _create_diagram(Session, history[0])
+        for _ in range(13):
+            history.append(_random_edit(history[-1], rng, counter))
+            await _save(Session, diagram_id, history[-1])
+        result = await _load_all(Session, diagram_id)
+        await engine.dispose()
+        return history, result
+
+    history, (diagram, versions, current, kinds) = run(scenario())
+    assert diagram.version == len(history)
+    for version, doc in enumerate(history, start=1):
+        assert versions[version] == doc, version
+    assert versions[0] is None
+    assert versions[len(history) + 1] is None
+    assert current == history[-1]
+
+    # SNAPSHOT_INTERVAL(4) 버전마다 snapshot, Diagram.canonical_json은 최근 snapshot
+    snapshots = sorted(v for v, kind in kinds.items() if kind == revision_store.SNAPSHOT)
+    assert snapshots == [1, 5, 9, 13]
+    assert all(kind == revision_store.DELTA for v, kind in kinds.items() if v not in snapshots)
+    assert diagram.canonical_json == history[12]
+
+
+def test_patch_delta_is_stored_as_is():
+    async def scenario():
+        engine, Session = await _session_factory()
+        doc = _initial_doc(random.Random(0))
+        diagram_id = await _create_diagram(Session, doc)
+        ops = [
+            DiagramPatchOp(op="remove", collection="nodes", id="n1"),
+            DiagramPatchOp(op="upsert", collection="nodes", element={"id": "n1", "tag": "X"}),
+            DiagramPatchOp(op="set", key="metadata", value={"a": 1}),
+        ]
+        new, delta = apply_ops(doc, ops)
+        await _save(Session, diagram_id, new, delta)
+        result = await _load_all(Session, diagram_id)
+        await engine.dispose()
+        return doc, new, result
+
+    doc, new, (diagram, versions, current, kinds) = run(scenario())
+    assert versions[1] == doc
+    assert versions[2] == new
+    assert current == new
+    assert kinds == {1: revision_store.SNAPSHOT, 2: revision_store.DELTA}
+
+
+def test_legacy_diagram_without_revisions():
+    async def scenario():
+        engine, Session = await _session_factory()
+        rng = random.Random(0)
+        doc = _initial_doc(rng)
+        # revision 저장 이전에 만들어진 도면: version 3, revision 행 없음
+        diagram_id = await _create_diagram(Session, doc, version=3, with_revision=False)
+        before = await _load_all(Session, diagram_id)
+        new = _random_edit(doc, rng, [100])
+        await _save(Session, diagram_id, new)
+        after = await _load_all(Session, diagram_id)
+        await engine.dispose()
+        return doc, new, before, after
+
+    doc, new, before, after = run(scenario())
+    _, versions, current, kinds = before
+    assert current == doc
+    assert versions[3] == doc
+    assert versions[1] is None and versions[2] is None
+    assert kinds == {}
+
+    # 첫 저장 때 현재 내용을 기준 snapshot으로 남기고 새 버전은 delta로 저장
+    diagram, versions, current, kinds = after
+    assert diagram.version == 4
+    assert kinds == {3: revision_store.SNAPSHOT, 4: revision_store.DELTA}
+    assert versions[3] == doc
+    assert versions[4] == new
+    assert versions[2] is None
+    assert current == new
+
+
+def test_load_current_many_matches_load_current(monkeypatch):
+    monkeypatch.setattr(revision_store, "SNAPSHOT_INTERVAL", 3)
+
+    async def scenario():
+        engine, Session = await _session_factory()
+        rng = random.Random(7)
+        counter = [100]
+        expected = {}
+        for edits in (0, 1, 3, 7):
+            doc = _initial_doc(rng)
+            diagram_id = await _create_diagram(Session, doc)
+            for _ in range(edits):
+                doc = _random_edit(doc, rng, counter)
+                await _save(Session, diagram_id, doc)
+            expected[diagram_id] = doc
+        legacy = _initial_doc(rng)
+        expected[await _create_diagram(Session, legacy, version=2, with_revision=False)] = legacy
+
+        async with Session() as db:
+            diagrams = (await db.execute(select(models.Diagram))).scalars().all()
+            many = await revision_store.load_current_many(db, diagrams)
+            single = {d.id: await revision_store.load_current(db, d) for d in diagrams}
+            empty = await revision_store.load_current_many(db, [])
+        await engine.dispose()
+        return expected, many, single, empty
+
+    expected, many, single, empty = run(scenario())
+    assert many == single == expected
+    assert empty == {}